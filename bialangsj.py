@@ -1,16 +1,73 @@
 '''
 bialangsj is a python wrapper to the imagej2 api. It tries to create a bio-image analyst 
 centric api for imagej2.
+
+The image-operations use the OpService of the running ImageJ. A script that has an OpService
+injected can pass it on with setOps:
+
+	#@ OpService ops
+	from mripy.bialangsj import *
+	setOps(ops)
+
+A new ImageJ context is only created, on first use, when no ImageJ is running.
 '''
+import threading
+
+__ops = None
+__lock = threading.Lock()
 
-from net.imagej import ImageJ
+def setOps(ops):
+	'''
+	Set the OpService used by the image-operations.
+	'''
+	global __ops
+	__ops = ops
+
+def getOps():
+	'''
+	Answer the OpService used by the image-operations.
 
-ops = ImageJ().op()
+	This is the OpService set with `setOps`_ or else the OpService of the context of the running ImageJ.
+	If there is none, a new ImageJ context is created on the first call.
+
+	.. _`setOps`: redirect.html#mripy.bialangsj.setOps
+	'''
+	global __ops
+	if __ops is None:
+		with __lock:
+			if __ops is None:
+				__ops = __findOps()
+	return __ops
+
+def __findOps():
+	from ij import IJ
+	from org.scijava import Context
+	from net.imagej.ops import OpService
+	context = IJ.runPlugIn("org.scijava.Context", "")
+	if isinstance(context, Context):
+		ops = context.getService(OpService)
+		if ops:
+			return ops
+	from net.imagej import ImageJ
+	return ImageJ().op()
 
 class ImageOperation(object):
 	'''
 	Abstract super-class for image-operations. 
+
+	The operation uses the OpService ops or, if it is None, the one answered by `getOps`_.
+
+	.. _`getOps`: redirect.html#mripy.bialangsj.getOps
 	'''
+	def __init__(self, ops=None):
+		self.__ops = ops
+
+	@property
+	def ops(self):
+		if self.__ops is None:
+			return getOps()
+		return self.__ops
+
 	def run(self, image):
 		'''
 		Run the operation implemented in the apply-method on the image.
@@ -38,15 +95,15 @@ class FindEdges(ImageOperation):
 	Uses a Sobel-filter.
 	'''
 	def apply(self, inputImage):
-		sobel = ops.filter().sobel(inputImage)
-		newImage = ops.create().img(sobel)
-		ops.image().normalize(newImage, sobel)
+		sobel = self.ops.filter().sobel(inputImage)
+		newImage = self.ops.create().img(sobel)
+		self.ops.image().normalize(newImage, sobel)
 		return newImage
 
-def findEdges(image=None):
+def findEdges(image=None, ops=None):
 	'''
 	Run the `FindEdges`_ operation.
 
 	.. _`FindEdges`: redirect.html#mripy.bialang.FindEdges
 	'''
-	return FindEdges().run(image)
\ No newline at end of file
+	return FindEdges(ops).run(image)
\ No newline at end of file
@@ -5,6 +5,8 @@ import unittest
 import sys
 from net.imglib2.type.numeric.integer import UnsignedByteType
 
+setOps(ops)
+
 class findEdgesTest(unittest.TestCase):
 
 	def testRectangle(self):
@@ -31,11 +33,20 @@ class findEdgesTest(unittest.TestCase):
 		self.assertEquals(v3, 255)
 		self.assertEquals(v4, 0)
 
+class opsTest(unittest.TestCase):
+
+	def testSharedOps(self):
+		self.assertTrue(getOps() is ops)
+		self.assertTrue(FindEdges().ops is ops)
+		self.assertTrue(FindEdges(ops).ops is ops)
+
 def suite():
 	suite = unittest.TestSuite()
 
 	suite.addTest(findEdgesTest('testRectangle'))
 
+	suite.addTest(opsTest('testSharedOps'))
+
 	return suite
 
 runner = unittest.TextTestRunner(sys.stdout, verbosity=1)
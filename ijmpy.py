@@ -54,21 +54,47 @@ For example:
 '''
 from __future__ import print_function, division 						# we will overwrite python's print command
 import __builtin__														# to use the python print command: __builtin__.print(<text>)
-import math, sys, importlib, java, types, inspect, keyword, tokenize, os, subprocess, shutil, struct, urllib2
-from collections import deque 
-from java.lang import Double, String, Thread
-from java.util import Calendar
-from java.awt import Font, Color
-from ij import IJ, WindowManager, Prefs
-from ij.io import SaveDialog, OpenDialog
-from ij.process import FloatProcessor, ColorProcessor, ImageProcessor, FloodFiller
-from ij.plugin import Colors, Macro_Runner
+import math, sys, importlib, java, types, keyword, os, struct, jarray, random, bisect, heapq, re, threading
+from operator import methodcaller
+from array import array as pyarray
+from java.lang import Double, String, Thread, System
+from javax.swing import JFrame, JTable, JScrollPane
+from java.util.concurrent import ConcurrentLinkedQueue
+from java.util.concurrent.atomic import AtomicInteger
+from java.util import Calendar, Arrays, Collections, WeakHashMap
+from java.awt import Font, Color, Rectangle, BasicStroke, EventQueue
+from javax.swing.table import AbstractTableModel
+from ij import IJ, WindowManager, Prefs, ImagePlus, ImageStack
+from ij.process import FloatProcessor, ColorProcessor, ImageProcessor, FloodFiller, ShortProcessor
+from ij.process import FHT, FloatPolygon, ImageConverter
 from ij.plugin.frame import RoiManager, Fitter
-from ij.plugin.filter import MaximumFinder, Analyzer
-from ij.process import FHT
-from ij.util import Tools
+from ij.plugin.filter import MaximumFinder, Analyzer, GaussianBlur
+from ij.plugin import Colors, Macro_Runner, Duplicator, RoiEnlarger
 from ij.measure import ResultsTable, CurveFitter
-from ij.gui import Roi, GenericDialog, NonBlockingGenericDialog, Toolbar, YesNoCancelDialog
+from ij.io import SaveDialog, OpenDialog
+from ij.util import Tools
+from ij.gui import Roi, GenericDialog, NonBlockingGenericDialog, Toolbar, YesNoCancelDialog, ImageCanvas
+from ij.gui import Line, OvalRoi, PolygonRoi, TextRoi, Overlay as ImageOverlay
+
+class LazyModule(types.ModuleType):
+	'''
+	A module that is imported when one of its attributes is used for the first time.
+
+	The python modules needed by only a few functions (subprocess, urllib2, ...) are slow to import.
+	They are exported as lazy modules, so that 'from mripy.ijmpy import *' still provides them
+	without loading them each time ijmpy is imported. See ijmpy_startup_benchmark.py.
+	'''
+
+	def __init__(self, name):
+		types.ModuleType.__init__(self, name)
+		self.__module = None
+
+	def __getattr__(self, name):
+		if self.__module is None:
+			self.__module = importlib.import_module(self.__name__)
+		return getattr(self.__module, name)
+
+inspect, tokenize, subprocess, shutil, urllib2 = [LazyModule(name) for name in ('inspect', 'tokenize', 'subprocess', 'shutil', 'urllib2')]
 
 NaN = Double.NaN
 PI = math.pi
@@ -77,14 +103,494 @@ false = 0
 
 py_open = open
 	
+class Context(object):
+	'''
+	The state of ijmpy for one script: the settings, the dialog, the fitter, the macro extension plugin, 
+	the current image and the images of the batch mode. 
+
+	By default all threads share one context, Context.DEFAULT. A script that runs at the same time as other 
+	ijmpy scripts in the same JVM activates a context of its own for its thread:
+
+		with Context():
+			newImage("Ramp", "8-bit ramp", 256, 256, 1)
+			run("Invert")
+
+	In a context of its own the current image is the image that the script created or selected last, 
+	not the active image of ImageJ. The images a context creates belong to it, the ijmpy functions of 
+	other contexts do not see them. Parallel.map runs the function in the context of the calling thread.
+	'''
+	__local = threading.local()
+	__owners = Collections.synchronizedMap(WeakHashMap())
+	__batchModeLock = threading.Lock()
+	__batchModes = 0
+	__interpreterBatchMode = False
+	DEFAULT = None
+
+	def __init__(self):
+		self.AUTO_UPDATE = True
+		self.UPDATE_NEEDED = False
+		self.FONT = None
+		self.JUSTIFICATION = ImageProcessor.LEFT_JUSTIFY
+		self.ANTIALIASED_TEXT = False
+		self.GLOBAL_COLOR = None
+		self.FILE = None
+		self.IMAGE_HANDLE = None
+		self.DRAW_BATCH = None
+		self.BATCH_MODE = False
+		self.images = []
+		self.image = None
+		self.dialog = None
+		self.fitter = None
+		self.logFitResults = False
+		self.showFitDialog = False
+		self.plugin = None
+
+	@classmethod
+	def current(cls):
+		'''
+		Returns the context of the calling thread or the default context.
+		'''
+		context = getattr(cls.__local, 'context', None)
+		return context if context is not None else cls.DEFAULT
+
+	def activate(self):
+		'''
+		Makes the context the context of the calling thread, until deactivate() is called.
+		'''
+		if not hasattr(self.__local, 'stack'):
+			self.__local.stack = []
+		self.__local.stack.append(getattr(self.__local, 'context', None))
+		self.__local.context = self
+		return self
+
+	def deactivate(self):
+		'''
+		Makes the context that was active before activate() was called the context of the calling thread again.
+		'''
+		self.__local.context = self.__local.stack.pop()
+
+	def __enter__(self):
+		return self.activate()
+
+	def __exit__(self, excType, excValue, traceback):
+		self.deactivate()
+		return False
+
+	def hasOwnImage(self):
+		'''
+		Answers True if the current image of the context is used instead of the active image of ImageJ, 
+		which is the case in batch mode and in all contexts but the default context.
+		'''
+		return self.BATCH_MODE or self is not Context.DEFAULT
+
+	def currentImage(self):
+		'''
+		Returns the image the ijmpy functions work on, or None if there is no image. That is the image of 
+		the active ImageHandle, the current image of the context or the active image of ImageJ.
+		'''
+		if self.IMAGE_HANDLE is not None:
+			return self.IMAGE_HANDLE.imp
+		if self.image is not None and self.hasOwnImage():
+			return self.image
+		return WindowManager.getCurrentImage()
+
+	def activeImage(self):
+		'''
+		Like currentImage(), but aborts with the "no image" error of ImageJ if there is no image.
+		'''
+		imp = self.currentImage()
+		return imp if imp is not None else IJ.getImage()
+
+	def select(self, imp):
+		'''
+		Makes the image the current image of the context.
+		'''
+		if self.hasOwnImage():
+			self.image = imp
+		elif imp.getWindow() is not None:
+			IJ.selectWindow(imp.getID())
+		else:
+			WindowManager.setTempCurrentImage(imp)
+
+	def addImage(self, imp):
+		'''
+		Displays a new image or, in batch mode, adds it to the batch mode images, and makes it the current image.
+		'''
+		if self.BATCH_MODE:
+			self.images.append(imp)
+			self.claim(imp)
+		else:
+			self.display(imp)
+		if self.hasOwnImage():
+			self.image = imp
+
+	def display(self, imp):
+		'''
+		Displays the image in a window, also while ImageJ is in batch mode for another context.
+		'''
+		from ij.macro import Interpreter
+		with Context.__batchModeLock:
+			batchMode = Interpreter.batchMode
+			Interpreter.batchMode = False
+			try:
+				imp.show()
+			finally:
+				Interpreter.batchMode = batchMode
+		self.claim(imp)
+
+	def forget(self, imp):
+		'''
+		Removes a closed image from the batch mode images and, if it was the current image, 
+		makes the last batch mode image the current image.
+		'''
+		if imp in self.images:
+			self.images.remove(imp)
+		if self.image is imp:
+			self.image = self.images[-1] if self.images else None
+		if self.owns(imp):
+			Context.__owners.remove(imp)
+
+	def claim(self, imp):
+		'''
+		Makes the image an image of the context. Images that are not claimed by a context belong to the default context.
+		'''
+		if self is not Context.DEFAULT:
+			Context.__owners.put(imp, self)
+
+	def owns(self, imp):
+		'''
+		Answers True if the image belongs to the context.
+		'''
+		owner = Context.__owners.get(imp)
+		return owner is self or (owner is None and self is Context.DEFAULT)
+
+	def setBatchMode(self, batchMode):
+		'''
+		Enters or leaves the batch mode of the context. 
+
+		While a context is in batch mode, the batch mode of the ImageJ macro interpreter is on, so that the images 
+		created by ImageJ commands are not displayed. The batch mode of ImageJ is global: it is turned on when the 
+		first context enters batch mode and restored when the last context leaves it.
+		'''
+		if batchMode and not self.BATCH_MODE:
+			self.holdBatchMode()
+		elif self.BATCH_MODE and not batchMode:
+			self.releaseBatchMode()
+		self.BATCH_MODE = batchMode
+
+	def holdBatchMode(self):
+		'''
+		Turns the batch mode of the ImageJ macro interpreter on until releaseBatchMode() is called.
+		'''
+		from ij.macro import Interpreter
+		with Context.__batchModeLock:
+			if Context.__batchModes==0:
+				Context.__interpreterBatchMode = Interpreter.batchMode
+				Interpreter.batchMode = True
+			Context.__batchModes = Context.__batchModes + 1
+
+	def releaseBatchMode(self):
+		'''
+		Restores the batch mode of the ImageJ macro interpreter when the last hold is released.
+		'''
+		from ij.macro import Interpreter
+		with Context.__batchModeLock:
+			Context.__batchModes = Context.__batchModes - 1
+			if Context.__batchModes==0:
+				Interpreter.batchMode = Context.__interpreterBatchMode
+
+Context.DEFAULT = Context()
+
+class SettingsMeta(type):
+	'''
+	Meta class of the class Settings. Reads and writes the settings of the current context.
+	'''
+	def __getattr__(self, name):
+		return getattr(Context.current(), name)
+
+	def __setattr__(self, name, value):
+		setattr(Context.current(), name, value)
+
 class Settings(object):
-	AUTO_UPDATE = True
-	UPDATE_NEEDED = False
-	FONT = None
-	JUSTIFICATION = ImageProcessor.LEFT_JUSTIFY
-	ANTIALIASED_TEXT = False
-	GLOBAL_COLOR = None
-	FILE = None
+	'''
+	The settings of the current `Context`_: AUTO_UPDATE, UPDATE_NEEDED, FONT, JUSTIFICATION, ANTIALIASED_TEXT, 
+	GLOBAL_COLOR, FILE, IMAGE_HANDLE, DRAW_BATCH and BATCH_MODE.
+
+	.. _`Context`: redirect.html#mripy.ijmpy.Context
+	'''
+	__metaclass__ = SettingsMeta
+
+class Parallel(object):
+	'''
+	Runs python functions on several threads. 
+	
+	The number of threads is taken from the ImageJ "Parallel threads" setting (Edit>Options>Memory & Threads).
+	'''
+
+	@classmethod
+	def threads(cls):
+		'''
+		Returns the number of threads used by default.
+		'''
+		return Prefs.getThreads()
+
+	@classmethod
+	def map(cls, function, items, threads=None):
+		'''
+		Calls function(item) for each item on a pool of threads and returns the list of the results, 
+		in the order of the items. 
+		
+		The items are handed out one at a time, so that long and short tasks are balanced between the threads. 
+		An exception raised by function is re-raised in the calling thread. The function runs in the `Context`_ 
+		of the calling thread.
+
+		.. _`Context`: redirect.html#mripy.ijmpy.Context
+		'''
+		items = list(items)
+		n = len(items)
+		if threads is None:
+			threads = cls.threads()
+		threads = max(1, min(threads, n))
+		results = [None] * n
+		if threads==1:
+			for i in xrange(n):
+				results[i] = function(items[i])
+			return results
+		nextIndex = AtomicInteger(0)
+		errors = []
+		context = Context.current()
+		def work():
+			context.activate()
+			try:
+				i = nextIndex.getAndIncrement()
+				while i<n and not errors:
+					results[i] = function(items[i])
+					i = nextIndex.getAndIncrement()
+			except:
+				errors.append(sys.exc_info())
+			finally:
+				context.deactivate()
+		workers = [Thread(work) for i in xrange(threads)]
+		for worker in workers:
+			worker.start()
+		for worker in workers:
+			worker.join()
+		if errors:
+			excType, excValue, excTraceback = errors[0]
+			raise excType, excValue, excTraceback
+		return results
+
+class ImageHandle(object):
+	'''
+	A handle bound to one image and its processor. 
+	
+	Width, height, bit depth and calibration are read once, when the handle is created. Use the handle 
+	to read and write pixels without looking up the active image for each call, and getPixels/setPixels 
+	to read and write whole regions as primitive arrays. While a handle is active, the ijmpy functions 
+	(getPixel, bitDepth, getWidth, calibrate, drawLine, getThreshold, ...) work on its image instead 
+	of on the active image:
+
+		with ImageHandle(imp) as handle:
+			for y in range(handle.height):
+				for x in range(getWidth()):
+					v = getPixel(x, y)
+
+	Call refresh() if the processor of the image has been replaced or the current slice has changed.
+
+	Use sample(), sampleLine() and sampleStack() to get the interpolated values at many points at once.
+	'''
+	MIN_POINTS_PER_THREAD = 10000
+
+	def __init__(self, imp=None):
+		if imp is None:
+			imp = Context.current().activeImage()
+		self.imp = imp
+		self.__previous = []
+		self.refresh()
+
+	def refresh(self):
+		'''
+		Reads the processor, the dimensions, the bit depth and the calibration of the image again.
+		'''
+		self.ip = self.imp.getProcessor()
+		self.width = self.ip.getWidth()
+		self.height = self.ip.getHeight()
+		self.bitDepth = self.imp.getBitDepth()
+		self.calibration = self.imp.getCalibration()
+		self.isFloat = self.bitDepth==32
+		self.isRGB = self.bitDepth==24
+		return self
+
+	def activate(self):
+		'''
+		Makes the handle the target of the ijmpy functions, until deactivate() is called.
+		'''
+		self.__previous.append(Settings.IMAGE_HANDLE)
+		Settings.IMAGE_HANDLE = self
+		return self
+
+	def deactivate(self):
+		'''
+		Makes the handle that was active before activate() was called the target again.
+		'''
+		Settings.IMAGE_HANDLE = self.__previous.pop()
+
+	def __enter__(self):
+		return self.activate()
+
+	def __exit__(self, excType, excValue, traceback):
+		self.deactivate()
+		return False
+
+	def getPixel(self, x, y=None):
+		'''
+		Returns the raw value of the pixel at (x,y), see `getPixel`_.
+
+		.. _`getPixel`: redirect.html#mripy.ijmpy.getPixel
+		'''
+		ip = self.ip
+		if y is None:
+			if self.isRGB:
+				return ip.get(int(x))
+			return ip.getf(int(x))
+		if isinstance(x, int) and isinstance(y, int):
+			if self.isFloat:
+				return ip.getPixelValue(x,y)
+			return ip.getPixel(x,y)
+		if self.isRGB:
+			return ip.getPixelInterpolated(x, y)
+		return self.__uncalibrated(ip, ip.getInterpolatedValue, x, y)
+
+	def setPixel(self, x, y, value):
+		'''
+		Stores value at location (x,y).
+		'''
+		if self.isFloat:
+			self.ip.putPixelValue(x, y, value)
+		else:
+			self.ip.putPixel(x, y, int(value))
+
+	def calibrate(self, value):
+		'''
+		Converts a raw pixel value to a density calibrated value, see `calibrate`_.
+
+		.. _`calibrate`: redirect.html#mripy.ijmpy.calibrate
+		'''
+		return self.calibration.getCValue(value)
+
+	def getPixels(self, x=0, y=0, width=None, height=None):
+		'''
+		Returns the raw values of the pixels in the rectangle, row by row, as a primitive array: 
+		a float[] for 8, 16 and 32-bit images and an int[] for RGB images. By default the whole image is returned.
+		'''
+		if width is None:
+			width = self.width - x
+		if height is None:
+			height = self.height - y
+		self.ip.setRoi(x, y, width, height)
+		region = self.ip.crop()
+		self.ip.resetRoi()
+		if self.isRGB:
+			return region.getPixels()
+		if self.isFloat:
+			return region.getPixels()
+		return region.convertToFloatProcessor().getPixels()
+
+	def setPixels(self, x, y, width, height, values):
+		'''
+		Writes the raw values (a float[] or, for RGB images, an int[]) into the rectangle, row by row. 
+		Values are clipped to the range of 8 and 16-bit images.
+		'''
+		if len(values)!=width * height:
+			raise Exception('Array of length '+str(width * height)+' expected')
+		if self.isRGB:
+			region = ColorProcessor(width, height, Array.asPrimitive(values, Array.INT))
+		else:
+			region = FloatProcessor(width, height, Array.asPrimitive(values, Array.FLOAT))
+			if self.bitDepth==8:
+				region = region.convertToByteProcessor(False)
+			elif self.bitDepth==16:
+				region = region.convertToShortProcessor(False)
+		self.ip.insert(region, x, y)
+
+	def sample(self, xs, ys, out=None):
+		'''
+		Returns the raw values at the points (xs[i], ys[i]), using bilinear interpolation, as a double[] 
+		or, for RGB images, as an int[] of interpolated colors. 
+
+		This gives the same values as calling getPixel(x, y) for each point, but the calibration is switched 
+		off only once and large batches are split between threads. The values can be written into 'out'.
+		'''
+		return self.__sampleProcessor(self.ip, xs, ys, out)
+
+	def sampleLine(self, roi=None, step=1.0):
+		'''
+		Returns the values along a straight line, polyline or freehand line selection, sampled at 
+		points 'step' pixels apart. Uses the selection of the image if 'roi' is None. 
+		The line width is not taken into account.
+		'''
+		xs, ys = self.__linePoints(roi, step)
+		return self.sample(xs, ys)
+
+	def sampleStack(self, xs, ys, planes=True):
+		'''
+		Samples each selected plane of the stack at the same points, in parallel, and returns 
+		the list of the value arrays, in stack order. 
+
+		'planes' is True for all planes or a list of stack indices, see `Planes.select`_. 
+		The points can also be given as a line selection: sampleStack(roi, 0.5) samples all planes 
+		every half pixel along the line.
+
+		.. _`Planes.select`: redirect.html#mripy.ijmpy.Planes.select
+		'''
+		if isinstance(xs, Roi):
+			xs, ys = self.__linePoints(xs, 1.0 if ys is None else ys)
+		stack = self.imp.getStack()
+		if planes is True:
+			planes = xrange(1, stack.getSize()+1)
+		return Parallel.map(lambda n: self.__sampleProcessor(stack.getProcessor(n), xs, ys, None, 1), planes)
+
+	def __linePoints(self, roi, step):
+		if roi is None:
+			roi = self.imp.getRoi()
+		if roi is None or not roi.isLine():
+			raise Exception('Line selection required')
+		polygon = roi.getInterpolatedPolygon(step, False)
+		n = polygon.npoints
+		return Arrays.copyOf(polygon.xpoints, n), Arrays.copyOf(polygon.ypoints, n)
+
+	def __sampleProcessor(self, ip, xs, ys, out=None, threads=None):
+		n = len(xs)
+		if len(ys)!=n:
+			raise Exception('xs and ys must have the same length')
+		if out is None:
+			out = jarray.zeros(n, Array.INT if self.isRGB else Array.DOUBLE)
+		if self.isRGB:
+			sampleAt = ip.getPixelInterpolated
+		else:
+			sampleAt = ip.getInterpolatedValue
+		def sampleRange(bounds):
+			for i in xrange(bounds[0], bounds[1]):
+				out[i] = sampleAt(xs[i], ys[i])
+		if threads is None:
+			threads = Parallel.threads() if n>=self.MIN_POINTS_PER_THREAD else 1
+		chunk = (n + threads - 1) // max(1, threads)
+		ranges = [(start, min(n, start + chunk)) for start in xrange(0, n, max(1, chunk))]
+		self.__uncalibrated(ip, Parallel.map, sampleRange, ranges, threads)
+		return out
+
+	def __uncalibrated(self, ip, function, *args):
+		'''
+		Calls function with the calibration table of ip switched off, so that it reads raw values.
+		'''
+		table = ip.getCalibrationTable()
+		if table is None:
+			return function(*args)
+		ip.setCalibrationTable(None)
+		try:
+			return function(*args)
+		finally:
+			ip.setCalibrationTable(table)
 
 def acos(n):
 	'''
@@ -92,10 +598,86 @@ def acos(n):
 	'''
 	return math.acos(n)
 	
+class Planes(object):
+	'''
+	Runs an operation on several planes of a stack or hyperstack, in parallel.
+
+	The planes are selected by channel, slice and frame with Planes.select(). Each selection can be 
+	None (all), a position, a list of positions or a string like "1-3" or "1,4,7". Positions start at 1. 
+	The stack functions fill, fillRect, fillOval, floodFill and changeValues accept the result of 
+	Planes.select() or True (all planes) as their 'stack' argument:
+
+		fillRect(10, 10, 20, 20, imp, stack=Planes.select(imp, channels=2, frames="1-50"))
+
+	The displayed position of the image does not change and the image is repainted once, when all 
+	planes are done. The changes of the planes of a virtual stack are lost.
+	'''
+
+	@classmethod
+	def select(cls, imp=None, channels=None, slices=None, frames=None):
+		'''
+		Returns the stack indices of the selected planes, in stack order.
+		'''
+		if imp is None:
+			imp = Context.current().activeImage()
+		nChannels, nSlices, nFrames = imp.getNChannels(), imp.getNSlices(), imp.getNFrames()
+		indices = []
+		for t in cls.__positions(frames, nFrames):
+			for z in cls.__positions(slices, nSlices):
+				for c in cls.__positions(channels, nChannels):
+					indices.append(imp.getStackIndex(c, z, t))
+		return indices
+
+	@classmethod
+	def apply(cls, imp, function, planes=True):
+		'''
+		Calls function(ip) for the processor of each selected plane on a pool of threads, repaints the 
+		image once and returns the list of the results in stack order. 
+
+		'planes' is True for all planes or a list of stack indices, see Planes.select().
+		'''
+		stack = imp.getStack()
+		if planes is True:
+			planes = xrange(1, stack.getSize()+1)
+		results = Parallel.map(lambda n: function(stack.getProcessor(n)), planes)
+		imp.updateAndDraw()
+		imp.changes = True
+		return results
+
+	@classmethod
+	def __positions(cls, selection, size):
+		if selection is None:
+			return xrange(1, size+1)
+		if isinstance(selection, (int, long)):
+			selection = [selection]
+		elif isinstance(selection, basestring):
+			positions = []
+			for part in selection.split(','):
+				bounds = part.split('-')
+				positions.extend(xrange(int(bounds[0]), int(bounds[-1])+1))
+			selection = positions
+		for position in selection:
+			if position<1 or position>size:
+				raise Exception("Position ("+str(position)+") is outside of the 1-"+str(size)+" range")
+		return selection
+
 class Array(object):
 	'''
 	These functions operate on arrays. Refer to the `ArrayFunctions`_ macro for examples. 
 
+	Arrays can be python lists or java primitive arrays (jarray) of type double[], float[] or int[]. 
+	Functions that call into java accept primitive arrays without copying them and return primitive 
+	arrays, so that the result of one call can be passed on to the next one without conversion. 
+	Use Array.asPrimitive(array) to convert a list once and Array.toList(array) to get a python 
+	list back.
+
+	Array.slice, trim, concat, deleteIndex and getSequence return an `ArrayView`_. The elements of 
+	lists and primitive arrays passed in are copied once, as in the macro language the result does not 
+	change when the array passed in changes. Views passed in are not copied, so that these functions 
+	can be chained without copying the elements again.
+
+	.. _`ArrayView`: redirect.html#mripy.ijmpy.ArrayView
+
 	.. _`ArrayFunctions`: https://imagej.net/macros/examples/ArrayFunctions.txt
 	'''
 
@@ -106,29 +688,66 @@ class Array(object):
 	HAMMING = "Hamming"
 	HANN = "Hann"
 	FLAT_TOP = "flat-top"
-	
+	DOUBLE = 'd'
+	FLOAT = 'f'
+	INT = 'i'
+
+	@classmethod
+	def isPrimitive(cls, array):
+		'''
+		Returns True if array is a java primitive array (jarray) and False otherwise.
+		'''
+		return isinstance(array, pyarray)
+
+	@classmethod
+	def asPrimitive(cls, array, typecode=DOUBLE):
+		'''
+		Returns array as a java primitive array of the given type (Array.DOUBLE, Array.FLOAT or Array.INT).
+
+		If array already is a primitive array of that type, it is returned as is, without copying. 
+		Otherwise a new primitive array is created.
+		'''
+		if isinstance(array, pyarray) and array.typecode==typecode:
+			return array
+		if isinstance(array, ArrayView):
+			return array.toPrimitive(typecode)
+		return jarray.array(array, typecode)
+
+	@classmethod
+	def toList(cls, array):
+		'''
+		Returns the elements of array as a python list.
+
+		This is the only place where a primitive array is unboxed. A list passed in is copied.
+		'''
+		if isinstance(array, pyarray):
+			return array.tolist()
+		if isinstance(array, ArrayView):
+			return array.toList()
+		return list(array)
+
 	@classmethod 
 	def concat(cls, *args):
 		'''
 		Returns a new array created by joining two or more arrays or values (examples_). 
 
+		The result is an `ArrayView`_, see `Array`_. 
+
 		.. _`examples`: https://imagej.net/macros/examples/ArrayConcatExamples.txt
+		.. _`ArrayView`: redirect.html#mripy.ijmpy.ArrayView
+		.. _`Array`: redirect.html#mripy.ijmpy.Array
 		'''
-		result = list()
-		for arrayOrElement in args:
-			if isinstance(arrayOrElement, list):
-				current = arrayOrElement
-			else:
-				current = list()
-				current.append(arrayOrElement)
-			result = result + current
-		return result
+		return ArrayView.concat(*args)
 
 	@classmethod
 	def copy(cls, aList):
 		'''
 		Returns a copy of array. 
+
+		The copy of a primitive array is a primitive array of the same type.
 		'''
+		if isinstance(aList, pyarray):
+			return aList[:]
 		return list(aList)
 
 	@classmethod
@@ -151,9 +770,7 @@ class Array(object):
 		
 		Requires 1.52o. 
 		'''
-		a1 = array[0:index]
-		a2 = array[index+1:len(array)]
-		return  a1 + a2
+		return ArrayView.concat(cls.__view(array, 0, index), cls.__view(array, index+1, len(array)))
 
 	@classmethod
 	def fill(cls, array, value):
@@ -175,7 +792,7 @@ class Array(object):
 
 		.. _`Examples`: https://imagej.net/macros/examples/FindMaxima1D.txt
 		'''
-		maxima = MaximumFinder.findMaxima(array, tolerance, edgeMode)
+		maxima = MaximumFinder.findMaxima(cls.asPrimitive(array), tolerance, edgeMode)
 		return maxima
 
 	@classmethod
@@ -183,9 +800,48 @@ class Array(object):
 		'''
 		Returns an array holding the minima positions. 
 		'''
-		minima = MaximumFinder.findMinima(array, tolerance, edgeMode)
+		minima = MaximumFinder.findMinima(cls.asPrimitive(array), tolerance, edgeMode)
 		return minima
 
+	@classmethod
+	def findMaximaOfProfiles(cls, profiles, tolerance, edgeMode=EXLUDE_EDGES):
+		'''
+		Runs `findMaxima`_ on many profiles, in parallel, with the same tolerance and edgeMode.
+
+		'profiles' is a list of arrays or a `Profiles`_ object, for example the rows of an image or the z-profiles 
+		of a stack. Returns the tupel (positions, offsets) of two int[]. The maxima of profile i are 
+		positions[offsets[i]:offsets[i+1]], sorted with descending strength. For example:
+
+			positions, offsets = Array.findMaximaOfProfiles(Profiles.rows(IJ.getImage()), 10)
+
+		.. _`findMaxima`: redirect.html#mripy.ijmpy.Array.findMaxima
+		.. _`Profiles`: redirect.html#mripy.ijmpy.Profiles
+		'''
+		return cls.__extremaOfProfiles(MaximumFinder.findMaxima, profiles, tolerance, edgeMode)
+
+	@classmethod
+	def findMinimaOfProfiles(cls, profiles, tolerance, edgeMode=EXLUDE_EDGES):
+		'''
+		Runs `findMinima`_ on many profiles, in parallel. See `findMaximaOfProfiles`_.
+
+		.. _`findMinima`: redirect.html#mripy.ijmpy.Array.findMinima
+		.. _`findMaximaOfProfiles`: redirect.html#mripy.ijmpy.Array.findMaximaOfProfiles
+		'''
+		return cls.__extremaOfProfiles(MaximumFinder.findMinima, profiles, tolerance, edgeMode)
+
+	@classmethod
+	def __extremaOfProfiles(cls, find, profiles, tolerance, edgeMode):
+		def extremaOfProfile(i):
+			return find(cls.asPrimitive(profiles[i]), tolerance, edgeMode)
+		extrema = Parallel.map(extremaOfProfile, xrange(len(profiles)))
+		offsets = jarray.zeros(len(extrema)+1, cls.INT)
+		for i in xrange(len(extrema)):
+			offsets[i+1] = offsets[i] + len(extrema[i])
+		positions = jarray.zeros(offsets[-1], cls.INT)
+		for i in xrange(len(extrema)):
+			System.arraycopy(extrema[i], 0, positions, offsets[i], len(extrema[i]))
+		return positions, offsets
+
 	@classmethod
 	def fourier(cls, array, windowType=NO_WINDOW):
 		'''
@@ -196,18 +852,36 @@ class Array(object):
 		
 		See the `TestArrayFourier`_ macro for an example and more documentation. 
 
+		The FHT tables are cached per length by a `FourierPlan`_.
+
 		.. _`TestArrayFourier`: https://imagej.net/macros/examples/TestArrayFourier.txt
+		.. _`FourierPlan`: redirect.html#mripy.ijmpy.FourierPlan
 		'''
-		wt = [cls.NO_WINDOW, cls.HAMMING, cls.HANN, cls.FLAT_TOP].index(windowType)
-		result = FHT().fourier1D(array, wt)
-		return result
+		return FourierPlan.get(len(array), windowType).transform(array)
+
+	@classmethod
+	def fourierOfArrays(cls, arrays, windowType=NO_WINDOW, out=None):
+		'''
+		Calculates the Fourier amplitudes of many arrays of the same length, in parallel. 
+
+		Returns the tupel (amplitudes, size). 'amplitudes' is a float[] holding the amplitudes of array i at 
+		amplitudes[i*size:(i+1)*size]. A preallocated float[] of the right length can be passed as 'out'.
+		'''
+		if len(arrays)==0:
+			return jarray.zeros(0, cls.FLOAT), 0
+		plan = FourierPlan.get(len(arrays[0]), windowType)
+		return plan.transformAll(arrays, out), plan.size
 
 	@classmethod
 	def getSequence(cls, n):
 		'''
 		 Returns an array containing the numeric sequence 0,1,2...n-1. 
+
+		 The sequence is not materialized, the result is an `ArrayView`_ on xrange(n). 
+
+		.. _`ArrayView`: redirect.html#mripy.ijmpy.ArrayView
 		'''
-		return range(n)
+		return ArrayView(xrange(n))
 
 	@classmethod
 	def getStatistics(cls, aList):
@@ -233,50 +907,113 @@ class Array(object):
 			Array.getStatistics(anArray, min, max, mean, stddev)
 		
 		would silently fail.
-		'''
-		sum = sum2 = 0
-		min = Double.POSITIVE_INFINITY;
-		max = Double.NEGATIVE_INFINITY
 
-		for value in aList:
-			sum = sum + value
-			sum2 = sum2 + (value*value)
-			if value<min:
-				min = value
-			if value>max:
-				max = value
-		n = len(aList)
-		mean = sum / float(n)
-		stdDev = ((n*sum2)-(sum*sum))/float(n)
-		stdDev = math.sqrt(stdDev / float(n-1))
-		return min, max, mean, stdDev
+		The values are accumulated in one pass by a `StatisticsAccumulator`_, so that aList can also 
+		be a generator or a java primitive array.
+
+		.. _`StatisticsAccumulator`: redirect.html#mripy.ijmpy.StatisticsAccumulator
+		'''
+		accumulator = StatisticsAccumulator()
+		accumulator.addAll(aList)
+		return accumulator.getStatistics()
 
 	@classmethod
 	def print(cls, aList):
 		'''
 		Prints the array on a single line.
 		'''
-		string = str(aList)
+		string = str(cls.toList(aList))
 		string = string.replace('[', '').replace(']', '').replace("'", "")
 		IJ.log(string)
 		return string
 
 	@classmethod
-	def rankPositions(cls, array):
+	def rankPositions(cls, array, k=None):
 		'''
 		Returns, as an array, the rank position indexes of array, starting with the index of the smallest value (`example`_). 
 
+		If k is given, only the first k rank positions are calculated and returned, see `bottomK`_.
+
 		.. _`example`: https://imagej.net/macros/examples/ArraySortingDemo.txt
+		.. _`bottomK`: redirect.html#mripy.ijmpy.Array.bottomK
+		'''
+		if k is not None:
+			return cls.bottomK(array, k)
+		if len(array)>0 and isinstance(array[0], basestring):
+			return Tools.rank(jarray.array(cls.toList(array), String))
+		return Tools.rank(cls.asPrimitive(array))
+
+	@classmethod
+	def topK(cls, array, k):
 		'''
+		Returns the indexes of the k biggest values of array, starting with the index of the biggest value.
 
-		return Tools.rank(array)
+		Uses a heap of size k, which takes O(n log k) time instead of ranking the whole array. Equal values 
+		keep their order. Strings are compared case-insensitively.
+		'''
+		return heapq.nlargest(k, xrange(len(array)), key=cls.__rankKeys(array).__getitem__)
+
+	@classmethod
+	def bottomK(cls, array, k):
+		'''
+		Returns the indexes of the k smallest values of array, starting with the index of the smallest value. 
+		
+		The result is the same as the first k elements of `rankPositions`_, see `topK`_.
+
+		.. _`rankPositions`: redirect.html#mripy.ijmpy.Array.rankPositions
+		.. _`topK`: redirect.html#mripy.ijmpy.Array.topK
+		'''
+		return heapq.nsmallest(k, xrange(len(array)), key=cls.__rankKeys(array).__getitem__)
+
+	@classmethod
+	def __rankKeys(cls, array):
+		if len(array)>0 and isinstance(array[0], basestring):
+			return map(methodcaller('lower'), array)
+		return array
 
 	@classmethod
 	def resample(cls, array, len):
 		'''
 		Returns an array which is linearly resampled to a different length.
 		'''
-		return Tools.resampleArray(array, len)
+		return Tools.resampleArray(cls.asPrimitive(array), len)
+
+	@classmethod
+	def resampleArrays(cls, arrays, length, out=None):
+		'''
+		Linearly resamples many arrays, which may have different lengths, to the same length, in parallel. 
+
+		Returns a double[] holding the resampled array i at out[i*length:(i+1)*length]. A preallocated 
+		double[] can be passed as 'out'.
+		'''
+		if out is None:
+			out = jarray.zeros(len(arrays) * length, cls.DOUBLE)
+		def resampleArray(i):
+			System.arraycopy(Tools.resampleArray(cls.asPrimitive(arrays[i]), length), 0, out, i * length, length)
+		Parallel.map(resampleArray, xrange(len(arrays)))
+		return out
+
+	@classmethod
+	def resampleContours(cls, xArrays, yArrays, length):
+		'''
+		Resamples paired x and y coordinate arrays, for example the contours of many rois, to the same 
+		number of points, in parallel. 
+
+		Returns the tupel (x, y) of two double[], see `resampleArrays`_.
+
+		.. _`resampleArrays`: redirect.html#mripy.ijmpy.Array.resampleArrays
+		'''
+		if len(xArrays)!=len(yArrays):
+			raise Exception('Same number of x and y arrays expected')
+		xOut = jarray.zeros(len(xArrays) * length, cls.DOUBLE)
+		yOut = jarray.zeros(len(yArrays) * length, cls.DOUBLE)
+		def resampleContour(i):
+			if len(xArrays[i])!=len(yArrays[i]):
+				raise Exception('Same size expected')
+			System.arraycopy(Tools.resampleArray(cls.asPrimitive(xArrays[i]), length), 0, xOut, i * length, length)
+			System.arraycopy(Tools.resampleArray(cls.asPrimitive(yArrays[i]), length), 0, yOut, i * length, length)
+		Parallel.map(resampleContour, xrange(len(xArrays)))
+		return xOut, yOut
 
 	@classmethod
 	def reverse(cls, array):
@@ -284,9 +1021,12 @@ class Array(object):
 		Reverses (inverts) the order of the elements in array. 
 
 		Note that the method reverses the list passed as a parameter. For convenience it also
-		returns the refernce to the list.
+		returns the refernce to the list. Reversing an `ArrayView`_ only changes its index mapping.
+
+		.. _`ArrayView`: redirect.html#mripy.ijmpy.ArrayView
 		'''
-		return array.reverse()
+		array.reverse()
+		return array
 
 	@classmethod
 	def show(cls, *args):
@@ -300,71 +1040,22 @@ class Array(object):
 		.. _`examples`: https://imagej.net/macros/examples/ShowArrayDemo.txt
 		.. _`IJ.renameResults`: https://imagej.net/developer/macro/functions.html#IJ.renameResults 
 		'''
-
-		if len(args)==0 or (len(args)==1 and not isinstance(args[0], list)):			#@TODO: refactor!!!
-			raise Exception('Array show needs at least one array')
-
-		title = "Arrays"
-		if len(args)==1 or (len(args)==2 and isinstance(args[0], str)):					# one array with or without title
-			if isinstance(args[0], str):
-				title = args[0]
-				array = args[1]
-			else:
-				title = __getNameOfArg(args[0])
-				array = args[0]
-			column = "Value"
-			indexes = False;
-			rowNumbers = False;
-			if title.find('(indexes)')>=0:
-				indexes = True
-				title = title.replace('(indexes)', '').strip()
-			if title.find('(row numbers)')>=0:
-				rowNumbers = True
-				title = title.replace('(row numbers)', '').strip()
-			if (indexes): 
-				rt.showRowNumbers(False)	
-				rt.showRowIndexes(True)
-			if (rowNumbers): 
-				rt.showRowIndexes(False)
-				rt.showRowNumbers(True)	
-			if (title.lower()=='results'):
-				rt = Analyzer.getResultsTable()
-			else:
-				rt = ResultsTable()
-			for value in array:
-				rt.incrementCounter()
-				rt.addValue(column, value)
-			rt.show(title)
-			return rt
-			
-		indexes = False											# More than one array
-		rowNumbers = False
-		if (isinstance(args[0], str)):
-			title = args[0]
-			if title.find('(indexes)')>=0:
-				indexes = True
-				title = title.replace('(indexes)', '').strip()
-			if title.find('(row numbers)')>=0:
-				rowNumbers = True
-				title = title.replace('(row numbers)', '').strip()
+		title, columns, arrays, indexes, rowNumbers = cls.__prepareShow(args, cls.__namesOfArgs(args))
 		if (title.lower()=='results'):
 			rt = Analyzer.getResultsTable()
+			rt.reset()
 		else:
 			rt = ResultsTable()
-		isFirstColumn = True;
-		for array in args:
-			if isinstance(array, str):
-				continue
-			row = 0	
-			for value in array:
-				column = __getNameOfArg(array)
-				if (isFirstColumn):
-					rt.incrementCounter()
-					rt.addValue(column, value)
-				else:
-					rt.setValue(column, row, value)
-					row = row + 1
-			isFirstColumn = False
+		for column, array in zip(columns, arrays):
+			try:
+				values = cls.asPrimitive(array)
+			except TypeError:
+				values = None
+			if values is not None:
+				rt.setValues(column, values)
+			else:
+				for row in xrange(len(array)):
+					rt.setValue(column, row, str(array[row]))
 		if (indexes): 
 			rt.showRowNumbers(False)	
 			rt.showRowIndexes(True)
@@ -374,6 +1065,80 @@ class Array(object):
 		rt.show(title)
 		return rt
 
+	@classmethod
+	def showVirtual(cls, *args):
+		'''
+		Displays one or more arrays in a table window that reads the values from the arrays when they are 
+		displayed, instead of copying them into a ResultsTable. 
+
+		Use it instead of `show`_ for very large arrays. The arguments are the same as for show. 
+		Returns the `ArrayTableModel`_ of the table. Note that the table shows the current content of the arrays.
+
+		.. _`show`: redirect.html#mripy.ijmpy.Array.show
+		.. _`ArrayTableModel`: redirect.html#mripy.ijmpy.ArrayTableModel
+		'''
+		title, columns, arrays, indexes, rowNumbers = cls.__prepareShow(args, cls.__namesOfArgs(args))
+		rowLabelOffset = None
+		if indexes:
+			rowLabelOffset = 0
+		if rowNumbers:
+			rowLabelOffset = 1
+		model = ArrayTableModel(columns, arrays, rowLabelOffset)
+		frame = JFrame(title)
+		frame.getContentPane().add(JScrollPane(JTable(model)))
+		frame.setSize(400, 600)
+		frame.setDefaultCloseOperation(JFrame.DISPOSE_ON_CLOSE)
+		frame.setVisible(True)
+		model.frame = frame
+		return model
+
+	@classmethod
+	def __namesOfArgs(cls, args):
+		'''
+		Returns the names of the variables passed as arguments to the function that called this method.
+
+		The locals of the calling frame are scanned only once for all arguments.
+		'''
+		import inspect
+		outerFrameLocals = inspect.currentframe().f_back.f_back.f_locals
+		namesById = {}
+		for key in outerFrameLocals.keys():
+			namesById[id(outerFrameLocals[key])] = key
+		return [namesById.get(id(arg)) for arg in args]
+
+	@classmethod
+	def __prepareShow(cls, args, names):
+		'''
+		Splits the arguments of show into the title, the column names, the arrays and the index and 
+		row number flags.
+		'''
+		if len(args)>0 and isinstance(args[0], basestring):
+			title = args[0]
+			arrays = list(args[1:])
+			names = names[1:]
+		else:
+			title = None
+			arrays = list(args)
+		if len(arrays)==0:
+			raise Exception('Array show needs at least one array')
+		if len(arrays)==1:
+			columns = ["Value"]
+			if title is None:
+				title = names[0] or "Arrays"
+		else:
+			columns = [name or "Value"+str(i+1) for i, name in enumerate(names)]
+			if title is None:
+				title = "Arrays"
+		indexes = False
+		rowNumbers = False
+		if title.find('(indexes)')>=0:
+			indexes = True
+			title = title.replace('(indexes)', '').strip()
+		if title.find('(row numbers)')>=0:
+			rowNumbers = True
+			title = title.replace('(row numbers)', '').strip()
+		return title, columns, arrays, indexes, rowNumbers
+
 	@classmethod
 	def slice(cls, array, start, stop=None):
 		'''
@@ -383,68 +1148,680 @@ class Array(object):
 		'''
 		if (stop is None):
 			stop = len(array)
-		return array[start:stop]
+		return cls.__view(array, start, stop)
+
+	@classmethod
+	def sort(cls, array):
+		'''
+		Sorts array, which must contain all numbers or all strings. String sorts are case-insensitive in v1.44i or later. 
+
+		The lower case sort key of each string is calculated only once.
+		'''
+		if (len(array)==0):
+			return array
+		if isinstance(array, pyarray):
+			Arrays.sort(array)
+			return array
+		if (isinstance(array[0],  basestring)):
+			return array.sort(key=methodcaller('lower'))
+		return array.sort()
+
+	@classmethod
+	def trim(cls, array, n):
+		'''
+		Returns an array that contains the first n elements of array. 
+		'''
+		return cls.__view(array, 0, n)
+
+	@classmethod
+	def rotate(cls, array, d):
+		'''
+		Rotates the array elements by 'd' steps (positive 'd' = rotate right). Requires 1.51n. `Examples`_. 
+
+		.. _`Examples`: https://imagej.net/macros/examples/RotateArray.txt
+		'''
+		if isinstance(array, ArrayView):
+			return array.rotate(d)
+		n = len(array)
+		if n == 0:
+			return array
+		d = d % n
+		if d:
+			array[:] = array[n-d:] + array[:n-d]
+		return array 
+
+	@classmethod
+	def __view(cls, array, start, stop):
+		'''
+		Returns a view on the elements start to stop of array. The elements of a list or primitive array are copied.
+		'''
+		if isinstance(array, ArrayView):
+			return array[start:stop]
+		return ArrayView(array[start:stop])
+
+	@classmethod
+	def getVertexAngles(cls, xArr, yArr, arm):
+		'''
+		From a closed contour given by 'xArr', 'yArr', an array is returned holding vertex angles in degrees 
+		(straight=0, convex = positive if contour is clockwise). 
+		
+		Set 'arm'=1 to calculate the angle from the closest vertex points left and right, or use arm>1 for 
+		more distant neighbours and smoother results. Requires 1.51n. `Examples`_.
+
+		.. _`Examples`: https://imagej.net/macros/examples/VertexAngles.txt
+		'''
+		if len(xArr)!=len(yArr):
+			raise Exception('Same size expected')
+		vAngles = jarray.zeros(len(xArr), cls.DOUBLE)
+		cls.__vertexAngles(xArr, yArr, arm, vAngles, 0)
+		return vAngles
+
+	@classmethod
+	def getVertexAnglesOfContours(cls, contours=None, arm=1):
+		'''
+		Calculates the vertex angles of many closed contours at once, see `getVertexAngles`_. 
+
+		'contours' is a list of rois or of (xArr, yArr) tuples. If it is None, the polygons of all rois 
+		in the ROI Manager are used. The contours are processed in parallel. 
+
+		Returns the tupel (angles, offsets). 'angles' is a double[] holding the vertex angles of all contours, 
+		one contour after the other, and the angles of contour i are angles[offsets[i]:offsets[i+1]]. For example:
+
+			angles, offsets = Array.getVertexAnglesOfContours(arm=2)
+			for i in range(len(offsets)-1):
+				curvature = Array.slice(angles, offsets[i], offsets[i+1])
+
+		.. _`getVertexAngles`: redirect.html#mripy.ijmpy.Array.getVertexAngles
+		'''
+		if contours is None:
+			contours = RoiManager.getRoiManager().getRoisAsArray()
+		polygons = [cls.__contourPoints(contour) for contour in contours]
+		offsets = jarray.zeros(len(polygons)+1, cls.INT)
+		for i in xrange(len(polygons)):
+			x, y = polygons[i]
+			if len(x)!=len(y):
+				raise Exception('Same size expected')
+			offsets[i+1] = offsets[i] + len(x)
+		angles = jarray.zeros(offsets[-1], cls.DOUBLE)
+		def anglesOfContour(i):
+			x, y = polygons[i]
+			cls.__vertexAngles(x, y, arm, angles, offsets[i])
+		Parallel.map(anglesOfContour, xrange(len(polygons)))
+		return angles, offsets
+
+	@classmethod
+	def __contourPoints(cls, contour):
+		if isinstance(contour, Roi):
+			polygon = contour.getFloatPolygon()
+			return Arrays.copyOf(polygon.xpoints, polygon.npoints), Arrays.copyOf(polygon.ypoints, polygon.npoints)
+		x, y = contour
+		return cls.asPrimitive(x), cls.asPrimitive(y)
+
+	@classmethod
+	def __vertexAngles(cls, x, y, arm, vAngles, offset):
+		'''
+		Writes the vertex angles of the contour x, y into vAngles, starting at offset.
+		'''
+		length = len(x)
+		atan2 = math.atan2
+		toDegrees = 180.0 / math.pi
+		for mid in xrange(length):
+			left = (mid - arm) % length
+			right = (mid + arm) % length
+			xMid = x[mid]
+			yMid = y[mid]
+			dxRight = x[right] - xMid
+			dyRight = y[right] - yMid
+			dxLeft = x[left] - xMid
+			dyLeft = y[left] - yMid
+			dotprod = dxRight * dxLeft + dyRight * dyLeft
+			crossprod = dxRight * dyLeft - dyRight * dxLeft
+			phi = 180.0 - toDegrees * atan2(crossprod, dotprod)
+			if phi >= 180.0:
+				phi -= 360.0
+			vAngles[offset + mid] = phi
+
+class Profiles(object):
+	'''
+	A sequence of 1D profiles that are read from an image only when they are accessed, 
+	as double[]. Used for the batch functions of `Array`_, for example `Array.findMaximaOfProfiles`_.
+
+	.. _`Array`: redirect.html#mripy.ijmpy.Array
+	.. _`Array.findMaximaOfProfiles`: redirect.html#mripy.ijmpy.Array.findMaximaOfProfiles
+	'''
+
+	def __init__(self, count, getProfile):
+		self.count = count
+		self.getProfile = getProfile
+
+	@classmethod
+	def rows(cls, image):
+		'''
+		Returns the rows of an ImagePlus (current plane) or ImageProcessor as profiles.
+		'''
+		ip = image.getProcessor() if hasattr(image, 'getStack') else image
+		width = ip.getWidth()
+		def row(y):
+			return Tools.toDouble(ip.getRow(0, y, jarray.zeros(width, 'f'), width))
+		return Profiles(ip.getHeight(), row)
+
+	@classmethod
+	def zProfiles(cls, image):
+		'''
+		Returns the z-profiles of all pixels of an ImagePlus or ImageStack as profiles. 
+		
+		Profile i belongs to the pixel x = i % width, y = i // width.
+		'''
+		stack = image.getStack() if hasattr(image, 'getStack') else image
+		width = stack.getWidth()
+		depth = stack.getSize()
+		def zProfile(i):
+			return Tools.toDouble(stack.getVoxels(i % width, i // width, 0, 1, 1, depth, None))
+		return Profiles(width * stack.getHeight(), zProfile)
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, index):
+		if index<0:
+			index = index + self.count
+		if index<0 or index>=self.count:
+			raise IndexError('Profiles index out of range')
+		return self.getProfile(index)
+
+	def __iter__(self):
+		for i in xrange(self.count):
+			yield self.getProfile(i)
+
+class FourierPlan(object):
+	'''
+	The setup needed to calculate the Fourier amplitudes of arrays of a given length with a given window type.
+
+	The FHT objects, which hold the sine/cosine and bit-reversal tables for the padded length, are created 
+	once and reused, one per thread. Plans are cached, use FourierPlan.get(length, windowType) to obtain one.
+	'''
+	MAX_CACHED_PLANS = 32
+	__plans = {}
+
+	@classmethod
+	def get(cls, length, windowType=Array.NO_WINDOW):
+		'''
+		Returns the cached plan for the length and window type, creating it if needed.
+		'''
+		key = (length, windowType)
+		plan = cls.__plans.get(key)
+		if plan is None:
+			if len(cls.__plans)>=cls.MAX_CACHED_PLANS:
+				cls.__plans.clear()
+			plan = FourierPlan(length, windowType)
+			cls.__plans[key] = plan
+		return plan
+
+	def __init__(self, length, windowType=Array.NO_WINDOW):
+		self.length = length
+		self.windowType = windowType
+		self.__wt = [Array.NO_WINDOW, Array.HAMMING, Array.HANN, Array.FLAT_TOP].index(windowType)
+		self.__transforms = ConcurrentLinkedQueue()
+		self.size = len(self.transform(jarray.zeros(length, Array.FLOAT)))
+
+	def transform(self, array):
+		'''
+		Returns the Fourier amplitudes of array as a float[].
+		'''
+		if len(array)!=self.length:
+			raise Exception('Array of length '+str(self.length)+' expected')
+		fht = self.__transforms.poll()
+		if fht is None:
+			fht = FHT()
+		try:
+			return fht.fourier1D(Array.asPrimitive(array, Array.FLOAT), self.__wt)
+		finally:
+			self.__transforms.offer(fht)
+
+	def transformAll(self, arrays, out=None):
+		'''
+		Calculates the Fourier amplitudes of all arrays in parallel and writes them one after 
+		the other into out, a float[] of length len(arrays)*size that is created if it is None.
+		'''
+		if out is None:
+			out = jarray.zeros(len(arrays) * self.size, Array.FLOAT)
+		if len(out)<len(arrays) * self.size:
+			raise Exception('Output array too short')
+		def transformArray(i):
+			System.arraycopy(self.transform(arrays[i]), 0, out, i * self.size, self.size)
+		Parallel.map(transformArray, xrange(len(arrays)))
+		return out
+
+class ArrayTableModel(AbstractTableModel):
+	'''
+	A table model that reads the values of the arrays it displays on demand.
+
+	Used by `Array.showVirtual`_. If rowLabelOffset is not None, a first column with the row index plus 
+	rowLabelOffset is shown.
+
+	.. _`Array.showVirtual`: redirect.html#mripy.ijmpy.Array.showVirtual
+	'''
+
+	def __init__(self, columns, arrays, rowLabelOffset=None):
+		AbstractTableModel.__init__(self)
+		self.columns = list(columns)
+		self.arrays = list(arrays)
+		self.rowLabelOffset = rowLabelOffset
+		if rowLabelOffset is not None:
+			self.columns.insert(0, " ")
+			self.arrays.insert(0, None)
+		self.rows = max(len(array) for array in arrays)
+		self.frame = None
+
+	def getRowCount(self):
+		return self.rows
+
+	def getColumnCount(self):
+		return len(self.columns)
+
+	def getColumnName(self, column):
+		return self.columns[column]
+
+	def getValueAt(self, row, column):
+		array = self.arrays[column]
+		if array is None:
+			return row + self.rowLabelOffset
+		if row>=len(array):
+			return None
+		return array[row]
+
+class StatisticsAccumulator(object):
+	'''
+	Calculates min, max, mean and stdDev of a stream of values in a single pass.
+
+	The mean and the sum of squared deviations are updated with Welford's algorithm, which, 
+	unlike the sum/sum2 formula, does not lose precision for large values or values with a big offset. 
+	Values can be added one by one, from lists, generators, java primitive arrays or chunks of pixel data. 
+	Accumulators filled by different workers can be combined with merge().
+
+	If keepValues is True, the values are kept, so that the median and arbitrary percentiles can be 
+	calculated as well. For example:
+
+		accumulator = StatisticsAccumulator(keepValues=True)
+		for z in range(1, stack.getSize()+1):
+			accumulator.addAll(stack.getPixels(z))
+		min, max, mean, stdDev = accumulator.getStatistics()
+		median = accumulator.median()
+	'''
+
+	def __init__(self, keepValues=False):
+		self.n = 0
+		self.mean = 0.0
+		self.m2 = 0.0
+		self.min = Double.POSITIVE_INFINITY
+		self.max = Double.NEGATIVE_INFINITY
+		self.values = [] if keepValues else None
+
+	def add(self, value):
+		'''
+		Adds a single value.
+		'''
+		self.n = self.n + 1
+		delta = value - self.mean
+		self.mean = self.mean + delta / float(self.n)
+		self.m2 = self.m2 + delta * (value - self.mean)
+		if value<self.min:
+			self.min = value
+		if value>self.max:
+			self.max = value
+		if self.values is not None:
+			self.values.append(value)
+		return self
+
+	def addAll(self, values):
+		'''
+		Adds all values of a list, a generator or a java primitive array. 
+		
+		Byte and short arrays, as returned by ImageProcessor.getPixels(), are read as unsigned values.
+		'''
+		mask = None
+		if isinstance(values, pyarray):
+			mask = {'b': 0xff, 'h': 0xffff}.get(values.typecode)
+		n = self.n
+		mean = self.mean
+		m2 = self.m2
+		min = self.min
+		max = self.max
+		kept = self.values
+		for value in values:
+			if mask is not None:
+				value = value & mask
+			n = n + 1
+			delta = value - mean
+			mean = mean + delta / float(n)
+			m2 = m2 + delta * (value - mean)
+			if value<min:
+				min = value
+			if value>max:
+				max = value
+			if kept is not None:
+				kept.append(value)
+		self.n = n
+		self.mean = mean
+		self.m2 = m2
+		self.min = min
+		self.max = max
+		return self
+
+	def merge(self, other):
+		'''
+		Adds the values accumulated by other to this accumulator, for example to combine the 
+		partial results of parallel workers.
+		'''
+		if other.n==0:
+			return self
+		if self.values is not None and other.values is None:
+			raise Exception('Can not merge, the values of the other accumulator have not been kept')
+		if self.n==0:
+			self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+		else:
+			n = self.n + other.n
+			delta = other.mean - self.mean
+			self.mean = self.mean + delta * other.n / float(n)
+			self.m2 = self.m2 + other.m2 + delta * delta * self.n * other.n / float(n)
+			self.n = n
+		if other.min<self.min:
+			self.min = other.min
+		if other.max>self.max:
+			self.max = other.max
+		if self.values is not None:
+			self.values.extend(other.values)
+		return self
+
+	def getStatistics(self):
+		'''
+		Returns the tupel (min, max, mean, stdDev).
+
+		Like in the ij-macro language, mean is NaN for an empty accumulator and stdDev is NaN if 
+		less than two values have been added.
+		'''
+		if self.n==0:
+			return self.min, self.max, NaN, NaN
+		if self.n<2:
+			return self.min, self.max, self.mean, NaN
+		stdDev = math.sqrt(self.m2 / float(self.n-1))
+		return self.min, self.max, self.mean, stdDev
+
+	def median(self):
+		'''
+		Returns the median of the values. Requires keepValues=True.
+		'''
+		return self.percentile(50)
+
+	def percentile(self, p):
+		'''
+		Returns the p-th percentile (0<=p<=100) of the values, interpolating linearly between 
+		the two closest ranks. Requires keepValues=True.
+
+		The values are partitioned with quickselect instead of being sorted, which takes linear 
+		time on average.
+		'''
+		if self.values is None:
+			raise Exception('Percentiles need an accumulator created with keepValues=True')
+		if p<0 or p>100:
+			raise Exception("Percentile ("+str(p)+") is outside of the 0-100 range")
+		if self.n==0:
+			return NaN
+		position = (self.n - 1) * p / 100.0
+		k = int(math.floor(position))
+		lower = self.__select(self.values, k)
+		if k+1>=self.n or position==k:
+			return lower
+		upper = min(self.values[k+1:])
+		return lower + (upper - lower) * (position - k)
+
+	@classmethod
+	def __select(cls, values, k):
+		'''
+		Reorders values so that values[k] is the k-th smallest value, all smaller or equal values 
+		are before it and all bigger or equal values after it, and returns values[k].
+		'''
+		left = 0
+		right = len(values) - 1
+		while right>left:
+			pivot = values[random.randint(left, right)]
+			i = left
+			j = right
+			while i<=j:
+				while values[i]<pivot:
+					i = i + 1
+				while values[j]>pivot:
+					j = j - 1
+				if i<=j:
+					values[i], values[j] = values[j], values[i]
+					i = i + 1
+					j = j - 1
+			if k<=j:
+				right = j
+			elif k>=i:
+				left = i
+			else:
+				return values[k]
+		return values[k]
+
+class ArrayView(object):
+	'''
+	A lazy view on one or more underlying arrays (lists, primitive arrays, xranges or other views).
+
+	Array.slice, trim, concat, deleteIndex and getSequence return views. Lists and primitive arrays 
+	passed to concat are copied once, views share the elements of the views they are made of. 
+	Reading from a view reads from the underlying arrays and reversing or rotating a view only 
+	rearranges its index mapping. The elements of a view are copied again when it is written to, 
+	so that writing to a view never modifies other views. Use Array.toList(view) or 
+	Array.asPrimitive(view) to hand a view to java.
 
-	@classmethod
-	def sort(cls, array):
+	ArrayView(array) does not copy array, changes to it are visible through the view. It is meant 
+	for read-only use inside ijmpy.
+	'''
+
+	class __Buffer(list):
 		'''
-		Sorts array, which must contain all numbers or all strings. String sorts are case-insensitive in v1.44i or later. 
+		Holds the single elements passed to concat. Views only use a fixed range of it, so 
+		elements can be appended without copying when the view using its end is concatenated again.
 		'''
-		if (len(array)==0):
-			return array
-		if (isinstance(array[0],  str)):
-			return array.sort(key=lambda y: y.lower())
-		return array.sort()
+		pass
+
+	def __init__(self, base=(), segments=None):
+		if segments is None:
+			segments = [(base, 0, 1, len(base))]
+		self.__setSegments(segments)
+		self.__own = None
 
 	@classmethod
-	def trim(cls, array, n):
+	def concat(cls, *args):
 		'''
-		Returns an array that contains the first n elements of array. 
+		Returns a view joining the arrays and single values in args. Lists and primitive arrays are copied.
 		'''
-		return array[:n]
+		segments = []
+		for arrayOrElement in args:
+			if isinstance(arrayOrElement, ArrayView):
+				arrayOrElement.__own = None
+				segments.extend(arrayOrElement.__segments)
+			elif isinstance(arrayOrElement, xrange):
+				segments.append((arrayOrElement, 0, 1, len(arrayOrElement)))
+			elif isinstance(arrayOrElement, (list, pyarray)):
+				segments.append((arrayOrElement[:], 0, 1, len(arrayOrElement)))
+			else:
+				cls.__appendElement(segments, arrayOrElement)
+		return ArrayView(segments=segments)
 
 	@classmethod
-	def rotate(cls, array, d):
+	def __appendElement(cls, segments, element):
+		if segments:
+			base, start, step, length = segments[-1]
+			if isinstance(base, cls.__Buffer) and step==1 and start+length==len(base):
+				base.append(element)
+				segments[-1] = (base, start, step, length+1)
+				return
+		segments.append((cls.__Buffer([element]), 0, 1, 1))
+
+	def __setSegments(self, segments):
+		self.__segments = [segment for segment in segments if segment[3]>0]
+		self.__offsets = []
+		length = 0
+		for segment in self.__segments:
+			self.__offsets.append(length)
+			length = length + segment[3]
+		self.__length = length
+
+	def __data(self):
+		'''
+		Makes sure the view owns a private copy of its elements and returns it.
+		'''
+		if self.__own is None:
+			self.__own = self.toList()
+			self.__dataChanged()
+		return self.__own
+
+	def __dataChanged(self):
+		self.__setSegments([(self.__own, 0, 1, len(self.__own))])
+
+	def __locate(self, index):
+		if index<0:
+			index = index + self.__length
+		if index<0 or index>=self.__length:
+			raise IndexError('ArrayView index out of range')
+		s = bisect.bisect_right(self.__offsets, index) - 1
+		base, start, step, length = self.__segments[s]
+		return base, start + (index - self.__offsets[s]) * step
+
+	def __slice(self, start, stop):
+		self.__own = None
+		segments = []
+		for (base, first, step, length), offset in zip(self.__segments, self.__offsets):
+			lo = max(start, offset)
+			hi = min(stop, offset + length)
+			if lo<hi:
+				segments.append((base, first + (lo - offset) * step, step, hi - lo))
+		return ArrayView(segments=segments)
+
+	def __len__(self):
+		return self.__length
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			start, stop, step = index.indices(self.__length)
+			if step==1:
+				return self.__slice(start, max(start, stop))
+			if len(self.__segments)==1:
+				self.__own = None
+				base, first, baseStep, length = self.__segments[0]
+				count = len(xrange(start, stop, step))
+				return ArrayView(segments=[(base, first + start * baseStep, baseStep * step, count)])
+			return ArrayView(self.toList()[index])
+		base, position = self.__locate(index)
+		return base[position]
+
+	def __setitem__(self, index, value):
+		self.__data()[index] = value
+		if isinstance(index, slice):
+			self.__dataChanged()
+
+	def __delitem__(self, index):
+		del self.__data()[index]
+		self.__dataChanged()
+
+	def __iter__(self):
+		for base, first, step, length in self.__segments:
+			for i in xrange(first, first + length * step, step):
+				yield base[i]
+
+	def __add__(self, other):
+		return ArrayView.concat(self, other)
+
+	def __radd__(self, other):
+		return ArrayView.concat(other, self)
+
+	def __eq__(self, other):
+		try:
+			return self.toList()==list(other)
+		except TypeError:
+			return False
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	__hash__ = None
+
+	def __repr__(self):
+		return repr(self.toList())
+
+	def append(self, value):
+		self.__data().append(value)
+		self.__dataChanged()
+
+	def extend(self, values):
+		self.__data().extend(values)
+		self.__dataChanged()
+
+	def sort(self, *args, **kwargs):
+		self.__data().sort(*args, **kwargs)
+
+	def index(self, value):
+		for i, element in enumerate(self):
+			if element==value:
+				return i
+		raise ValueError('value not in ArrayView')
+
+	def count(self, value):
+		return sum(1 for element in self if element==value)
+
+	def reverse(self):
 		'''
-		Rotates the array elements by 'd' steps (positive 'd' = rotate right). Requires 1.51n. `Examples`_. 
+		Reverses the view in place, without copying the elements.
+		'''
+		if self.__own is not None:
+			self.__own.reverse()
+			return self
+		self.__setSegments([(base, first + (length - 1) * step, -step, length) for base, first, step, length in reversed(self.__segments)])
+		return self
 
-		.. _`Examples`: https://imagej.net/macros/examples/RotateArray.txt
+	def rotate(self, d):
 		'''
-		if len(array) == 0:
-			return array
-		rotated = deque(array) 
-		rotated.rotate(d)
-		for i in range(0, len(array)):
-			array[i] = rotated[i]
-		return array 
+		Rotates the view in place by 'd' steps (positive 'd' = rotate right), without copying the elements.
+		'''
+		n = self.__length
+		if n==0:
+			return self
+		d = d % n
+		if d==0:
+			return self
+		if self.__own is not None:
+			data = self.__own
+			data[:] = data[n-d:] + data[:n-d]
+			return self
+		right = self.__slice(n - d, n)
+		left = self.__slice(0, n - d)
+		self.__setSegments(right.__segments + left.__segments)
+		return self
 
-	@classmethod
-	def getVertexAngles(cls, xArr, yArr, arm):
+	def toList(self):
 		'''
-		From a closed contour given by 'xArr', 'yArr', an array is returned holding vertex angles in degrees 
-		(straight=0, convex = positive if contour is clockwise). 
-		
-		Set 'arm'=1 to calculate the angle from the closest vertex points left and right, or use arm>1 for 
-		more distant neighbours and smoother results. Requires 1.51n. `Examples`_.
+		Returns the elements of the view as a new python list.
+		'''
+		result = []
+		for base, first, step, length in self.__segments:
+			if step==1 and isinstance(base, list):
+				result.extend(base[first:first + length])
+			else:
+				result.extend(base[i] for i in xrange(first, first + length * step, step))
+		return result
 
-		.. _`Examples`: https://imagej.net/macros/examples/VertexAngles.txt
+	def toPrimitive(self, typecode=Array.DOUBLE):
 		'''
-		if len(xArr)!=len(yArr):
-			raise Exception('Same size expected')
-		length = len(xArr)
-		vAngles = [0]*length
-		x = xArr
-		y = yArr
-		for mid in range(0, length):
-			left = (mid + 10 * length - arm) % length
-			right = (mid + arm) % length
-			dotprod = (x[right] - x[mid]) * (x[left] - x[mid]) + (y[right] - y[mid]) * (y[left] - y[mid])
-			crossprod = (x[right] - x[mid]) * (y[left] - y[mid]) - (y[right] - y[mid]) * (x[left] - x[mid])
-			phi = 180.0 - 180.0 / math.pi * math.atan2(crossprod, dotprod)
-			while phi >= 180.0:
-				phi -= 360.0
-			vAngles[mid] = phi
-		return vAngles
+		Returns the elements of the view as a new java primitive array.
+		'''
+		result = jarray.zeros(self.__length, typecode)
+		i = 0
+		for value in self:
+			result[i] = value
+			i = i + 1
+		return result
 
 def asin(n):
 	'''
@@ -473,10 +1850,11 @@ def autoUpdate(aBoolean):
 	'''
 	If boolean is true, the display is refreshed each time lineTo(), `drawLine()`_, `drawString()`_, etc. are called.
 	
-	Otherwise, the display is refreshed only when updateDisplay() is called or when the macro terminates. 
+	Otherwise, the display is refreshed only when `updateDisplay()`_ is called or when the macro terminates. 
 
 	.. _`drawLine()`: redirect.html#mripy.ijmpy.drawLine
 	.. _`drawString()`: redirect.html#mripy.ijmpy.drawString
+	.. _`updateDisplay()`: redirect.html#mripy.ijmpy.updateDisplay
 	'''
 	Settings.AUTO_UPDATE = aBoolean
 	
@@ -486,6 +1864,21 @@ def isAutoUpdate():
 	'''
 	return Settings.AUTO_UPDATE
 
+def updateDisplay():
+	'''
+	Redraws the active image.
+
+	See also: 
+	=========
+	`autoUpdate`_, `DrawBatch`_
+
+	.. _`autoUpdate`: redirect.html#mripy.ijmpy.autoUpdate
+	.. _`DrawBatch`: redirect.html#mripy.ijmpy.DrawBatch
+	'''
+	imp = __getImage()
+	imp.updateChannelAndDraw()
+	Settings.UPDATE_NEEDED = False
+
 def beep():
 	'''
 	Emits an audible beep.
@@ -496,7 +1889,7 @@ def bitDepth():
 	'''
 	Returns the bit depth of the active image: 8, 16, 24 (RGB) or 32 (float). 
 	'''
-	return IJ.getImage().getBitDepth()
+	return __getImage().getBitDepth()
 
 def calibrate(value):
 	'''
@@ -505,7 +1898,7 @@ def calibrate(value):
 	The argument must be an integer in the range 0-255 (for 8-bit images) or 0-65535 (for 16-bit images). 
 	Returns the same value if the active image does not have a calibration function. 
 	'''
-	cValue = IJ.getImage().getCalibration().getCValue(value)
+	cValue = __getHandle().calibrate(value)
 	return cValue
 
 def call(classAndMethodName, *args):
@@ -514,17 +1907,76 @@ def call(classAndMethodName, *args):
 	
 	Refer to the `CallJavaDemo`_ macro and the `ImpProps`_ plugin for examples. 
 
+	In ijmpy the class and the method are only looked up on the first call, see `JavaCall`_. 
+	Use `callAll`_ to call a method for many arguments.
+
 	.. _`CallJavaDemo`: https://imagej.net/macros/CallJavaDemo.txt
 	.. _`ImpProps`: https://imagej.net/plugins/imp-props.html
+	.. _`JavaCall`: redirect.html#mripy.ijmpy.JavaCall
+	.. _`callAll`: redirect.html#mripy.ijmpy.callAll
+	'''
+	return JavaCall.get(classAndMethodName, len(args))(*args)
+
+def callAll(classAndMethodName, arguments):
+	'''
+	Calls a public static method in a Java class, see `call`_, once for each element of arguments and returns the list of the results.
+
+	The elements of arguments are tuples of arguments or single arguments. The method is only looked up once, 
+	for example:
+
+		names = callAll("ij.plugin.frame.RoiManager.getName", range(roiManager("count")))
+
+	.. _`call`: redirect.html#mripy.ijmpy.call
+	'''
+	calls = {}
+	results = []
+	for args in arguments:
+		if not isinstance(args, (tuple, list)):
+			args = (args,)
+		javaCall = calls.get(len(args))
+		if javaCall is None:
+			javaCall = JavaCall.get(classAndMethodName, len(args))
+			calls[len(args)] = javaCall
+		results.append(javaCall(*args))
+	return results
+
+class JavaCall(object):
+	'''
+	A public static method, looked up for `call`_ and `callAll`_.
+
+	The class is imported and the method is called with the arguments unchanged. Calls are cached, 
+	use JavaCall.get(classAndMethodName, numberOfArguments) to obtain one.
+
+	.. _`call`: redirect.html#mripy.ijmpy.call
+	.. _`callAll`: redirect.html#mripy.ijmpy.callAll
 	'''
-	index = classAndMethodName.rfind('.')
-	className = classAndMethodName[0:index]
-	methodName = classAndMethodName[index+1:len(classAndMethodName)]
-	aClass = importlib.import_module(className)
-	res = getattr(aClass, methodName)(*args)
-	return res
+	MAX_CACHED_CALLS = 256
+	__calls = {}
+
+	@classmethod
+	def get(cls, classAndMethodName, numberOfArguments):
+		'''
+		Returns the cached call of the method with numberOfArguments arguments, creating it if needed.
+		'''
+		key = (classAndMethodName, numberOfArguments)
+		javaCall = cls.__calls.get(key)
+		if javaCall is None:
+			if len(cls.__calls)>=cls.MAX_CACHED_CALLS:
+				cls.__calls.clear()
+			javaCall = JavaCall(classAndMethodName, numberOfArguments)
+			cls.__calls[key] = javaCall
+		return javaCall
+
+	def __init__(self, classAndMethodName, numberOfArguments):
+		index = classAndMethodName.rfind('.')
+		className = classAndMethodName[0:index]
+		methodName = classAndMethodName[index+1:len(classAndMethodName)]
+		self.function = getattr(importlib.import_module(className), methodName)
 
-def changeValues(low, high, newValue):
+	def __call__(self, *args):
+		return self.function(*[arg.toList() if isinstance(arg, ArrayView) else arg for arg in args])
+
+def changeValues(low, high, newValue, imp=None, stack=False):
 	'''
 	Changes pixels in the image or selection that have a value in the range v1-v2 to v3. 
 	
@@ -532,32 +1984,123 @@ def changeValues(low, high, newValue):
 	changes all blue pixels in an RGB image to red. 
 	
 	In ImageJ 1.52d or later, use changeValues(NaN,NaN,value) to replaces NaN values. 
+
+	In ijmpy the image can be passed as 'imp' and, if 'stack' is True, all planes of a stack or hyperstack 
+	are changed, in parallel. 'stack' can also be a selection of planes made with `Planes.select`_. 
+	Returns the number of pixels that have been changed.
+
+	.. _`Planes.select`: redirect.html#mripy.ijmpy.Planes.select
 	'''
-	image = IJ.getImage()
-	ip = image.getProcessor()
-	roi = image.getRoi()
-	width = image.getWidth()
-	height = image.getHeight()
-	isFloat = image.getBitDepth()==32
-	if image.getBitDepth()==24: 
+	if not imp:
+		imp = __getImage()
+	bitDepth = imp.getBitDepth()
+	if bitDepth==24: 
 		low = int(low&0xffffff)
 		high = int(high&0xffffff)
-	if roi is None:
-		roi = Roi(0,0,width,height)
-	replaceNaN = False
-	if Double.isNaN(low) and Double.isNaN(high):
-		replaceNaN = True
-	for p in roi:
-		if isFloat:
-			value = ip.getPixelValue(p.x,p.y)
-		else:
-			value = ip.getPixel(p.x,p.y)&0xffffff;
-		if (value>=low and value<=high) or replaceNaN:
-			if isFloat:
-				ip.putPixelValue(p.x, p.y, newValue)
-			else:
-				ip.putPixel(p.x, p.y, int(newValue));
-	image.updateAndDraw()
+	replaceNaN = Double.isNaN(low) and Double.isNaN(high)
+	rect, mask = __getRectAndMask(imp)
+	if bitDepth==8 or bitDepth==16:
+		change = __changeValuesWithTable(low, high, newValue, 255 if bitDepth==8 else 65535, replaceNaN)
+	elif bitDepth==32:
+		change = lambda ip: __changeFloatValues(ip, rect, mask, low, high, newValue, replaceNaN)
+	else:
+		change = lambda ip: __changeRGBValues(ip, rect, mask, low, high, int(newValue))
+	if stack:
+		return sum(Planes.apply(imp, lambda ip: change(__withRoi(ip, rect, mask)), stack))
+	ip = imp.getProcessor()
+	count = change(__withRoi(ip, rect, mask))
+	ip.resetRoi()
+	imp.updateAndDraw()
+	return count
+
+def __getRectAndMask(imp):
+	'''
+	Returns the bounds of the area selection of the image, clipped to the image, and its mask (None for rectangles). 
+	Returns the whole image and no mask if there is no area selection.
+	'''
+	roi = imp.getRoi()
+	if roi is None or not roi.isArea():
+		return Rectangle(0, 0, imp.getWidth(), imp.getHeight()), None
+	bounds = roi.getBounds()
+	rect = bounds.intersection(Rectangle(0, 0, imp.getWidth(), imp.getHeight()))
+	mask = roi.getMask()
+	if mask is not None and not rect.equals(bounds):
+		mask = mask.duplicate()
+		mask.setRoi(rect.x - bounds.x, rect.y - bounds.y, rect.width, rect.height)
+		mask = mask.crop()
+	return rect, mask
+
+def __withRoi(ip, rect, mask):
+	ip.setRoi(rect)
+	ip.setMask(mask)
+	return ip
+
+def __changeValuesWithTable(low, high, newValue, maxValue, replaceNaN):
+	'''
+	Returns a function that changes the values of an 8- or 16-bit processor with a lookup table, 
+	counting the changed pixels with the histogram. Both respect the roi and the mask of the processor.
+	'''
+	if replaceNaN or Double.isNaN(low) or Double.isNaN(high):
+		return lambda ip: 0
+	first = int(math.ceil(max(0, low)))
+	last = int(math.floor(min(maxValue, high)))
+	if first>last:
+		return lambda ip: 0
+	table = range(maxValue+1)
+	value = min(maxValue, max(0, int(newValue)))
+	for i in xrange(first, last+1):
+		table[i] = value
+	table = jarray.array(table, Array.INT)
+	def change(ip):
+		count = sum(ip.getHistogram()[first:last+1])
+		if count==0:
+			return 0
+		mask = ip.getMask()
+		if mask is not None:
+			ip.snapshot()
+		ip.applyTable(table)
+		if mask is not None:
+			ip.reset(mask)
+		return count
+	return change
+
+def __changeFloatValues(ip, rect, mask, low, high, newValue, replaceNaN):
+	pixels = ip.getPixels()
+	maskPixels = mask.getPixels() if mask is not None else None
+	width = ip.getWidth()
+	count = 0
+	for y in xrange(rect.y, rect.y + rect.height):
+		offset = y * width
+		maskOffset = (y - rect.y) * rect.width - rect.x
+		for x in xrange(rect.x, rect.x + rect.width):
+			if maskPixels is not None and maskPixels[maskOffset + x]==0:
+				continue
+			value = pixels[offset + x]
+			if replaceNaN:
+				if value!=value:
+					pixels[offset + x] = newValue
+					count = count + 1
+			elif value>=low and value<=high:
+				pixels[offset + x] = newValue
+				count = count + 1
+	return count
+
+def __changeRGBValues(ip, rect, mask, low, high, newValue):
+	pixels = ip.getPixels()
+	maskPixels = mask.getPixels() if mask is not None else None
+	width = ip.getWidth()
+	count = 0
+	for y in xrange(rect.y, rect.y + rect.height):
+		offset = y * width
+		maskOffset = (y - rect.y) * rect.width - rect.x
+		for x in xrange(rect.x, rect.x + rect.width):
+			if maskPixels is not None and maskPixels[maskOffset + x]==0:
+				continue
+			value = pixels[offset + x] & 0xffffff
+			if value>=low and value<=high:
+				pixels[offset + x] = newValue
+				count = count + 1
+	return count
 
 def charCodeAt(aString, index):
 	'''
@@ -572,7 +2115,7 @@ def charCodeAt(aString, index):
 	ch = uString[index]
 	return ord(ch)	
 
-def close(pattern=""):
+def close(pattern="", keep=None):
 	'''
 	Closes the active image. 
 	
@@ -592,13 +2135,76 @@ def close(pattern=""):
 	
 	close("\\Others")
 		Closes all images except for the front image. 
+
+	In ijmpy "keep" is passed as second parameter, close(pattern, "keep"). The windows are closed directly 
+	and not by running a macro. Returns the number of closed windows.
+	'''
+	keepChanged = keep is not None and keep.lower()=="keep"
+	if pattern=="":
+		imp = Context.current().currentImage()
+		if imp is None:
+			raise Exception('There are no images open')
+		return __closeImages([imp], keepChanged)
+	if pattern=="\\Others":
+		current = Context.current().currentImage()
+		return __closeImages([image for image in __openImages() if image is not current], keepChanged)
+	hasWildcards = '*' in pattern or '?' in pattern
+	matches = re.compile(__wildcardToRegex(pattern)).match
+	count = __closeImages([image for image in __openImages() if matches(image.getTitle())], keepChanged)
+	isText = os.path.splitext(pattern)[1].lower() in ('.txt', '.ijm', '.js', '.py', '.bsh', '.java', '.csv', '.xls')
+	if hasWildcards and not isText:
+		return count
+	for title in WindowManager.getNonImageTitles():
+		if not matches(title):
+			continue
+		window = WindowManager.getWindow(title)
+		if window is None:
+			continue
+		if keepChanged and hasattr(window, 'fileChanged') and window.fileChanged():
+			continue
+		if hasattr(window, 'close'):
+			window.close()
+		else:
+			window.dispose()
+		count = count + 1
+	return count
+
+def __openImages():
 	'''
-	if (pattern==""):
-		value = IJ.runMacro("close();")
-	else:	
-		macro = 'close("'+pattern+'")'
-		value = IJ.runMacro(macro)
-	return value
+	Returns the open images of the current context, the displayed images that belong to it followed by its 
+	images of the batch mode. Images of other contexts are left out.
+	'''
+	context = Context.current()
+	ids = WindowManager.getIDList()
+	images = [] if ids is None else [WindowManager.getImage(id) for id in ids]
+	images = [imp for imp in images if imp is not None and context.owns(imp)]
+	return images + [imp for imp in context.images if not imp in images]
+
+def __closeImages(images, keepChanged):
+	context = Context.current()
+	count = 0
+	for imp in images:
+		if imp is None or (keepChanged and imp.changes):
+			continue
+		imp.changes = False
+		imp.close()
+		context.forget(imp)
+		count = count + 1
+	return count
+
+def __wildcardToRegex(pattern):
+	'''
+	Converts a pattern with the wildcards '*' and '?' into a regular expression that matches whole titles.
+	'''
+	parts = []
+	for ch in pattern:
+		if ch=='*':
+			parts.append('.*')
+		elif ch=='?':
+			parts.append('.')
+		else:
+			parts.append(re.escape(ch))
+	return '(?s)'+''.join(parts)+'$'
 
 def cos(angle):
 	'''
@@ -619,6 +2225,29 @@ def d2s(n, decimalPlaces):
 	'''
 	return IJ.d2s(n, decimalPlaces)
 
+def toString(number, decimalPlaces=None):
+	'''
+	Returns a decimal string representation of number. 
+	
+	As in the macro language, integer values are converted without decimal places and other values with 
+	four decimal places, so that toString(2.0) is "2" and toString(1/3) is "0.3333". With 'decimalPlaces', 
+	the specified number of decimal places is used, see `d2s`_. Strings are returned unchanged, other 
+	objects are converted with str().
+
+	.. _`d2s`: redirect.html#mripy.ijmpy.d2s
+	'''
+	if isinstance(number, basestring):
+		return number
+	if not isinstance(number, (int, long, float)):
+		return str(number)
+	if decimalPlaces is not None:
+		return IJ.d2s(number, decimalPlaces)
+	if Double.isNaN(number) or Double.isInfinite(number):
+		return Double.toString(number)
+	if number==round(number) and abs(number)<1e9:
+		return IJ.d2s(number, 0)
+	return IJ.d2s(number, 4, 9)
+
 def debug(arg):
 	'''
 	Start debugging.
@@ -628,6 +2257,18 @@ def debug(arg):
 	'''
 	import pdb; pdb.set_trace()
 
+class DialogMeta(type):
+	'''
+	Meta class of the class Dialog. The dialog is kept in the current context.
+	'''
+	@property
+	def GD(self):
+		return Context.current().dialog
+
+	@GD.setter
+	def GD(self, value):
+		Context.current().dialog = value
+
 class Dialog(object):
 	'''
 	Dialog.create(title) creates a modal dialog box with the specified title, or use Dialog.createNonBlocking("Title") to create a non-modal dialog. 
@@ -639,7 +2280,7 @@ class Dialog(object):
 
 	.. _`DialogDemo`: https://imagej.net/macros/DialogDemo.txt
 	'''
-	GD = None
+	__metaclass__ = DialogMeta
 
 	@classmethod
 	def create(cls, title):
@@ -910,8 +2551,88 @@ def doWand(x, y, tolerance=0, mode=None):
 
 	.. _`example`: https://imagej.net/macros/examples/SmoothLetters.txt
 	'''
-	IJ.doWand(x, y, tolerance, mode)
-	return IJ.getImage().getRoi()
+	imp = __getImage()
+	IJ.doWand(imp, x, y, tolerance, mode)
+	return imp.getRoi()
+
+class DrawBatch(object):
+	'''
+	Collects the drawing operations on an image and repaints the image once, at the end. 
+
+	While the batch is active, drawLine, drawOval, drawRect, drawString and floodFill on its image are 
+	recorded instead of being drawn. When the batch is flushed (at the end of the with-block or by calling 
+	flush()) the operations are applied to the processor in the order of the calls and only the rectangle 
+	that contains all of them is repainted:
+
+		with DrawBatch(imp):
+			for x, y in points:
+				drawOval(x-2, y-2, 5, 5)
+
+	If auto-update is off, the image is not repainted, see `updateDisplay`_.
+
+	.. _`updateDisplay`: redirect.html#mripy.ijmpy.updateDisplay
+	'''
+
+	def __init__(self, imp=None):
+		if imp is None:
+			imp = Context.current().activeImage()
+		self.imp = imp
+		self.operations = []
+		self.dirty = None
+		self.__previous = []
+
+	def __enter__(self):
+		self.__previous.append(Settings.DRAW_BATCH)
+		Settings.DRAW_BATCH = self
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		Settings.DRAW_BATCH = self.__previous.pop()
+		self.flush()
+		return False
+
+	def add(self, operation):
+		'''
+		Records an operation. operation(ip) draws on the processor and returns the rectangle 
+		it has changed. 
+		
+		The line width and the drawing color of the processor are recorded with the operation
+		and set again before it is applied.
+		'''
+		ip = self.imp.getProcessor()
+		self.operations.append((operation, ip.getLineWidth(), ip.getForegroundValue()))
+
+	def flush(self):
+		'''
+		Applies the recorded operations and repaints the changed rectangle. Returns the rectangle 
+		or None if nothing has been drawn.
+		'''
+		ip = self.imp.getProcessor()
+		bounds = Rectangle(0, 0, ip.getWidth(), ip.getHeight())
+		operations, self.operations = self.operations, []
+		lineWidth, value = ip.getLineWidth(), ip.getForegroundValue()
+		try:
+			for operation, operationLineWidth, operationValue in operations:
+				ip.setLineWidth(operationLineWidth)
+				ip.setValue(operationValue)
+				rect = operation(ip).intersection(bounds)
+				if rect.isEmpty():
+					continue
+				self.dirty = rect if self.dirty is None else self.dirty.union(rect)
+		finally:
+			ip.setLineWidth(lineWidth)
+			ip.setValue(value)
+		dirty, self.dirty = self.dirty, None
+		if dirty is None:
+			return None
+		self.imp.changes = True
+		if not Settings.AUTO_UPDATE:
+			Settings.UPDATE_NEEDED = True
+		elif self.imp.isComposite():
+			self.imp.updateChannelAndDraw()
+		else:
+			self.imp.draw(dirty.x, dirty.y, dirty.width, dirty.height)
+		return dirty
 
 def drawLine(x1, y1, x2, y2):
 	'''
@@ -921,69 +2642,529 @@ def drawLine(x1, y1, x2, y2):
 	
 	See also:
 	=========
-	Overlay.drawLine
+	`Overlay.drawLine`_, `DrawBatch`_
+
+	.. _`Overlay.drawLine`: redirect.html#mripy.ijmpy.Overlay.drawLine
+	.. _`DrawBatch`: redirect.html#mripy.ijmpy.DrawBatch
 	''' 
-	imp = IJ.getImage()
-	imp.getProcessor().drawLine(x1, y1, x2, y2)
-	__updateAndDraw()
-	return imp
+	def draw(ip):
+		ip.drawLine(x1, y1, x2, y2)
+		return __paddedBounds(ip, min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1))
+	return __draw(draw)
+
+def drawOval(x, y, width, height):
+	'''
+	Draws the outline of an oval using the current color and line width. 
+	
+	See also: 
+	=========
+	`fillOval`_, setColor, setLineWidth, `autoUpdate`_ and `Overlay.drawEllipse`_. 
+
+	.. _`fillOval`: redirect.html#mripy.ijmpy.fillOval
+	.. _`autoUpdate`: redirect.html#mripy.ijmpy.autoUpdate
+	.. _`Overlay.drawEllipse`: redirect.html#mripy.ijmpy.Overlay.drawEllipse
+	'''
+	def draw(ip):
+		ip.drawOval(x, y, width, height)
+		return __paddedBounds(ip, x, y, width, height)
+	return __draw(draw)
+
+def drawRect(x, y, width, height):
+	'''
+	Draws the outline of a rectangle using the current color and line width. 
+	
+	See also: 
+	=========
+	`fillRect`_, setColor, setLineWidth, `autoUpdate`_ and `Overlay.drawRect`_ 
+
+	.. _`fillRect`: redirect.html#mripy.ijmpy.fillRect
+	.. _`autoUpdate`: redirect.html#mripy.ijmpy.autoUpdate
+	.. _`Overlay.drawRect`: redirect.html#mripy.ijmpy.Overlay.drawRect
+	'''
+	def draw(ip):
+		ip.drawRect(x, y, width, height)
+		return __paddedBounds(ip, x, y, width, height)
+	return __draw(draw)
+
+def drawString(aText, x, y, background=None):
+	'''
+	Draws text at the specified location with a filled background. 
+
+	The first character is drawn obove and to the right of (x,y). Call setFont() to specify the font. 
+	Call setJustification() to have the text centered or right justified. Call getStringWidth() to get 
+	the width of the text in pixels. Refer to the TextDemo macro for examples and to DrawTextWithBackground 
+	to see how to draw text with a background. 
+	'''
+	font, justification, antialiased = Settings.FONT, Settings.JUSTIFICATION, Settings.ANTIALIASED_TEXT
+	if not background is None:
+		aColor = __getColor(background)
+	elif not Settings.GLOBAL_COLOR is None:
+		aColor = Settings.GLOBAL_COLOR
+	else:
+		aColor = Toolbar.getForegroundColor()
+	def draw(ip):
+		if not font is None:
+			ip.setFont(font)
+		ip.setJustification(justification);
+		ip.setAntialiasedText(antialiased)
+		if not background is None:
+			ip.drawString(aText, x, y, aColor)
+		else:
+			ip.setColor(aColor)
+			ip.drawString(aText, x, y)
+		width = ip.getStringWidth(aText)
+		height = ip.getFontMetrics().getHeight()
+		left = x
+		if justification==ImageProcessor.CENTER_JUSTIFY:
+			left = x - width // 2
+		elif justification==ImageProcessor.RIGHT_JUSTIFY:
+			left = x - width
+		return Rectangle(int(left) - 2, int(y) - height - 2, width + 4, 2 * height + 4)
+	__draw(draw)
+
+class Overlay(object):
+	'''
+	Adds vector shapes to the overlay of an image. The pixels of the image are not changed. 
+
+	Overlay.drawLine(), Overlay.drawRect(), Overlay.drawEllipse() and Overlay.drawString() add one shape, 
+	like the macro functions of the same name. Overlay.addLines(), Overlay.addRects(), Overlay.addEllipses(), 
+	Overlay.addPolygons() and Overlay.addLabels() add one shape for each element of the coordinate arrays. 
+	All shapes of one call share the same color, stroke and font objects and the image is repainted once:
+
+		Overlay.addEllipses(xs, ys, diameters, diameters, color="yellow")
+
+	If no color is given, the drawing color (Settings.GLOBAL_COLOR) or else the foreground color is used. Colors can be java.awt.Color objects 
+	or strings like "red" or "#ff0000".
+	'''
+
+	@classmethod
+	def drawLine(cls, x1, y1, x2, y2, imp=None):
+		'''
+		Adds a line between (x1, y1) and (x2, y2) to the overlay.
+		'''
+		return cls.addLines([x1], [y1], [x2], [y2], imp=imp)
+
+	@classmethod
+	def drawRect(cls, x, y, width, height, imp=None):
+		'''
+		Adds a rectangle to the overlay.
+		'''
+		return cls.addRects([x], [y], [width], [height], imp=imp)
+
+	@classmethod
+	def drawEllipse(cls, x, y, width, height, imp=None):
+		'''
+		Adds an ellipse that fits the specified rectangle to the overlay.
+		'''
+		return cls.addEllipses([x], [y], [width], [height], imp=imp)
+
+	@classmethod
+	def drawString(cls, text, x, y, imp=None):
+		'''
+		Adds text to the overlay. The first character is drawn above and to the right of (x,y).
+		'''
+		font = cls.__font()
+		return cls.addLabels([text], [x], [y - font.getSize()], font=font, imp=imp)
+
+	@classmethod
+	def addLines(cls, x1, y1, x2, y2, color=None, lineWidth=1, imp=None):
+		'''
+		Adds the lines from (x1[i], y1[i]) to (x2[i], y2[i]) to the overlay.
+		'''
+		rois = [Line(x1[i], y1[i], x2[i], y2[i]) for i in xrange(len(x1))]
+		return cls.add(rois, color, lineWidth, imp=imp)
+
+	@classmethod
+	def addRects(cls, x, y, width, height, color=None, lineWidth=1, fillColor=None, imp=None):
+		'''
+		Adds the rectangles (x[i], y[i], width[i], height[i]) to the overlay.
+		'''
+		rois = [Roi(x[i], y[i], width[i], height[i]) for i in xrange(len(x))]
+		return cls.add(rois, color, lineWidth, fillColor, imp)
+
+	@classmethod
+	def addEllipses(cls, x, y, width, height, color=None, lineWidth=1, fillColor=None, imp=None):
+		'''
+		Adds the ellipses that fit the rectangles (x[i], y[i], width[i], height[i]) to the overlay.
+		'''
+		rois = [OvalRoi(x[i], y[i], width[i], height[i]) for i in xrange(len(x))]
+		return cls.add(rois, color, lineWidth, fillColor, imp)
+
+	@classmethod
+	def addPolygons(cls, xArrays, yArrays, color=None, lineWidth=1, fillColor=None, closed=True, imp=None):
+		'''
+		Adds a polygon, or a polyline if 'closed' is False, for each pair of coordinate arrays to the overlay.
+		'''
+		kind = Roi.POLYGON if closed else Roi.POLYLINE
+		rois = []
+		for i in xrange(len(xArrays)):
+			polygon = FloatPolygon(Array.asPrimitive(xArrays[i], Array.FLOAT), Array.asPrimitive(yArrays[i], Array.FLOAT))
+			rois.append(PolygonRoi(polygon, kind))
+		return cls.add(rois, color, lineWidth, fillColor, imp)
+
+	@classmethod
+	def addLabels(cls, texts, x, y, color=None, font=None, imp=None):
+		'''
+		Adds the texts with their upper left corners at (x[i], y[i]) to the overlay.
+		'''
+		if font is None:
+			font = cls.__font()
+		rois = [TextRoi(x[i], y[i], texts[i], font) for i in xrange(len(texts))]
+		return cls.add(rois, color, imp=imp)
+
+	@classmethod
+	def add(cls, rois, color=None, lineWidth=1, fillColor=None, imp=None):
+		'''
+		Adds the rois to the overlay of the image, creating the overlay if needed, and repaints the image once. 
+
+		The rois get the same color and stroke objects. Returns the overlay.
+		'''
+		imp = cls.__image(imp)
+		color = cls.__color(color)
+		fillColor = cls.__color(fillColor) if fillColor is not None else None
+		stroke = BasicStroke(lineWidth) if lineWidth!=1 else None
+		overlay = imp.getOverlay()
+		created = overlay is None
+		if created:
+			overlay = ImageOverlay()
+		for roi in rois:
+			roi.setStrokeColor(color)
+			if stroke is not None:
+				roi.setStroke(stroke)
+			if fillColor is not None:
+				roi.setFillColor(fillColor)
+			overlay.add(roi)
+		if created:
+			imp.setOverlay(overlay)
+		else:
+			imp.draw()
+		return overlay
+
+	@classmethod
+	def size(cls, imp=None):
+		'''
+		Returns the number of shapes in the overlay of the image.
+		'''
+		overlay = cls.__image(imp).getOverlay()
+		if overlay is None:
+			return 0
+		return overlay.size()
+
+	@classmethod
+	def cull(cls, imp=None, minScreenSize=1.0):
+		'''
+		Replaces the overlay of the image by a `CulledOverlay`_ with the same shapes and properties and, 
+		if the image is displayed, its canvas by a `CullingCanvas`_, so that only the shapes in the visible 
+		part of the image are painted. Returns the culled overlay.
+
+		.. _`CulledOverlay`: redirect.html#mripy.ijmpy.CulledOverlay
+		.. _`CullingCanvas`: redirect.html#mripy.ijmpy.CullingCanvas
+		'''
+		imp = cls.__image(imp)
+		overlay = imp.getOverlay()
+		if isinstance(overlay, CulledOverlay):
+			culled = overlay
+		else:
+			culled = CulledOverlay(overlay.toArray() if overlay is not None else (), minScreenSize)
+			if overlay is not None:
+				culled.copyProperties(overlay)
+			imp.setOverlay(culled)
+		CullingCanvas.install(imp)
+		return culled
+
+	@classmethod
+	def show(cls, imp=None):
+		'''
+		Displays the overlay of the image.
+		'''
+		cls.__image(imp).setHideOverlay(False)
+
+	@classmethod
+	def hide(cls, imp=None):
+		'''
+		Hides the overlay of the image.
+		'''
+		cls.__image(imp).setHideOverlay(True)
+
+	@classmethod
+	def remove(cls, imp=None):
+		'''
+		Removes the overlay of the image.
+		'''
+		cls.__image(imp).setOverlay(None)
+
+	@classmethod
+	def __image(cls, imp):
+		if imp is not None:
+			return imp
+		return Context.current().activeImage()
+
+	@classmethod
+	def __font(cls):
+		if Settings.FONT is not None:
+			return Settings.FONT
+		return Font(TextRoi.getDefaultFontName(), TextRoi.getDefaultFontStyle(), TextRoi.getDefaultFontSize())
+
+	@classmethod
+	def __color(cls, aColor):
+		if aColor is None:
+			return Settings.GLOBAL_COLOR if Settings.GLOBAL_COLOR is not None else Toolbar.getForegroundColor()
+		if isinstance(aColor, basestring):
+			return Colors.decode(aColor, Color.black)
+		return aColor
+
+class CulledOverlay(ImageOverlay):
+	'''
+	An overlay that paints only the shapes in the visible part of the image. 
+
+	The bounds of the shapes are kept in a grid of cells of CELL_SIZE pixels. When a `CullingCanvas`_ paints 
+	the overlay, only the shapes in the cells of the visible rectangle are handed out, in the order in 
+	which they were added. When the image is zoomed out, shapes smaller than 'minScreenSize' screen 
+	pixels are skipped and polygons and polylines are painted with fewer vertices, about one per screen pixel. 
+	The simplified shapes are cached per zoom level. 
+
+	Culling only applies while the canvas paints. Everything else, selecting shapes with the mouse, indexOf(), 
+	remove() and scripts, sees all shapes. The index is updated by the methods of the overlay that add, remove 
+	or move shapes. Call invalidate() after moving a shape of the overlay directly, for example with roi.setLocation().
+	Use `Overlay.cull`_ to turn on culling for an image.
+
+	.. _`CullingCanvas`: redirect.html#mripy.ijmpy.CullingCanvas
+	.. _`Overlay.cull`: redirect.html#mripy.ijmpy.Overlay.cull
+	'''
+	CELL_SIZE = 256
+	MIN_SIMPLIFIED_VERTICES = 16
+	PROPERTIES = (('getDrawLabels', 'drawLabels'), ('getDrawNames', 'drawNames'), ('getDrawBackgrounds', 'drawBackgrounds'), 
+		('getLabelColor', 'setLabelColor'), ('getLabelFont', 'setLabelFont'), ('isSelectable', 'selectable'), 
+		('isCalibrationBar', 'setIsCalibrationBar'))
+
+	def __init__(self, rois=(), minScreenSize=1.0):
+		ImageOverlay.__init__(self)
+		self.minScreenSize = minScreenSize
+		self.__cells = {}
+		self.__bounds = []
+		self.__simplified = {}
+		self.__valid = True
+		self.__canvas = None
+		self.__view = None
+		self.__visible = None
+		for roi in rois:
+			self.add(roi)
+
+	def copyProperties(self, overlay):
+		'''
+		Copies the label, font and drawing settings of another overlay.
+		'''
+		for getter, setter in self.PROPERTIES:
+			if hasattr(overlay, getter) and hasattr(self, setter):
+				getattr(self, setter)(getattr(overlay, getter)())
+
+	def add(self, roi, name=None):
+		if name is None:
+			ImageOverlay.add(self, roi)
+		else:
+			ImageOverlay.add(self, roi, name)
+		if self.__valid:
+			self.__index(roi)
+
+	def addElement(self, roi):
+		ImageOverlay.addElement(self, roi)
+		if self.__valid:
+			self.__index(roi)
+
+	def remove(self, *args):
+		ImageOverlay.remove(self, *args)
+		self.invalidate()
+
+	def clear(self):
+		ImageOverlay.clear(self)
+		self.invalidate()
+
+	def set(self, *args):
+		ImageOverlay.set(self, *args)
+		self.invalidate()
+
+	def translate(self, *args):
+		ImageOverlay.translate(self, *args)
+		self.invalidate()
+
+	def crop(self, *args):
+		result = ImageOverlay.crop(self, *args)
+		self.invalidate()
+		return result
+
+	def scale(self, *args):
+		result = ImageOverlay.scale(self, *args)
+		self.invalidate()
+		return result
+
+	def invalidate(self):
+		'''
+		Rebuilds the index before the next culled paint. Call it after moving or resizing shapes of the overlay directly.
+		'''
+		self.__valid = False
+		self.__view = None
+		self.__simplified = {}
+
+	def paintWith(self, canvas):
+		'''
+		Called by the `CullingCanvas`_ with the canvas before it paints and with None after. While the canvas 
+		paints, size() and get() on the event dispatch thread answer the visible shapes.
+
+		.. _`CullingCanvas`: redirect.html#mripy.ijmpy.CullingCanvas
+		'''
+		self.__canvas = canvas
 
-def drawOval(x, y, width, height):
-	'''
-	Draws the outline of an oval using the current color and line width. 
-	
-	See also: 
-	=========
-	`fillOval`_, setColor, setLineWidth, `autoUpdate`_ and Overlay.drawEllipse. 
+	def size(self):
+		if self.__canvas is None or not EventQueue.isDispatchThread():
+			return ImageOverlay.size(self)
+		return len(self.__visibleShapes(self.__canvas))
 
-	.. _`fillOval`: redirect.html#mripy.ijmpy.fillOval
-	.. _`autoUpdate`: redirect.html#mripy.ijmpy.autoUpdate
-	'''
-	imp = IJ.getImage()
-	imp.getProcessor().drawOval(x, y, width, height)
-	__updateAndDraw()
-	return imp
+	def get(self, index):
+		if self.__canvas is None or not EventQueue.isDispatchThread():
+			return ImageOverlay.get(self, index)
+		return self.__visibleShapes(self.__canvas)[index]
 
-def drawRect(x, y, width, height):
-	'''
-	Draws the outline of a rectangle using the current color and line width. 
-	
-	See also: 
-	=========
-	`fillRect`_, setColor, setLineWidth, `autoUpdate`_ and Overlay.drawRect 
+	def shapeCount(self):
+		'''
+		Returns the number of all shapes.
+		'''
+		return ImageOverlay.size(self)
 
-	.. _`fillRect`: redirect.html#mripy.ijmpy.fillRect
-	.. _`autoUpdate`: redirect.html#mripy.ijmpy.autoUpdate
-	'''
-	imp = IJ.getImage()
-	imp.getProcessor().drawRect(x, y, width, height)
-	__updateAndDraw()
-	return imp
+	def getShape(self, index):
+		'''
+		Returns the shape with the index, counting all shapes.
+		'''
+		return ImageOverlay.get(self, index)
 
-def drawString(aText, x, y, background=None):
+	def visibleShapes(self, srcRect, magnification):
+		'''
+		Returns the shapes that are painted for the part 'srcRect' of the image at the magnification.
+		'''
+		if not self.__valid:
+			self.__rebuild()
+		cell = self.CELL_SIZE
+		indices = set()
+		for cx in xrange(int(srcRect.x) // cell, int(srcRect.x + srcRect.width) // cell + 1):
+			for cy in xrange(int(srcRect.y) // cell, int(srcRect.y + srcRect.height) // cell + 1):
+				indices.update(self.__cells.get((cx, cy), ()))
+		left, top = srcRect.x, srcRect.y
+		right, bottom = srcRect.x + srcRect.width, srcRect.y + srcRect.height
+		zoomedOut = magnification<1
+		minSize = self.minScreenSize / magnification
+		shapes = []
+		for i in sorted(indices):
+			x, y, width, height = self.__bounds[i]
+			if x>right or y>bottom or x + width<left or y + height<top:
+				continue
+			if zoomedOut and width<minSize and height<minSize:
+				continue
+			roi = ImageOverlay.get(self, i)
+			if zoomedOut:
+				roi = self.__simplify(i, roi, magnification)
+			shapes.append(roi)
+		return shapes
+
+	def __visibleShapes(self, canvas):
+		srcRect = canvas.getSrcRect()
+		view = (srcRect.x, srcRect.y, srcRect.width, srcRect.height, canvas.getMagnification(), ImageOverlay.size(self))
+		if view!=self.__view or not self.__valid:
+			self.__visible = self.visibleShapes(srcRect, canvas.getMagnification())
+			self.__view = view
+		return self.__visible
+
+	def __index(self, roi):
+		bounds = roi.getBounds()
+		index = len(self.__bounds)
+		self.__bounds.append((bounds.x, bounds.y, bounds.width, bounds.height))
+		cell = self.CELL_SIZE
+		for cx in xrange(bounds.x // cell, (bounds.x + bounds.width) // cell + 1):
+			for cy in xrange(bounds.y // cell, (bounds.y + bounds.height) // cell + 1):
+				self.__cells.setdefault((cx, cy), []).append(index)
+		self.__view = None
+
+	def __rebuild(self):
+		self.__cells = {}
+		self.__bounds = []
+		self.__simplified = {}
+		self.__view = None
+		for i in xrange(ImageOverlay.size(self)):
+			self.__index(ImageOverlay.get(self, i))
+		self.__valid = True
+
+	def __simplify(self, index, roi, magnification):
+		'''
+		Returns a copy of a polygon or polyline roi with about one vertex per screen pixel. 
+		Other rois and rois with few vertices are returned unchanged.
+		'''
+		if not isinstance(roi, PolygonRoi) or roi.getNCoordinates()<self.MIN_SIMPLIFIED_VERTICES:
+			return roi
+		level = int(math.floor(math.log(1.0 / magnification, 2)))
+		if level<1:
+			return roi
+		key = (index, level)
+		if key in self.__simplified:
+			return self.__simplified[key]
+		tolerance = 2 ** level
+		polygon = roi.getFloatPolygon()
+		xs, ys = [polygon.xpoints[0]], [polygon.ypoints[0]]
+		for i in xrange(1, polygon.npoints):
+			x, y = polygon.xpoints[i], polygon.ypoints[i]
+			if abs(x - xs[-1])>=tolerance or abs(y - ys[-1])>=tolerance:
+				xs.append(x)
+				ys.append(y)
+		if len(xs)<3:
+			simplified = roi
+		else:
+			simplified = PolygonRoi(FloatPolygon(Array.asPrimitive(xs, Array.FLOAT), Array.asPrimitive(ys, Array.FLOAT)), roi.getType())
+			simplified.setStrokeColor(roi.getStrokeColor())
+			simplified.setStroke(roi.getStroke())
+			simplified.setFillColor(roi.getFillColor())
+			if roi.hasHyperStackPosition():
+				simplified.setPosition(roi.getCPosition(), roi.getZPosition(), roi.getTPosition())
+			else:
+				simplified.setPosition(roi.getPosition())
+		self.__simplified[key] = simplified
+		return simplified
+
+class CullingCanvas(ImageCanvas):
 	'''
-	Draws text at the specified location with a filled background. 
+	An image canvas that paints a `CulledOverlay`_ culled to the visible part of the image. 
+	
+	Use `Overlay.cull`_, which installs the canvas in the window of the image.
 
-	The first character is drawn obove and to the right of (x,y). Call setFont() to specify the font. 
-	Call setJustification() to have the text centered or right justified. Call getStringWidth() to get 
-	the width of the text in pixels. Refer to the TextDemo macro for examples and to DrawTextWithBackground 
-	to see how to draw text with a background. 
+	.. _`CulledOverlay`: redirect.html#mripy.ijmpy.CulledOverlay
+	.. _`Overlay.cull`: redirect.html#mripy.ijmpy.Overlay.cull
 	'''
-	ip = IJ.getImage().getProcessor()
-	if not Settings.FONT is None:
-		ip.setFont(Settings.FONT)
-	ip.setJustification(Settings.JUSTIFICATION);
-	ip.setAntialiasedText(Settings.ANTIALIASED_TEXT)
-	if not background is None:
-		aColor = __getColor(background)
-		ip.drawString(aText, x, y, aColor)
-	else:
-		if not Settings.GLOBAL_COLOR is None:
-			ip.setColor(Settings.GLOBAL_COLOR)
+
+	@classmethod
+	def install(cls, imp):
+		'''
+		Displays the image in a new window with a culling canvas, with the magnification and the visible 
+		part of the old canvas. Does nothing if the image is not displayed or already has a culling canvas.
+		'''
+		from ij.gui import ImageWindow, StackWindow
+		canvas = imp.getCanvas()
+		if imp.getWindow() is None or isinstance(canvas, CullingCanvas):
+			return canvas
+		culling = CullingCanvas(imp)
+		culling.setMagnification(canvas.getMagnification())
+		culling.setSourceRect(canvas.getSrcRect())
+		if imp.getStackSize()>1:
+			StackWindow(imp, culling)
 		else:
-			ip.setColor(Toolbar.getForegroundColor())
-		ip.drawString(aText, x, y)
-	__updateAndDraw()
+			ImageWindow(imp, culling)
+		return culling
+
+	def paint(self, g):
+		overlay = self.getImage().getOverlay()
+		if not isinstance(overlay, CulledOverlay):
+			ImageCanvas.paint(self, g)
+			return
+		overlay.paintWith(self)
+		try:
+			ImageCanvas.paint(self, g)
+		finally:
+			overlay.paintWith(None)
 
 def dump():
 	'''
@@ -991,6 +3172,8 @@ def dump():
 	
 	In ijmpy you need to save the script before creating a dump.
 	'''
+	import inspect
+	import tokenize
 	bfuncs = [name for name, function in sorted(vars(__builtin__).items()) if inspect.isbuiltin(function) or inspect.isfunction(function)]
 	locs = inspect.currentframe().f_back.f_globals
 	keys = locs.keys()
@@ -1109,6 +3292,7 @@ def Exec(*args):
 	
 	.. _`ExecExamples`: <@TODO>
 	'''
+	import subprocess
 	out = subprocess.check_output(list(args))
 	return out
 
@@ -1139,6 +3323,14 @@ class ExtMeta(type):
 	'''
 	Handle a priori unknown calls to Ext.
 	'''
+	@property
+	def plugin(self):
+		return Context.current().plugin
+
+	@plugin.setter
+	def plugin(self, value):
+		Context.current().plugin = value
+
 	def __getattr__(self, name):
 		return lambda *args: self.handleCall(name, *args) 	
 
@@ -1278,6 +3470,7 @@ class File(object):
 		'''
 		Copies a file. 
 		'''
+		import shutil
 		shutil.copy2(path1, path2)
 
 	@classmethod
@@ -1435,6 +3628,7 @@ class File(object):
 		Returns an emptly string if the host or file cannot be found. 
 		With v1.41i and later, returns "<Error: message>" if there any error, including host or file not found. 
 		'''
+		import urllib2
 		try:
 			contents = urllib2.urlopen(url).read()
 		except (urllib2.URLError, ValueError), e:
@@ -1478,18 +3672,48 @@ class File(object):
 			n = txtFile.write(string)
 		return n
 
-def fill(imp=None):
+def fill(imp=None, stack=False):
 	'''
 	Fills the image or selection with the current drawing color. 
+
+	If 'stack' is True or a selection of planes made with `Planes.select`_, the selected planes are filled 
+	in parallel, with the current drawing color of the image.
+
+	.. _`Planes.select`: redirect.html#mripy.ijmpy.Planes.select
 	'''
 	if (not imp):
-		imp = IJ.getImage()
-	IJ.runMacro('fill()')
+		imp = __getImage()
+	roi = imp.getRoi()
+	if not stack:
+		if Settings.GLOBAL_COLOR is not None:
+			aColor = Settings.GLOBAL_COLOR
+		else:
+			aColor = Toolbar.getForegroundColor()
+		def draw(ip):
+			ip.setColor(aColor)
+			ip.resetRoi()
+			if roi is None:
+				ip.fill()
+				return Rectangle(0, 0, ip.getWidth(), ip.getHeight())
+			ip.fill(roi)
+			bounds = roi.getBounds()
+			return __paddedBounds(ip, bounds.x, bounds.y, bounds.width, bounds.height)
+		return __draw(draw, imp)
+	def fillPlane(ip):
+		__setDrawingColor(imp, ip)
+		if roi is None:
+			ip.fill()
+		else:
+			ip.fill(roi)
+	Planes.apply(imp, fillPlane, stack)
 	return imp
 
-def fillOval(x, y, width, height, imp=None):
+def fillOval(x, y, width, height, imp=None, stack=False):
 	'''
 	Fills an oval bounded by the specified rectangle with the current drawing color. 
+
+	If 'stack' is True or a selection of planes made with `Planes.select`_, the oval is filled 
+	on the selected planes, in parallel.
 	
 	See also:
 	=========
@@ -1497,15 +3721,25 @@ def fillOval(x, y, width, height, imp=None):
 
 	.. _`drawOval`: redirect.html#mripy.ijmpy.drawOval
 	.. _`autoUpdate`: redirect.html#mripy.ijmpy.autoUpdate
+	.. _`Planes.select`: redirect.html#mripy.ijmpy.Planes.select
 	'''
 	if (not imp):
-		imp = IJ.getImage()
-	imp.getProcessor().fillOval(x, y, width, height)
+		imp = __getImage()
+	if not stack:
+		imp.getProcessor().fillOval(x, y, width, height)
+		return imp
+	def fillPlane(ip):
+		__setDrawingColor(imp, ip)
+		ip.fillOval(x, y, width, height)
+	Planes.apply(imp, fillPlane, stack)
 	return imp
 
-def fillRect(x, y, width, height, imp=None):
+def fillRect(x, y, width, height, imp=None, stack=False):
 	'''
 	Fills the specified rectangle with the current drawing color. 
+
+	If 'stack' is True or a selection of planes made with `Planes.select`_, the rectangle is filled 
+	on the selected planes, in parallel.
 	
 	See also:
 	=========
@@ -1513,16 +3747,61 @@ def fillRect(x, y, width, height, imp=None):
 
 	.. _`drawRect`: redirect.html#mripy.ijmpy.drawRect
 	.. _`autoUpdate`: redirect.html#mripy.ijmpy.autoUpdate
+	.. _`Planes.select`: redirect.html#mripy.ijmpy.Planes.select
 	'''
 	if (not imp):
-		imp = IJ.getImage()
-	imp.getProcessor().fillRect(x, y, width, height)
+		imp = __getImage()
+	if not stack:
+		imp.getProcessor().fillRect(x, y, width, height)
+		return imp
+	def fillPlane(ip):
+		__setDrawingColor(imp, ip)
+		ip.fillRect(x, y, width, height)
+	Planes.apply(imp, fillPlane, stack)
 	return imp
 
+def __setDrawingColor(imp, ip):
+	'''
+	Sets the drawing color of the processor of a plane to the color set with setColor or, if there is none, 
+	to the foreground color of the toolbar. For 16 and 32-bit images the display range of the current processor 
+	of the image is copied first, so that the color maps to the same value on all planes.
+	'''
+	current = imp.getProcessor()
+	if imp.getBitDepth()==16 or imp.getBitDepth()==32:
+		ip.setMinAndMax(current.getMin(), current.getMax())
+	if not Settings.GLOBAL_COLOR is None:
+		ip.setColor(Settings.GLOBAL_COLOR)
+	else:
+		ip.setColor(Toolbar.getForegroundColor())
+
 class FitMeta(type):
 	'''
 	Meta class of the class Fit.
 	'''
+	@property
+	def fitter(self):
+		return Context.current().fitter
+
+	@fitter.setter
+	def fitter(self, value):
+		Context.current().fitter = value
+
+	@property
+	def logFitResults(self):
+		return Context.current().logFitResults
+
+	@logFitResults.setter
+	def logFitResults(self, value):
+		Context.current().logFitResults = value
+
+	@property
+	def showFitDialog(self):
+		return Context.current().showFitDialog
+
+	@showFitDialog.setter
+	def showFitDialog(self, value):
+		Context.current().showFitDialog = value
+
 	@property
 	def rSquared(self):
 		'''
@@ -1575,9 +3854,6 @@ class Fit(object):
 	.. _`CurveFittingDemo`: https://imagej.net/macros/examples/CurveFittingDemo.txt
 	'''
 	__metaclass__ = FitMeta
-	fitter = None
-	logFitResults = False
-	showFitDialog = False
 	
 	@classmethod
 	def doFit(cls, equation, xpoints, ypoints, initialGuesses=None):
@@ -1603,8 +3879,10 @@ class Fit(object):
 			raise Exception('Arrays not same length')
 		if len(xpoints)==0:
 			raise Exception('Zero length array')	
-		cls.fitter = CurveFitter(xpoints, ypoints)
+		cls.fitter = CurveFitter(Array.asPrimitive(xpoints), Array.asPrimitive(ypoints))
 		cls.fitter.setStatusAndEsc(None, True)
+		if initialGuesses is not None:
+			initialGuesses = Array.asPrimitive(initialGuesses)
 		if index==-1 and isCustom:		
 			cls.fitter.doCustomFit(equation, initialGuesses, cls.showFitDialog)
 		else:
@@ -1646,7 +3924,7 @@ class Fit(object):
 		formula = CurveFitter.fList[index]
 		return name, formula
 
-def floodFill(x, y, connectivity = '4-connected', imp = None):
+def floodFill(x, y, connectivity = '4-connected', imp = None, stack=False):
 	'''
 	Fills, with the foreground color, pixels that are connected to, and have the same color as, the pixel at (x, y). 
 	
@@ -1654,18 +3932,31 @@ def floodFill(x, y, connectivity = '4-connected', imp = None):
 	containing "8", for example floodFill(x, y, "8-connected"). 
 	This function is used to implement the `flood fill (paint bucket)`_ macro tool. 
 
+	If 'stack' is True or a selection of planes made with `Planes.select`_, each selected plane is 
+	flood filled from (x, y), in parallel.
+
 	.. _`flood fill (paint bucket)`: https://imagej.net/macros/tools/FloodFillTool.txt
+	.. _`Planes.select`: redirect.html#mripy.ijmpy.Planes.select
 	'''
 	if not imp:
-		imp = IJ.getImage()
-	ip = imp.getProcessor()
-	floodFiller = FloodFiller(ip)
-	if connectivity.find('8')>= 0:
-		floodFiller.fill8(x, y)
-	else:
-		floodFiller.fill(x, y)
-	__updateAndDraw()
-	return imp
+		imp = __getImage()
+	eightConnected = connectivity.find('8')>= 0
+	def fillPlane(ip):
+		floodFiller = FloodFiller(ip)
+		if eightConnected:
+			floodFiller.fill8(x, y)
+		else:
+			floodFiller.fill(x, y)
+	if stack:
+		def fillStackPlane(ip):
+			__setDrawingColor(imp, ip)
+			fillPlane(ip)
+		Planes.apply(imp, fillStackPlane, stack)
+		return imp
+	def draw(ip):
+		fillPlane(ip)
+		return Rectangle(0, 0, ip.getWidth(), ip.getHeight())
+	return __draw(draw, imp)
 
 def floor(n):
 	'''
@@ -1715,30 +4006,25 @@ def getPixel(x, y=None):
 	
 	See the `Color Picker Tool`_ macro for an example that shows how to do this. 
 
+	In ijmpy use `ImageHandle.sample`_ to get the interpolated values at many points at once.
+
 	.. _`Color Picker Tool`: https://imagej.net/macros/tools/ColorPickerTool.txt
+	.. _`ImageHandle.sample`: redirect.html#mripy.ijmpy.ImageHandle.sample
 	'''
-	imp = IJ.getImage()
+	handle = Settings.IMAGE_HANDLE
+	if handle is not None:
+		return handle.getPixel(x, y)
+	imp = __getImage()
 	ip = imp.getProcessor()
-	if y is not None: 
-		if isinstance(x, int) and isinstance(y, int):
-			if isinstance(ip, FloatProcessor):
-				value = ip.getPixelValue(x,y)
-			else:
-				value = ip.getPixel(x,y)
-		else:
-			if isinstance(ip, ColorProcessor):
-				ip.getPixelInterpolated(x, y)
-			else:
-				cal = imp.getCalibration();
-				imp.setCalibration(None);
-				value = ip.getInterpolatedValue(x, y);
-				imp.setCalibration(cal);
-	else:
+	if y is None:
 		if isinstance(ip, ColorProcessor):
-			value = ip.get(int(x))
-		else:
-		 	value = ip.getf(int(x))
-	return value
+			return ip.get(int(x))
+		return ip.getf(int(x))
+	if isinstance(x, int) and isinstance(y, int):
+		if isinstance(ip, FloatProcessor):
+			return ip.getPixelValue(x,y)
+		return ip.getPixel(x,y)
+	return ImageHandle(imp).getPixel(x, y)
 
 def getSelectionBounds(img=None):
 	'''
@@ -1755,7 +4041,7 @@ def getSelectionBounds(img=None):
 	selectionType and setSelectionLocation. 
 	'''
 	if not img:
-		img = IJ.getImage()
+		img = __getImage()
 	roi = img.getRoi()
 	if roi:
 		r = roi.getFloatBounds()
@@ -1776,7 +4062,7 @@ def getCursorLoc(img = None):
 	.. _`GetCursorLocDemoTool`: https://imagej.net/macros/tools/GetCursorLocDemoTool.txt
 	'''
 	if not img:
-		img = IJ.getImage()
+		img = __getImage()
 	ic = img.getCanvas()
 	if not ic:
 		return None
@@ -1815,7 +4101,7 @@ def getDimensions(img=None):
 	Returns the dimensions width, height, channels, slices and frames of the current image.
 	'''
 	if not img:
-		img = IJ.getImage()
+		img = __getImage()
 	dim = img.getDimensions()
 	return tupel(dim)
 
@@ -1831,12 +4117,167 @@ def getThreshold():
 	=========
 	setThreshold, resetThreshold
 	'''
-	image = IJ.getImage()
+	image = __getImage()
 	processor = image.getProcessor()
 	t1 = processor.getMinThreshold()
 	t2 = processor.getMaxThreshold()
 	return t1, t2
 
+def labelComponents(imp=None, connectivity=None):
+	'''
+	Labels the connected components (objects) of a binary or thresholded image or stack. 
+
+	Foreground pixels are the pixels within the threshold levels or, if the image is not thresholded, 
+	the pixels that are not zero. Images are labeled with 4 or 8-connectivity (default 8), stacks in 3D 
+	with 6, 18 or 26-connectivity (default 26). 
+
+	Returns a tupel (labels, counts, boxes). labels is a new 16-bit image, or a 32-bit image if there are more 
+	than 65535 components, in which the pixels of each component have the value of its label, starting at 1, 
+	and the background is 0. counts[i] is the number of pixels and boxes[i] the bounding box (x, y, z, width, 
+	height, depth) of the component with the label i+1. z starts at 0.
+
+	The image is labeled with a two-pass union-find over the pixel arrays instead of flood filling one 
+	object after the other. The labels image is not shown. 
+	
+	See also: 
+	=========
+	`floodFill`_
+
+	.. _`floodFill`: redirect.html#mripy.ijmpy.floodFill
+	'''
+	if not imp:
+		imp = __getImage()
+	stack = imp.getStack()
+	width, height, depth = imp.getWidth(), imp.getHeight(), stack.getSize()
+	if connectivity is None:
+		connectivity = 8 if depth==1 else 26
+	neighbours = __backwardNeighbours(connectivity, width, width * height)
+	isForeground = __foregroundTest(imp)
+	size = width * height
+	provisional = jarray.zeros(size * depth, Array.INT)
+	parent = [0]
+	for z in xrange(depth):
+		pixels = stack.getPixels(z+1)
+		for y in xrange(height):
+			offset = y * width
+			index = z * size + offset
+			for x in xrange(width):
+				if isForeground(pixels[offset + x]):
+					label = 0
+					for dx, dy, dz, delta in neighbours:
+						if x+dx<0 or x+dx>=width or y+dy<0 or y+dy>=height or z+dz<0:
+							continue
+						other = provisional[index + delta]
+						if other==0:
+							continue
+						if label==0:
+							label = other
+						elif other!=label:
+							label = __union(parent, label, other)
+					if label==0:
+						label = len(parent)
+						parent.append(label)
+					provisional[index] = label
+				index = index + 1
+	final = [0] * len(parent)
+	nLabels = 0
+	for label in xrange(1, len(parent)):
+		root = __find(parent, label)
+		if root==label:
+			nLabels = nLabels + 1
+			final[label] = nLabels
+		else:
+			final[label] = final[root]
+	counts = jarray.zeros(nLabels, Array.INT)
+	bounds = [[width, height, depth, -1, -1, -1] for i in xrange(nLabels)]
+	labels = ImageStack(width, height)
+	for z in xrange(depth):
+		if nLabels>65535:
+			plane = jarray.zeros(size, Array.FLOAT)
+		else:
+			plane = jarray.zeros(size, 'h')
+		for y in xrange(height):
+			index = z * size + y * width
+			for x in xrange(width):
+				label = provisional[index + x]
+				if label==0:
+					continue
+				label = final[label]
+				plane[y * width + x] = label if label<32768 or nLabels>65535 else label - 65536
+				counts[label-1] = counts[label-1] + 1
+				box = bounds[label-1]
+				if x<box[0]: box[0] = x
+				if x>box[3]: box[3] = x
+				if y<box[1]: box[1] = y
+				if y>box[4]: box[4] = y
+				if z<box[2]: box[2] = z
+				if z>box[5]: box[5] = z
+		if nLabels>65535:
+			labels.addSlice(FloatProcessor(width, height, plane))
+		else:
+			labels.addSlice(ShortProcessor(width, height, plane, None))
+	boxes = [(b[0], b[1], b[2], b[3]-b[0]+1, b[4]-b[1]+1, b[5]-b[2]+1) for b in bounds]
+	result = ImagePlus(imp.getShortTitle()+'-labels', labels)
+	result.setCalibration(imp.getCalibration().copy())
+	result.getProcessor().setMinAndMax(0, max(1, nLabels))
+	return result, counts, boxes
+
+def __backwardNeighbours(connectivity, width, planeSize):
+	'''
+	Returns the neighbours (dx, dy, dz, offset) that come before a pixel in raster order.
+	'''
+	if not connectivity in (4, 8, 6, 18, 26):
+		raise Exception('Connectivity 4, 8 (2D) or 6, 18, 26 (3D) expected')
+	neighbours = []
+	for dz in (-1, 0):
+		for dy in (-1, 0, 1):
+			for dx in (-1, 0, 1):
+				if dz==0 and (dy>0 or (dy==0 and dx>=0)):
+					continue
+				distance = abs(dx) + abs(dy) + abs(dz)
+				if connectivity in (4, 8) and dz!=0:
+					continue
+				if connectivity in (4, 6) and distance>1:
+					continue
+				if connectivity==18 and distance>2:
+					continue
+				neighbours.append((dx, dy, dz, dz * planeSize + dy * width + dx))
+	return neighbours
+
+def __foregroundTest(imp):
+	'''
+	Returns a function that tells if a raw value from the pixel array of the image is foreground.
+	'''
+	ip = imp.getProcessor()
+	bitDepth = imp.getBitDepth()
+	mask = {8: 0xff, 16: 0xffff, 24: 0xffffff}.get(bitDepth)
+	lower, upper = ip.getMinThreshold(), ip.getMaxThreshold()
+	if lower==ImageProcessor.NO_THRESHOLD or bitDepth==24:
+		if mask is None:
+			return lambda value: value!=0
+		return lambda value: (value & mask)!=0
+	if mask is None:
+		return lambda value: value>=lower and value<=upper
+	return lambda value: lower<=(value & mask)<=upper
+
+def __find(parent, label):
+	while parent[label]!=label:
+		parent[label] = parent[parent[label]]
+		label = parent[label]
+	return label
+
+def __union(parent, label, other):
+	'''
+	Joins the trees of both labels under the smaller root and returns it.
+	'''
+	root = __find(parent, label)
+	otherRoot = __find(parent, other)
+	if root<otherRoot:
+		parent[otherRoot] = root
+		return root
+	parent[root] = otherRoot
+	return otherRoot
+
 def lengthOf(aListOrString):
 	'''
 	Returns the length of a string or array. 
@@ -1872,12 +4313,16 @@ def newImage(title, imageType, width, height, depthOrChannels, depth=1, frames=1
 	As an example, use "16-bit ramp" to create a 16-bit image containing a grayscale ramp. 
 	Precede with call("ij.gui.ImageWindow.setNextLocation", x, y) to set the location of the new image. 
 	Width and height specify the width and height of the image in pixels. Depth specifies the number of stack slices. 
+
+	In batch mode the image is not displayed, see `setBatchMode`_.
+
+	.. _`setBatchMode`: redirect.html#mripy.ijmpy.setBatchMode
 	'''
 	if depth==1 and frames ==1:
 		image = IJ.createImage(title, imageType, width, height, depthOrChannels)
 	else:
 		image = IJ.createImage(title, imageType, width, height, depthOrChannels, depth, frames)
-	image.show()
+	Context.current().addImage(image)
 	return image
 
 def nImages():
@@ -1885,8 +4330,101 @@ def nImages():
 	Returns number of open images. 
 	
 	The parentheses "()" are optional in the ij-macro language but *not* in ijmpy. 
+	The images of the batch mode are counted as well, the images of other contexts are not.
+	'''
+	return len(__openImages())
+
+def selectImage(image):
+	'''
+	Activates the image with the specified ID (a negative number). 
+	
+	If id is greater than zero, activates the idth image listed in the Window menu. The argument can also be an 
+	image title. In ijmpy it can also be an ImagePlus. 
+
+	In batch mode, and in a `Context`_ other than the default context, the image becomes the current image of the 
+	context and is not brought to the front. Returns the image.
+
+	.. _`Context`: redirect.html#mripy.ijmpy.Context
 	'''
-	return WindowManager.getImageCount()
+	images = __openImages()
+	imp = None
+	if isinstance(image, ImagePlus):
+		imp = image
+	elif isinstance(image, basestring):
+		matches = [candidate for candidate in images if candidate.getTitle()==image]
+		imp = matches[0] if matches else None
+	elif image<0:
+		matches = [candidate for candidate in images if candidate.getID()==image]
+		imp = matches[0] if matches else None
+	elif image>0 and image<=len(images):
+		imp = images[image-1]
+	if imp is None:
+		raise Exception('Image '+str(image)+' not found or no images are open')
+	Context.current().select(imp)
+	return imp
+
+def setBatchMode(arg):
+	'''
+	If arg is True, the interpreter enters batch mode and images are not displayed, allowing the macro to run faster. 
+
+	If arg is False, exits batch mode and displays the active image in a window. The other images of the batch mode are closed. 
+	
+	setBatchMode("exit and display")
+		Exits batch mode and displays all open batch mode images. 
+	
+	setBatchMode("show")
+		Displays the active hidden image, while batch mode remains in same state. 
+	
+	setBatchMode("hide")
+		Enters (or remains in) batch mode and hides the active image. 
+
+	In ijmpy the images created with newImage() or run() in batch mode are kept, without windows, in a list of the current 
+	`Context`_, together with the active image of the batch mode. selectImage(), close() and nImages() work with these images. 
+	While a context is in batch mode the batch mode of ImageJ is on as well, so that ImageJ commands do not open windows, 
+	see `Context.setBatchMode`_.
+
+	.. _`Context`: redirect.html#mripy.ijmpy.Context
+	.. _`Context.setBatchMode`: redirect.html#mripy.ijmpy.Context.setBatchMode
+	'''
+	context = Context.current()
+	mode = arg if isinstance(arg, basestring) else ('true' if arg else 'false')
+	mode = mode.lower()
+	if mode=='true':
+		if not context.BATCH_MODE and context.image is None:
+			context.image = context.currentImage()
+		context.setBatchMode(True)
+	elif mode=='hide':
+		imp = context.currentImage()
+		context.setBatchMode(True)
+		if imp is not None and imp.getWindow() is not None:
+			imp.hide()
+			context.images.append(imp)
+		context.image = imp
+	elif mode=='show':
+		imp = context.image
+		if imp is not None and imp in context.images:
+			context.images.remove(imp)
+			context.display(imp)
+	elif mode=='false' or mode=='exit and display':
+		images, active = context.images, context.image
+		context.images = []
+		context.setBatchMode(False)
+		for imp in images:
+			if mode=='exit and display' or imp is active:
+				context.display(imp)
+			else:
+				imp.changes = False
+				imp.close()
+		if context is Context.DEFAULT:
+			context.image = None
+	else:
+		raise Exception('True, False, "exit and display", "show" or "hide" expected')
+
+def isBatchMode():
+	'''
+	Returns True if batch mode is active, like is("Batch Mode") in the macro language.
+	'''
+	return Context.current().BATCH_MODE
 
 def nResults():
 	'''
@@ -1898,6 +4436,200 @@ def nResults():
 	'''
 	return Analyzer.getResultsTable().getCounter();
 	
+class RoiStore(object):
+	'''
+	A list of rois that works like an invisible ROI Manager. 
+
+	Rois are added, deleted, selected and renamed in bulk and looked up by name with a hash map, 
+	instead of a linear search. No window and no list entries are created until show() is called, 
+	which copies the rois into the ROI Manager:
+
+		store = RoiStore()
+		store.add(rois)
+		cell = store.getByName("cell-17")
+		store.delete(store.indexesOf(["cell-3", "cell-9"]))
+		store.show()
+
+	Rois without a name get a name like the ones of the ROI Manager ("yyyy-xxxx", from the center of the bounds).
+	'''
+
+	def __init__(self, rois=(), names=None):
+		self.rois = []
+		self.selected = []
+		self.__names = {}
+		self.add(rois, names)
+
+	def __len__(self):
+		return len(self.rois)
+
+	def __iter__(self):
+		return iter(self.rois)
+
+	def count(self):
+		'''
+		Returns the number of rois.
+		'''
+		return len(self.rois)
+
+	def add(self, rois, names=None):
+		'''
+		Adds the rois, with the names if given, and returns the index of the first one.
+		'''
+		first = len(self.rois)
+		for i, roi in enumerate(rois):
+			name = names[i] if names is not None else roi.getName()
+			if name is None:
+				name = self.__defaultName(roi)
+			roi.setName(name)
+			self.__names.setdefault(name, []).append(len(self.rois))
+			self.rois.append(roi)
+		return first
+
+	def addRoi(self, roi, name=None):
+		'''
+		Adds one roi and returns its index.
+		'''
+		return self.add([roi], None if name is None else [name])
+
+	def get(self, index):
+		'''
+		Returns the roi with the index.
+		'''
+		return self.rois[index]
+
+	def getName(self, index):
+		'''
+		Returns the name of the roi with the index.
+		'''
+		return self.rois[index].getName()
+
+	def indexOf(self, name):
+		'''
+		Returns the index of the first roi with the name or -1.
+		'''
+		indexes = self.__names.get(name)
+		return indexes[0] if indexes else -1
+
+	def indexesOf(self, names):
+		'''
+		Returns the indexes of the first rois with the names, -1 for unknown names.
+		'''
+		return [self.indexOf(name) for name in names]
+
+	def getByName(self, name):
+		'''
+		Returns the first roi with the name or None.
+		'''
+		index = self.indexOf(name)
+		return self.rois[index] if index>=0 else None
+
+	def rename(self, indexes, names):
+		'''
+		Gives the rois with the indexes the new names.
+		'''
+		if isinstance(indexes, (int, long)):
+			indexes, names = [indexes], [names]
+		for index, name in zip(indexes, names):
+			self.rois[index].setName(name)
+		self.__reindex()
+
+	def select(self, indexes, imp=None):
+		'''
+		Selects the rois with the indexes and returns them. If one roi is selected and an image is 
+		given, the roi becomes the selection of the image.
+		'''
+		if isinstance(indexes, (int, long)):
+			indexes = [indexes]
+		self.selected = list(indexes)
+		rois = [self.rois[index] for index in self.selected]
+		if imp is not None and len(rois)==1:
+			imp.setRoi(rois[0])
+		return rois
+
+	def deselect(self):
+		'''
+		Deselects all rois.
+		'''
+		self.selected = []
+
+	def delete(self, indexes=None):
+		'''
+		Deletes the rois with the indexes, the selected rois if indexes is None or all rois if none are selected. 
+		Returns the number of deleted rois.
+		'''
+		if isinstance(indexes, (int, long)):
+			indexes = [indexes]
+		count = len(self.rois)
+		if indexes is None and not self.selected:
+			self.rois = []
+		else:
+			deleted = set(index for index in (self.selected if indexes is None else indexes) if index>=0)
+			self.rois = [roi for i, roi in enumerate(self.rois) if not i in deleted]
+		self.selected = []
+		self.__reindex()
+		return count - len(self.rois)
+
+	def reset(self):
+		'''
+		Deletes all rois.
+		'''
+		self.rois = []
+		self.selected = []
+		self.__names = {}
+
+	def toRoiManager(self, rm=None, hidden=False):
+		'''
+		Copies the rois into the ROI Manager 'rm', replacing its content, and returns it. 
+		If 'rm' is None, the ROI Manager is opened or, if 'hidden' is True, a new hidden one is created.
+
+		A visible ROI Manager is hidden while the list is filled and shown again at the end, so that
+		the list and the window are updated and repainted once and not once per roi. The rois are added 
+		for the current image of the context.
+		'''
+		if rm is None:
+			rm = RoiManager(True) if hidden else RoiManager.getRoiManager()
+		imp = Context.current().currentImage()
+		visible = rm.isVisible()
+		if visible:
+			rm.setVisible(False)
+		try:
+			rm.reset()
+			for roi in self.rois:
+				if imp is None:
+					rm.addRoi(roi)
+				else:
+					rm.add(imp, roi, -1)
+		finally:
+			if visible:
+				rm.setVisible(True)
+		return rm
+
+	def show(self):
+		'''
+		Shows the rois in the ROI Manager.
+		'''
+		return self.toRoiManager()
+
+	@classmethod
+	def fromRoiManager(cls, rm=None):
+		'''
+		Returns a store with the rois of the ROI Manager.
+		'''
+		if rm is None:
+			rm = RoiManager.getInstance()
+		if rm is None:
+			return cls()
+		return cls(rm.getRoisAsArray())
+
+	def __reindex(self):
+		self.__names = {}
+		for i, roi in enumerate(self.rois):
+			self.__names.setdefault(roi.getName(), []).append(i)
+
+	def __defaultName(self, roi):
+		bounds = roi.getBounds()
+		return "%04d-%04d" % (bounds.y + bounds.height // 2, bounds.x + bounds.width // 2)
+
 def roiManager(command, parameter=""):
 	'''
 	These function run ROI Manager commands. 
@@ -2008,18 +4740,56 @@ def roiManager(command, parameter=""):
 	
 	roiManager("update")
 		Replaces the selected ROI on the list with the current selection.
+
+	In ijmpy, use a `RoiStore`_ to add, delete, select or rename many rois at once without updating 
+	the ROI Manager window for each of them.
+
+	.. _`RoiStore`: redirect.html#mripy.ijmpy.RoiStore
 	'''
-	if (command.lower().strip()=='count'):
-		return RoiManager.getRoiManager().getCount()
-	if (command.lower().strip()=='index'):
-		return RoiManager.getRoiManager().getSelectedIndex()
-	if command.lower().strip()=='select' and isinstance(parameter, list):
-		RoiManager.getRoiManager().setSelectedIndexes(parameter)
-		return
-	if parameter=="":
-		IJ.runMacro('roiManager("'+command+'")')
+	rm = RoiManager.getRoiManager()
+	cmd = command.lower().strip()
+	if cmd=='count':
+		return rm.getCount()
+	if cmd=='index':
+		return rm.getSelectedIndex()
+	if cmd=='select':
+		if isinstance(parameter, (list, tuple)):
+			rm.setSelectedIndexes(parameter)
+			return None
+		index = int(parameter)
+		if index<0 or index>=rm.getCount():
+			raise Exception("Index ("+str(index)+") is outside of the 0-"+str(rm.getCount()-1)+" range")
+		imp = Context.current().currentImage()
+		if imp is None:
+			rm.select(index)
+		else:
+			rm.select(imp, index)
+		return None
+	if cmd=='add':
+		imp = Context.current().activeImage()
+		roi = imp.getRoi()
+		if roi is None:
+			raise Exception('The active image does not have a selection')
+		rm.add(imp, roi, -1)
+		return None
+	if cmd=='delete':
+		selected = rm.getSelectedIndexes()
+		if len(selected)==0:
+			rm.reset()
+			return None
+		rm.setSelectedIndexes(selected)
+	imp = Context.current().currentImage() if Context.current().hasOwnImage() else None
+	if parameter=="" and imp is not None:
+		done = rm.runCommand(imp, cmd)
+	elif parameter=="":
+		done = rm.runCommand(cmd)
 	else:
-		IJ.runMacro('roiManager("'+command+'",'+str(parameter)+')')
+		done = rm.runCommand(cmd, str(parameter))
+	if not done:
+		if parameter=="":
+			IJ.runMacro('roiManager("'+command+'")')
+		else:
+			IJ.runMacro('roiManager("'+command+'","'+str(parameter)+'")')
 	return None
 		
 def run(command, parameters=None):
@@ -2033,8 +4803,235 @@ def run(command, parameters=None):
 	For examples, see the ArgumentPassingDemo_ macro.
 	
 	.. _ArgumentPassingDemo: https://imagej.net/macros/ArgumentPassingDemo.txt
+
+	In batch mode, and in a `Context`_ other than the default context, the command runs on the current image of 
+	the context. "Close All" closes the images of the batch mode as well.
+
+	.. _`Context`: redirect.html#mripy.ijmpy.Context
+
+	Frequent commands are run by direct calls, see `Commands`_.
+
+	.. _`Commands`: redirect.html#mripy.ijmpy.Commands
 	''' 
-	IJ.run(command, parameters)
+	context = Context.current()
+	if command=="Close All":
+		__closeImages(list(context.images), False)
+	imp = context.image if context.hasOwnImage() else None
+	Commands.run(command, parameters, imp)
+
+class Commands(object):
+	'''
+	Runs ImageJ menu commands for run(). 
+
+	A command and its options are compiled once into a plan that is kept in a cache. For the commands 
+	"8-bit", "Smooth", "Find Edges", "Duplicate...", "Gaussian Blur...", "Enlarge..." and "Clear Outside" the plan 
+	calls the Java methods directly, with the options parsed in advance. All other commands, and the fast commands 
+	with options or images that the plan does not handle (stacks, for example), are run with IJ.run. 
+	Commands run by a plan are not recorded by the macro recorder.
+	'''
+	MAX_PLANS = 256
+	__plans = {}
+
+	@classmethod
+	def run(cls, command, parameters=None, imp=None):
+		'''
+		Runs the command with the options on the image or, if imp is None, on the active image.
+
+		On the image of a context (in batch mode or in a context other than the default context) the command 
+		runs in the batch mode of ImageJ. An image it creates is taken from the batch mode images of ImageJ, 
+		added to the context with Context.addImage(), which displays it unless the context is in batch mode, 
+		and made the current image of the context. The image is found as the current image of the calling 
+		thread, so that commands running at the same time in other contexts do not interfere.
+		'''
+		plan = cls.plan(command, parameters)
+		if plan is not None:
+			target = imp if imp is not None else WindowManager.getCurrentImage()
+			if target is not None and plan(target):
+				return
+		if imp is None:
+			IJ.run(command, parameters)
+			return
+		from ij.macro import Interpreter
+		context = Context.current()
+		previous = WindowManager.getTempCurrentImage()
+		context.holdBatchMode()
+		WindowManager.setTempCurrentImage(imp)
+		try:
+			IJ.run(command, parameters)
+			created = WindowManager.getTempCurrentImage()
+		finally:
+			WindowManager.setTempCurrentImage(previous)
+			context.releaseBatchMode()
+		if created is not None and created is not imp and created not in context.images:
+			Interpreter.removeBatchModeImage(created)
+			context.addImage(created)
+
+	@classmethod
+	def plan(cls, command, parameters=None):
+		'''
+		Returns the plan of the command with the options, a function plan(imp) that answers False if it can 
+		not handle the image, or None if the command has no fast path.
+		'''
+		key = (command, parameters)
+		if key in cls.__plans:
+			return cls.__plans[key]
+		builder = cls.__builders().get(command)
+		plan = builder(cls.parseOptions(parameters)) if builder is not None else None
+		if len(cls.__plans)>=cls.MAX_PLANS:
+			cls.__plans.clear()
+		cls.__plans[key] = plan
+		return plan
+
+	@classmethod
+	def parseOptions(cls, parameters):
+		'''
+		Splits an options string like "sigma=2 scaled title=[my image]" into a dictionary. 
+		Keys without value, like "scaled", are mapped to None.
+		'''
+		options = {}
+		if not parameters:
+			return options
+		for key, assignment, value in re.findall(r'([^\s=]+)(=(\[[^\]]*\]|\S*))?', parameters):
+			if value.startswith('['):
+				value = value[1:-1]
+			options[key] = value if assignment else None
+		return options
+
+	@classmethod
+	def __builders(cls):
+		return {
+			"8-bit": cls.__to8Bit,
+			"Smooth": cls.__smooth,
+			"Find Edges": cls.__findEdges,
+			"Duplicate...": cls.__duplicate,
+			"Gaussian Blur...": cls.__gaussianBlur,
+			"Enlarge...": cls.__enlarge,
+			"Clear Outside": cls.__clearOutside
+		}
+
+	@classmethod
+	def __isPlane(cls, imp):
+		return imp.getStackSize()==1 and not imp.isComposite()
+
+	@classmethod
+	def __filterPlane(cls, imp, operation):
+		'''
+		Applies the operation to the processor, restricted to the selection like the ImageJ filters.
+		'''
+		ip = imp.getProcessor()
+		roi = imp.getRoi()
+		if roi is not None and roi.isArea():
+			ip.setRoi(roi)
+		else:
+			ip.resetRoi()
+		ip.snapshot()
+		operation(ip)
+		if ip.getMask() is not None:
+			ip.reset(ip.getMask())
+		ip.resetRoi()
+		imp.changes = True
+		imp.updateAndDraw()
+		return True
+
+	@classmethod
+	def __to8Bit(cls, options):
+		if options:
+			return None
+		def plan(imp):
+			if not cls.__isPlane(imp) or imp.getBitDepth()==8:
+				return False
+			ImageConverter(imp).convertToGray8()
+			return True
+		return plan
+
+	@classmethod
+	def __smooth(cls, options):
+		if options:
+			return None
+		return lambda imp: cls.__isPlane(imp) and cls.__filterPlane(imp, lambda ip: ip.smooth())
+
+	@classmethod
+	def __findEdges(cls, options):
+		if options:
+			return None
+		return lambda imp: cls.__isPlane(imp) and cls.__filterPlane(imp, lambda ip: ip.findEdges())
+
+	@classmethod
+	def __gaussianBlur(cls, options):
+		if not 'sigma' in options or set(options.keys()) - set(['sigma', 'scaled']):
+			return None
+		sigma = float(options['sigma'])
+		scaled = 'scaled' in options
+		def plan(imp):
+			if not cls.__isPlane(imp):
+				return False
+			cal = imp.getCalibration()
+			sigmaX = sigma / cal.pixelWidth if scaled else sigma
+			sigmaY = sigma / cal.pixelHeight if scaled else sigma
+			accuracy = 0.002 if imp.getBitDepth()==8 or imp.getBitDepth()==24 else 0.0002
+			return cls.__filterPlane(imp, lambda ip: GaussianBlur().blurGaussian(ip, sigmaX, sigmaY, accuracy))
+		return plan
+
+	@classmethod
+	def __duplicate(cls, options):
+		if set(options.keys()) - set(['title', 'duplicate', 'ignore']):
+			return None
+		title = options.get('title')
+		wholeStack = 'duplicate' in options
+		ignoreSelection = 'ignore' in options
+		def plan(imp):
+			if imp.isComposite() or imp.isHyperStack():
+				return False
+			roi = imp.getRoi()
+			if ignoreSelection and roi is not None:
+				imp.deleteRoi()
+			try:
+				if wholeStack or imp.getStackSize()==1:
+					copy = Duplicator().run(imp)
+				else:
+					copy = imp.crop()
+			finally:
+				if ignoreSelection and roi is not None:
+					imp.setRoi(roi)
+			copy.setTitle(title if title else WindowManager.getUniqueName(imp.getTitle()))
+			Context.current().addImage(copy)
+			return True
+		return plan
+
+	@classmethod
+	def __enlarge(cls, options):
+		if not 'enlarge' in options or set(options.keys()) - set(['enlarge', 'pixel']):
+			return None
+		distance = float(options['enlarge'])
+		inPixels = 'pixel' in options
+		def plan(imp):
+			roi = imp.getRoi()
+			if roi is None:
+				return False
+			n = distance if inPixels else distance / imp.getCalibration().pixelWidth
+			imp.setRoi(RoiEnlarger.enlarge(roi, n))
+			return True
+		return plan
+
+	@classmethod
+	def __clearOutside(cls, options):
+		if options:
+			return None
+		def plan(imp):
+			roi = imp.getRoi()
+			if not cls.__isPlane(imp) or roi is None or not roi.isArea():
+				return False
+			ip = imp.getProcessor()
+			value = ip.getForegroundValue()
+			ip.setColor(Toolbar.getBackgroundColor())
+			try:
+				ip.fillOutside(roi)
+			finally:
+				ip.setValue(value)
+			imp.changes = True
+			imp.updateAndDraw()
+			return True
+		return plan
 
 def setAutoThreshold(method="Default"):
 	'''
@@ -2055,14 +5052,14 @@ def setAutoThreshold(method="Default"):
 
 	.. _`getThreshold`: redirect.html#mripy.ijmpy.getThreshold
 	'''
-	image = IJ.getImage()
+	image = __getImage()
 	IJ.setAutoThreshold(image, method)
 
 def getWidth():
 	'''
 	Returns the width in pixels of the current image.
 	'''
-	image = IJ.getImage()
+	image = __getImage()
 	return image.getWidth()
 
 def print(*args):
@@ -2076,21 +5073,42 @@ def print(*args):
 	message = ', '.join(stringList)
 	IJ.log(message)
 
-def __getNameOfArg(arg):
+def __getImage():
+	'''
+	Returns the image of the active ImageHandle, the current image of the context or the active image.
+	'''
+	return Context.current().activeImage()
+
+def __getHandle():
+	if Settings.IMAGE_HANDLE is not None:
+		return Settings.IMAGE_HANDLE
+	return ImageHandle(__getImage())
+
+def __draw(operation, imp=None):
+	'''
+	Applies a drawing operation to the image and updates the display or, if a DrawBatch 
+	is active for the image, records the operation.
+	'''
+	if imp is None:
+		imp = __getImage()
+	batch = Settings.DRAW_BATCH
+	if batch is not None and batch.imp is imp:
+		batch.add(operation)
+		return imp
+	operation(imp.getProcessor())
+	__updateAndDraw()
+	return imp
+
+def __paddedBounds(ip, x, y, width, height):
 	'''
-	Utility function to get the name of the variable that was passed as an argument 
-	to the function.	
+	Returns the bounds of a shape, enlarged by the line width.
 	'''
-	name = None
-	outerFrameLocals = inspect.currentframe().f_back.f_back.f_locals	
-	for key in outerFrameLocals.keys():
-		if id(outerFrameLocals[key])==id(arg):
-			name = key
-	return name
+	pad = ip.getLineWidth() + 1
+	return Rectangle(int(x) - pad, int(y) - pad, int(width) + 2 * pad + 1, int(height) + 2 * pad + 1)
 
 def __updateAndDraw():
 	if Settings.AUTO_UPDATE:
-		imp = IJ.getImage()
+		imp = __getImage()
 		imp.updateChannelAndDraw()
 		imp.changes = True
 	else:
@@ -0,0 +1,77 @@
+from __future__ import print_function, division
+import __builtin__
+import time
+from ij import IJ
+from mripy.ijmpy import *
+
+def timePerCall(function, repetitions):
+	'''
+	Returns the mean time in milliseconds of a call to function(i), for i in 0..repetitions-1.
+	'''
+	start = time.time()
+	for i in xrange(repetitions):
+		function(i)
+	return (time.time() - start) * 1000.0 / repetitions
+
+def report(name, macroTime, ijmpyTime):
+	__builtin__.print("%-24s macro: %8.3f ms   ijmpy: %8.3f ms   speedup: %6.1fx" % (name, macroTime, ijmpyTime, macroTime / max(ijmpyTime, 1e-6)))
+
+def benchmarkClose(repetitions=200):
+	def openAndCloseWithMacro(i):
+		newImage("bench", "8-bit black", 64, 64, 1)
+		IJ.runMacro('close();')
+	def openAndClose(i):
+		newImage("bench", "8-bit black", 64, 64, 1)
+		close()
+	def newImageOnly(i):
+		newImage("bench", "8-bit black", 64, 64, 1)
+	base = timePerCall(newImageOnly, repetitions)
+	run("Close All")
+	macroTime = timePerCall(openAndCloseWithMacro, repetitions) - base
+	ijmpyTime = timePerCall(openAndClose, repetitions) - base
+	report("close()", macroTime, ijmpyTime)
+
+def benchmarkFill(repetitions=1000):
+	newImage("bench", "8-bit black", 256, 256, 1)
+	IJ.makeRectangle(10, 10, 100, 100)
+	macroTime = timePerCall(lambda i: IJ.runMacro('fill();'), repetitions)
+	ijmpyTime = timePerCall(lambda i: fill(), repetitions)
+	report("fill()", macroTime, ijmpyTime)
+	run("Close All")
+
+def benchmarkRoiManager(repetitions=1000):
+	newImage("bench", "8-bit black", 256, 256, 1)
+	roiManager("reset")
+	def addWithMacro(i):
+		IJ.makeRectangle(i % 200, i % 100, 10, 10)
+		IJ.runMacro('roiManager("add");')
+	def add(i):
+		IJ.makeRectangle(i % 200, i % 100, 10, 10)
+		roiManager("add")
+	macroTime = timePerCall(addWithMacro, repetitions)
+	roiManager("reset")
+	ijmpyTime = timePerCall(add, repetitions)
+	report('roiManager("add")', macroTime, ijmpyTime)
+	macroTime = timePerCall(lambda i: IJ.runMacro('roiManager("select", '+str(i)+');'), repetitions)
+	ijmpyTime = timePerCall(lambda i: roiManager("select", i), repetitions)
+	report('roiManager("select")', macroTime, ijmpyTime)
+	roiManager("reset")
+	run("Close All")
+
+def benchmarkCall(repetitions=1000):
+	macroTime = timePerCall(lambda i: IJ.runMacro('call("ij.Prefs.get", "bench.key", "'+str(i)+'");'), repetitions)
+	ijmpyTime = timePerCall(lambda i: call("ij.Prefs.get", "bench.key", i), repetitions)
+	report('call()', macroTime, ijmpyTime)
+	arguments = [("bench.key", i) for i in xrange(repetitions)]
+	ijmpyTime = timePerCall(lambda i: callAll("ij.Prefs.get", arguments), 1) / repetitions
+	report('callAll()', macroTime, ijmpyTime)
+
+def main():
+	run("Close All")
+	benchmarkClose()
+	benchmarkFill()
+	benchmarkRoiManager()
+	benchmarkCall()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,51 @@
+'''
+Reports the time needed to import ijmpy.
+
+Run it in a new Fiji, for example with:
+
+	ImageJ-linux64 --headless --console --run ijmpy_startup_benchmark.py
+
+The cold import time is the time of the first import of ijmpy in the process, which loads the java classes
+and python modules ijmpy needs. The warm import time is the mean time of importing ijmpy again after it has
+been removed from sys.modules. The python modules that ijmpy exports as lazy modules should not be loaded
+by the import, the benchmark reports those that are.
+'''
+from __future__ import print_function, division
+import sys, time
+
+COLD_IMPORT_BUDGET = 1000.0			# milliseconds
+WARM_IMPORT_BUDGET = 100.0			# milliseconds
+WARM_REPETITIONS = 20
+LAZY_MODULES = ('urllib2', 'subprocess', 'tokenize', 'shutil', 'inspect')
+
+def importTime():
+	'''
+	Returns the time in milliseconds needed to import ijmpy.
+	'''
+	sys.modules.pop('mripy.ijmpy', None)
+	start = time.time()
+	__import__('mripy.ijmpy')
+	return (time.time() - start) * 1000.0
+
+def report(name, milliseconds, budget):
+	status = 'ok'
+	if milliseconds > budget:
+		status = 'OVER BUDGET'
+	print("%-12s %8.1f ms   budget: %8.1f ms   %s" % (name, milliseconds, budget, status))
+
+def benchmarkImport():
+	cold = None
+	if 'mripy.ijmpy' not in sys.modules:
+		loadedBefore = set(sys.modules.keys())
+		cold = importTime()
+		loaded = [name for name in LAZY_MODULES if name in sys.modules and name not in loadedBefore]
+	warm = sum(importTime() for i in range(WARM_REPETITIONS)) / WARM_REPETITIONS
+	if cold is None:
+		print('ijmpy was already imported, run the benchmark in a new process to measure the cold import time')
+	else:
+		report('cold import', cold, COLD_IMPORT_BUDGET)
+		if loaded:
+			print('modules loaded by the import: ' + ', '.join(loaded))
+	report('warm import', warm, WARM_IMPORT_BUDGET)
+
+benchmarkImport()
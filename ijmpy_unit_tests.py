@@ -2,7 +2,9 @@ from __future__ import print_function, division
 import __builtin__
 import sys, time, unittest, math, os
 from ij import WindowManager
-from ij.gui import Roi
+from ij.gui import Roi, Line
+from ij.process import ByteProcessor, FloatProcessor
+from ij.plugin.frame import RoiManager
 from ij.macro import Interpreter
 from mripy.ijmpy import *
 
@@ -109,12 +111,45 @@ class ArrayTest(unittest.TestCase):
 		self.assertEquals(minima[0], 13)
 		self.assertEquals(minima[1], 4)
 
+	def testFindMaximaOfProfiles(self):
+		array1 = [1, 2, 3, 4, 5, 4, 3, 2, 3, 4, 5, 6, 7, 8, 7, 6, 6, 5]
+		array2 = [10, 9, 8, 7, 6, 7, 8, 9, 10, 10, 9, 8, 7, 6, 7, 8, 9, 9]
+		positions, offsets = Array.findMaximaOfProfiles([array1, array2, array1], 1)
+		self.assertEquals(len(offsets), 4)
+		self.assertEquals(list(positions[0:2]), [13, 4])
+		self.assertEquals(list(positions[offsets[2]:offsets[3]]), [13, 4])
+		positions, offsets = Array.findMinimaOfProfiles([array1, array2], 1)
+		self.assertEquals(list(positions[offsets[1]:offsets[2]]), list(Array.findMinima(array2, 1)))
+
+	def testFindMaximaOfRows(self):
+		ip = FloatProcessor(18, 3)
+		array = [1, 2, 3, 4, 5, 4, 3, 2, 3, 4, 5, 6, 7, 8, 7, 6, 6, 5]
+		for y in range(3):
+			for x in range(18):
+				ip.setf(x, y, array[x])
+		positions, offsets = Array.findMaximaOfProfiles(Profiles.rows(ip), 1)
+		self.assertEquals(list(offsets), [0, 2, 4, 6])
+		self.assertEquals(positions[4], 13)
+
 	def testFourier(self):
 		array = [0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1]
 		fourier = Array.fourier(array)
 		self.assertEquals(fourier[0], 0.25)
 		self.assertEquals(round(fourier[8],4), 0.3536)
 
+	def testFourierOfArrays(self):
+		array1 = [0, 0, 0, 1] * 8
+		array2 = [0, 1] * 16
+		amplitudes, size = Array.fourierOfArrays([array1, array2, array1])
+		self.assertEquals(len(amplitudes), 3 * size)
+		single = Array.fourier(array2)
+		self.assertEquals(size, len(single))
+		self.assertEquals(amplitudes[0], 0.25)
+		self.assertEquals(round(amplitudes[8], 4), 0.3536)
+		self.assertEquals(list(amplitudes[size:2*size]), list(single))
+		self.assertEquals(list(amplitudes[2*size:3*size]), list(amplitudes[0:size]))
+		self.assertTrue(FourierPlan.get(32) is FourierPlan.get(32))
+
 	def testGetSequence(self):
 		seq = Array.getSequence(4)
 		self.assertEquals(len(seq), 4)
@@ -157,6 +192,20 @@ class ArrayTest(unittest.TestCase):
 		self.assertEquals(ranks[2], 1)
 		self.assertEquals(ranks[3], 0)
 
+	def testRankPositionsK(self):
+		array = [10, 9, 8, 7, 7, 6 ,5]
+		ranks = Array.rankPositions(array, 4)
+		self.assertEquals(list(ranks), [6, 5, 3, 4])
+
+	def testTopK(self):
+		array = Array.asPrimitive([3, 9, 1, 9, 4, 7])
+		self.assertEquals(Array.topK(array, 3), [1, 3, 5])
+		self.assertEquals(Array.bottomK(array, 2), [2, 0])
+		self.assertEquals(Array.topK(array, 10), [1, 3, 5, 4, 0, 2])
+		labels = ["the", "Quick", "brown", "fox"]
+		self.assertEquals(Array.topK(labels, 1), [0])
+		self.assertEquals(Array.bottomK(labels, 2), [2, 3])
+
 	def testResampleBigger(self):
 		array = [1, 2, 3, 4, 5]
 		resampled = Array.resample(array, 10)
@@ -171,6 +220,22 @@ class ArrayTest(unittest.TestCase):
 		self.assertEquals(resampled[0], 1)
 		self.assertEquals(resampled[-1], 10)
 
+	def testResampleArrays(self):
+		array1 = [1, 2, 3, 4, 5]
+		array2 = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+		resampled = Array.resampleArrays([array1, array2], 7)
+		self.assertEquals(len(resampled), 14)
+		self.assertEquals(list(resampled[0:7]), list(Array.resample(array1, 7)))
+		self.assertEquals(list(resampled[7:14]), list(Array.resample(array2, 7)))
+
+	def testResampleContours(self):
+		x = [0, 10, 10, 0]
+		y = [0, 0, 10, 10]
+		xs, ys = Array.resampleContours([x, x[:3]], [y, y[:3]], 7)
+		self.assertEquals(len(xs), 14)
+		self.assertEquals(list(xs[0:7]), list(Array.resample(x, 7)))
+		self.assertEquals(list(ys[7:14]), list(Array.resample(y[:3], 7)))
+
 	def testReverse(self):
 		array = [1, 2, 3]
 		Array.reverse(array)
@@ -309,6 +374,19 @@ class ArrayTest(unittest.TestCase):
 		self.assertEquals(round(values[3], 3), 4.567)
 		close('Results')
 
+	def testShowVirtual(self):
+		array1 = Array.getSequence(2000000)
+		array2 = ["a", "b", "c"]
+		model = Array.showVirtual('huge (indexes)', array1, array2)
+		model.frame.dispose()
+		self.assertEquals(model.getRowCount(), 2000000)
+		self.assertEquals(model.getColumnCount(), 3)
+		self.assertEquals(model.getColumnName(1), "array1")
+		self.assertEquals(model.getValueAt(1999999, 0), 1999999)
+		self.assertEquals(model.getValueAt(1999999, 1), 1999999)
+		self.assertEquals(model.getValueAt(2, 2), "c")
+		self.assertEquals(model.getValueAt(3, 2), None)
+
 	def testSlice(self):
 		array = [1, 2, 3, 4, 5]
 		# remove first element
@@ -376,6 +454,135 @@ class ArrayTest(unittest.TestCase):
 		self.assertEquals(round(angles[0]), 36.0)
 		self.assertEquals(round(angles[9]), 36.0)
 
+	def testGetVertexAnglesOfContours(self):
+		x = [260.0004, 242.7981, 197.8065, 142.1838, 97.1959, 79.9999, 97.2080, 142.2034, 197.8261, 242.8102]
+		y = [170, 222.8958, 255.6012, 255.5979, 222.8874, 169.9895, 117.0956, 84.3954, 84.4054, 117.1212]
+		square = Roi(10, 10, 20, 20)
+		angles, offsets = Array.getVertexAnglesOfContours([(x, y), square, (x[:5], y[:5])], 1)
+		self.assertEquals(len(offsets), 4)
+		self.assertEquals(offsets[1], 10)
+		self.assertEquals(offsets[2], 14)
+		self.assertEquals(len(angles), 19)
+		single = Array.getVertexAngles(x, y, 1)
+		for i in range(10):
+			self.assertEquals(angles[i], single[i])
+		self.assertEquals(round(abs(angles[10])), 90.0)
+		self.assertEquals(list(angles[14:19]), list(Array.getVertexAngles(x[:5], y[:5], 1)))
+
+	def testViewCopyOnWrite(self):
+		array = [1, 2, 3, 4, 5]
+		sliced = Array.slice(array, 1, 4)
+		self.assertTrue(isinstance(sliced, ArrayView))
+		array[1] = 20
+		self.assertEquals(sliced[0], 2)
+		sliced[0] = 30
+		self.assertEquals(array[1], 20)
+		self.assertEquals(sliced, [30, 3, 4])
+
+	def testViewsAreIndependent(self):
+		array = [1, 2, 3, 4]
+		trimmed = Array.trim(array, 3)
+		joined = Array.concat(array, 5)
+		deleted = Array.deleteIndex(array, 0)
+		Array.fill(array, 0)
+		self.assertEquals(trimmed, [1, 2, 3])
+		self.assertEquals(joined, [1, 2, 3, 4, 5])
+		self.assertEquals(deleted, [2, 3, 4])
+		joined[0] = 10
+		self.assertEquals(Array.trim(joined, 2), [10, 2])
+		self.assertEquals(trimmed[0], 1)
+
+	def testViewToJava(self):
+		names = Array.concat(["c", "a"], "b")
+		self.assertEquals(list(Array.rankPositions(names)), [1, 2, 0])
+		x = Array.getSequence(5)
+		y = Array.concat([1, 3], [5, 7, 9])
+		Fit.doFit("Straight Line", x, y)
+		self.assertAlmostEqual(Fit.p(1), 2.0)
+
+	def testViewChain(self):
+		sequence = Array.getSequence(10)
+		sequence = Array.concat(sequence, 10, 11)
+		Array.rotate(sequence, 2)
+		Array.reverse(sequence)
+		self.assertEquals(Array.toList(Array.trim(sequence, 3)), [9, 8, 7])
+		self.assertEquals(sequence[-1], 10)
+		doubles = Array.asPrimitive(sequence)
+		self.assertEquals(doubles.typecode, 'd')
+		self.assertEquals(doubles[0], 9)
+
+	def testAsPrimitive(self):
+		array = [1, 2, 3]
+		doubles = Array.asPrimitive(array)
+		self.assertEquals(doubles.typecode, 'd')
+		self.assertEquals(doubles[2], 3.0)
+		self.assertTrue(Array.asPrimitive(doubles) is doubles)
+		floats = Array.asPrimitive(doubles, Array.FLOAT)
+		self.assertEquals(floats.typecode, 'f')
+		self.assertTrue(Array.isPrimitive(floats))
+		self.assertFalse(Array.isPrimitive(array))
+
+	def testToList(self):
+		doubles = Array.asPrimitive([1, 2, 3])
+		aList = Array.toList(doubles)
+		self.assertTrue(isinstance(aList, list))
+		self.assertEquals(aList, [1.0, 2.0, 3.0])
+
+	def testPrimitiveChain(self):
+		array = Array.asPrimitive([1, 2, 3, 4, 5, 4, 3, 2, 3, 4, 5, 6, 7, 8, 7, 6, 6, 5])
+		resampled = Array.resample(array, 35)
+		self.assertTrue(Array.isPrimitive(resampled))
+		maxima = Array.findMaxima(resampled, 1)
+		self.assertTrue(Array.isPrimitive(maxima))
+		self.assertEquals(len(maxima), 2)
+		Array.sort(resampled)
+		self.assertEquals(resampled[-1], 8)
+
+class StatisticsAccumulatorTest(unittest.TestCase):
+
+	def testOffsetData(self):
+		accumulator = StatisticsAccumulator()
+		accumulator.addAll(1e9 + value for value in [4, 7, 13, 16])
+		min, max, mean, stdDev = accumulator.getStatistics()
+		self.assertEquals(min, 1e9 + 4)
+		self.assertEquals(max, 1e9 + 16)
+		self.assertEquals(mean, 1e9 + 10)
+		self.assertEquals(round(stdDev, 4), 5.4772)
+
+	def testMerge(self):
+		accumulator1 = StatisticsAccumulator(keepValues=True).addAll([1, 2, 3, 4, 5])
+		accumulator2 = StatisticsAccumulator(keepValues=True).addAll(Array.asPrimitive([6, 7, 8, 9, 10]))
+		accumulator1.merge(accumulator2)
+		min, max, mean, stdDev = accumulator1.getStatistics()
+		self.assertEquals(min, 1)
+		self.assertEquals(max, 10)
+		self.assertEquals(mean, 5.5)
+		self.assertEquals(round(stdDev, 4), 3.0277)
+		self.assertEquals(accumulator1.median(), 5.5)
+
+	def testMergeWithoutValues(self):
+		accumulator1 = StatisticsAccumulator(keepValues=True).addAll([1, 2, 3])
+		accumulator2 = StatisticsAccumulator().addAll([10, 20])
+		self.assertRaises(Exception, accumulator1.merge, accumulator2)
+		self.assertEquals(accumulator1.getStatistics(), (1, 3, 2, 1))
+
+	def testPercentile(self):
+		accumulator = StatisticsAccumulator(keepValues=True)
+		accumulator.addAll([9, 1, 8, 2, 7, 3, 6, 4, 5])
+		self.assertEquals(accumulator.median(), 5)
+		self.assertEquals(accumulator.percentile(0), 1)
+		self.assertEquals(accumulator.percentile(100), 9)
+		self.assertEquals(accumulator.percentile(25), 3)
+
+	def testUnsignedPixels(self):
+		ip = ByteProcessor(2, 1)
+		ip.set(0, 0, 200)
+		ip.set(1, 0, 100)
+		min, max, mean, stdDev = StatisticsAccumulator().addAll(ip.getPixels()).getStatistics()
+		self.assertEquals(min, 100)
+		self.assertEquals(max, 200)
+		self.assertEquals(mean, 150)
+
 class CallTest(unittest.TestCase):
 
 	def testNoParameter(self):
@@ -389,6 +596,21 @@ class CallTest(unittest.TestCase):
 		 demoString = call("ij.Prefs.get", "demo.string", "Text for preferences file")
 		 self.assertEquals(demoString, "Text for preferences file")
 
+	def testNumberParameter(self):
+		self.assertEquals(call("ij.Prefs.get", "ijmpy.test.undefined", 0), 0)
+		self.assertEquals(call("java.lang.Math.max", 2, 3.5), 3.5)
+
+	def testNoStringMethod(self):
+		self.assertEquals(call("ij.IJ.pad", 5, 3), "005")
+
+	def testCached(self):
+		self.assertTrue(JavaCall.get("ij.IJ.getVersion", 0) is JavaCall.get("ij.IJ.getVersion", 0))
+		self.assertFalse(JavaCall.get("ij.IJ.getVersion", 0).function is None)
+
+	def testCallAll(self):
+		self.assertEquals(callAll("ij.IJ.pad", [(1, 3), (22, 3)]), ["001", "022"])
+		self.assertEquals(callAll("java.lang.Integer.parseInt", ["1", "2", "3"]), [1, 2, 3])
+
 class CloseTest(unittest.TestCase):
 	def setUp(self):
 		unittest.TestCase.setUp(self)
@@ -413,6 +635,25 @@ class CloseTest(unittest.TestCase):
 		close("*");
 		self.assertEqual(nImages(), 0)
 
+	def testCloseOthers(self):
+		newImage("Ramp", "8-bit ramp", 256, 256, 1);
+		newImage("Ramp2", "8-bit ramp", 256, 256, 1);
+		newImage("Front", "8-bit ramp", 256, 256, 1);
+		self.assertEqual(close("\\Others"), 2)
+		self.assertEqual(nImages(), 1)
+		self.assertEqual(IJ.getImage().getTitle(), "Front")
+
+	def testClosePatternKeep(self):
+		newImage("Ramp", "8-bit ramp", 256, 256, 1);
+		imp = newImage("Ramp2", "8-bit ramp", 256, 256, 1);
+		newImage("Other", "8-bit ramp", 256, 256, 1);
+		imp.changes = True
+		self.assertEqual(close("Ramp?", "keep"), 0)
+		self.assertEqual(close("Ramp*", "keep"), 1)
+		self.assertEqual(nImages(), 2)
+		self.assertEqual(close("Ramp*"), 1)
+		self.assertEqual(nImages(), 1)
+
 class AutoUpdateTest(unittest.TestCase):
 
 	def testAutoUpdate(self):
@@ -478,6 +719,84 @@ class CalibrateTest(unittest.TestCase):
 		cv = calibrate(255)
 		self.assertEquals(cv, 1)
 
+class ImageHandleTest(unittest.TestCase):
+	def setUp(self):
+		unittest.TestCase.setUp(self)
+		run("Close All");
+
+	def tearDown(self):
+		unittest.TestCase.tearDown(self)
+		run("Close All");
+
+	def testGetPixel(self):
+		imp = newImage("Ramp", "8-bit ramp", 256, 16, 1);
+		handle = ImageHandle(imp)
+		self.assertEquals(handle.width, 256)
+		self.assertEquals(handle.bitDepth, 8)
+		self.assertEquals(handle.getPixel(99, 3), 99)
+		self.assertAlmostEquals(handle.getPixel(99.5, 3.0), 99.5, delta=0.01)
+		self.assertEquals(handle.getPixel(256+17), 17)
+
+	def testActivate(self):
+		imp1 = newImage("One", "8-bit black", 32, 32, 1);
+		imp2 = newImage("Two", "16-bit ramp", 64, 32, 1);
+		with ImageHandle(imp1) as handle:
+			self.assertEquals(getWidth(), 32)
+			self.assertEquals(bitDepth(), 8)
+			handle.setPixel(1, 1, 200)
+			self.assertEquals(getPixel(1, 1), 200)
+		self.assertEquals(getWidth(), 64)
+		self.assertEquals(bitDepth(), 16)
+		self.assertIsNone(Settings.IMAGE_HANDLE)
+
+	def testGetAndSetPixels(self):
+		imp = newImage("Black", "8-bit black", 32, 32, 1);
+		handle = ImageHandle(imp)
+		handle.setPixels(2, 3, 2, 2, [1, 2, 300, -4])
+		pixels = handle.getPixels(2, 3, 2, 2)
+		self.assertEquals(list(pixels), [1, 2, 255, 0])
+		self.assertEquals(len(handle.getPixels()), 32*32)
+
+	def testRGB(self):
+		imp = newImage("RGB", "RGB black", 16, 16, 1);
+		handle = ImageHandle(imp)
+		handle.setPixels(0, 0, 1, 1, [0xff0000])
+		self.assertEquals(handle.getPixel(0, 0) & 0xffffff, 0xff0000)
+		self.assertEquals(handle.getPixels(0, 0, 1, 1)[0] & 0xffffff, 0xff0000)
+
+	def testSample(self):
+		imp = newImage("Ramp", "32-bit ramp", 256, 16, 1);
+		handle = ImageHandle(imp)
+		xs = [i * 0.25 for i in range(400)]
+		ys = [3.5] * 400
+		values = handle.sample(xs, ys)
+		self.assertEquals(len(values), 400)
+		for i in (0, 5, 101, 399):
+			self.assertAlmostEquals(values[i], handle.getPixel(xs[i], ys[i]), delta=1e-6)
+		handle.MIN_POINTS_PER_THREAD = 10
+		self.assertEquals(list(handle.sample(xs, ys)), list(values))
+
+	def testSampleLine(self):
+		imp = newImage("Ramp", "8-bit ramp", 256, 16, 1);
+		imp.setRoi(Line(10, 5, 20, 5))
+		values = ImageHandle(imp).sampleLine(step=0.5)
+		self.assertAlmostEquals(len(values), 21, delta=1)
+		self.assertAlmostEquals(values[1], 10.5, delta=0.01)
+
+	def testSampleRGB(self):
+		imp = newImage("RGB", "RGB black", 16, 16, 1);
+		imp.getProcessor().set(5, 5, 0xff0000)
+		values = ImageHandle(imp).sample([5.0, 4.0], [5.0, 0.0])
+		self.assertEquals(values[0] & 0xffffff, 0xff0000)
+		self.assertEquals(values[1] & 0xffffff, 0)
+
+	def testSampleStack(self):
+		imp = newImage("Ramp", "16-bit ramp", 256, 16, 4);
+		imp.getStack().getProcessor(3).add(1000)
+		profiles = ImageHandle(imp).sampleStack([100.5], [2.0], [1, 3])
+		self.assertEquals(len(profiles), 2)
+		self.assertAlmostEquals(profiles[1][0] - profiles[0][0], 1000, delta=1e-6)
+
 class ChangeValuesTest(unittest.TestCase):
 	def setUp(self):
 		unittest.TestCase.setUp(self)
@@ -495,6 +814,12 @@ class ChangeValuesTest(unittest.TestCase):
 		self.assertEquals(getPixel(110, 0), 255)
 		self.assertEquals(getPixel(111, 0), 111)
 
+	def test8BitWithNaNBound(self):
+		imp = newImage("Ramp", "8-bit ramp", 256, 256, 1);
+		self.assertEquals(changeValues(NaN, 110, 255), 0)
+		self.assertEquals(changeValues(-float('inf'), 10, 255), 11 * 256)
+		self.assertEquals(getPixel(100, 0), 100)
+
 	def test8BitWithRoi(self):
 		imp = newImage("Ramp", "8-bit ramp", 256, 256, 1);
 		IJ.makeRectangle(10, 10, 10, 10)
@@ -520,6 +845,66 @@ class ChangeValuesTest(unittest.TestCase):
 		self.assertEquals(getPixel(110, 0), 1)
 		self.assertEquals(getPixel(111, 0), 111/256.0)
 
+	def testStack(self):
+		imp = newImage("Ramp", "16-bit ramp", 256, 256, 3);
+		IJ.makeRectangle(0, 0, 256, 128)
+		count = changeValues(100*256, 110*256, 255, imp, True);
+		self.assertEquals(count, 3 * 11 * 128)
+		ip = imp.getStack().getProcessor(3)
+		self.assertEquals(ip.get(100, 100), 255)
+		self.assertEquals(ip.get(100, 200), 100*256)
+
+	def testNaN(self):
+		imp = newImage("Ramp", "32-bit ramp", 256, 256, 2);
+		imp.getStack().getProcessor(2).setf(5, 5, NaN)
+		imp.getStack().getProcessor(2).setf(6, 5, NaN)
+		count = changeValues(NaN, NaN, -1, imp, True);
+		self.assertEquals(count, 2)
+		self.assertEquals(imp.getStack().getProcessor(2).getf(5, 5), -1)
+		self.assertEquals(imp.getStack().getProcessor(1).getf(5, 5), 5/256.0)
+
+class PlanesTest(unittest.TestCase):
+	def setUp(self):
+		unittest.TestCase.setUp(self)
+		run("Close All");
+		Settings.GLOBAL_COLOR = Color.white
+
+	def tearDown(self):
+		unittest.TestCase.tearDown(self)
+		Settings.GLOBAL_COLOR = None
+		run("Close All");
+
+	def testSelect(self):
+		imp = IJ.createImage("Hyper", "8-bit black", 16, 16, 2, 3, 4)
+		self.assertEquals(len(Planes.select(imp)), 24)
+		self.assertEquals(Planes.select(imp, channels=2, slices=1), [2, 8, 14, 20])
+		self.assertEquals(Planes.select(imp, channels=1, slices="2-3", frames=[4]), [21, 23])
+		self.assertRaises(Exception, Planes.select, imp, 3)
+
+	def testFillRect(self):
+		imp = IJ.createImage("Hyper", "8-bit black", 16, 16, 2, 3, 4)
+		imp.setPosition(1, 1, 1)
+		fillRect(2, 2, 4, 4, imp, stack=Planes.select(imp, channels=2, frames="2,4"))
+		stack = imp.getStack()
+		self.assertEquals(stack.getProcessor(imp.getStackIndex(2, 3, 4)).get(3, 3), 255)
+		self.assertEquals(stack.getProcessor(imp.getStackIndex(2, 3, 4)).get(7, 7), 0)
+		self.assertEquals(stack.getProcessor(imp.getStackIndex(2, 3, 3)).get(3, 3), 0)
+		self.assertEquals(stack.getProcessor(imp.getStackIndex(1, 3, 4)).get(3, 3), 0)
+		self.assertEquals(imp.getCurrentSlice(), 1)
+
+	def testFloodFill(self):
+		imp = newImage("Black", "8-bit black", 16, 16, 5);
+		floodFill(0, 0, imp=imp, stack=True)
+		for z in range(1, 6):
+			self.assertEquals(imp.getStack().getProcessor(z).get(15, 15), 255)
+
+	def testChangeValues(self):
+		imp = IJ.createImage("Hyper", "8-bit ramp", 256, 4, 1, 2, 3)
+		count = changeValues(0, 9, 255, imp, Planes.select(imp, frames=3))
+		self.assertEquals(count, 2 * 10 * 4)
+		self.assertEquals(imp.getStack().getProcessor(6).get(5, 0), 255)
+		self.assertEquals(imp.getStack().getProcessor(1).get(5, 0), 5)
+
 class CharCodeAtTest(unittest.TestCase):
 	def testCharCodeAt(self):
 		name = 'Bäcker'
@@ -531,6 +916,15 @@ class D2STest(unittest.TestCase):
 		res = d2s(2/3.0, 2)
 		self.assertEquals(res, '0.67')
 
+class ToStringTest(unittest.TestCase):
+	def testToString(self):
+		self.assertEquals(toString(2.0), '2')
+		self.assertEquals(toString(-7), '-7')
+		self.assertEquals(toString(2/3.0), '0.6667')
+		self.assertEquals(toString(2/3.0, 2), '0.67')
+		self.assertEquals(toString(float('nan')), 'NaN')
+		self.assertEquals(toString("abc"), 'abc')
+
 class DoCommandTest(unittest.TestCase):
 	def setUp(self):
 		unittest.TestCase.setUp(self)
@@ -610,6 +1004,140 @@ class DrawTest(unittest.TestCase):
 		roi = doWand(54, 38);
 		self.assertEquals(len(roi.getContainedPoints()), 15)
 
+	def testDrawBatch(self):
+		IJ.setForegroundColor(255, 255, 255)
+		with DrawBatch() as batch:
+			drawLine(10, 10, 100, 100);
+			drawRect(128, 128, 50, 50);
+			self.assertEquals(getPixel(50, 50), 0)
+			self.assertEquals(len(batch.operations), 2)
+		self.assertEquals(getPixel(50, 50), 255)
+		roi = doWand(150, 150)
+		self.assertEquals(len(roi.getContainedPoints()), 2304)
+		self.assertIsNone(Settings.DRAW_BATCH)
+
+	def testDrawBatchFlush(self):
+		IJ.setForegroundColor(255, 255, 255)
+		batch = DrawBatch()
+		with batch:
+			drawOval(20, 30, 10, 10);
+			drawString("fox", 50, 50);
+			dirty = batch.flush()
+			self.assertTrue(dirty.contains(20, 30))
+			self.assertTrue(dirty.contains(52, 45))
+			self.assertFalse(dirty.contains(200, 200))
+		self.assertIsNone(batch.flush())
+
+	def testDrawBatchColors(self):
+		ip = IJ.getImage().getProcessor()
+		with DrawBatch():
+			ip.setValue(100)
+			drawLine(10, 10, 100, 10);
+			ip.setValue(200)
+			ip.setLineWidth(3)
+			drawLine(10, 50, 100, 50);
+			ip.setValue(50)
+			ip.setLineWidth(1)
+		self.assertEquals(getPixel(50, 10), 100)
+		self.assertEquals(getPixel(50, 11), 0)
+		self.assertEquals(getPixel(50, 50), 200)
+		self.assertEquals(getPixel(50, 51), 200)
+		self.assertEquals(ip.getForegroundValue(), 50)
+		self.assertEquals(ip.getLineWidth(), 1)
+
+	def testUpdateDisplay(self):
+		autoUpdate(False)
+		drawLine(10, 10, 100, 100);
+		self.assertTrue(Settings.UPDATE_NEEDED)
+		updateDisplay()
+		self.assertFalse(Settings.UPDATE_NEEDED)
+		autoUpdate(True)
+
+class OverlayTest(unittest.TestCase):
+	def setUp(self):
+		unittest.TestCase.setUp(self)
+		run("Close All");
+		newImage("test", "8-bit black", 256, 256, 1);
+
+	def tearDown(self):
+		unittest.TestCase.tearDown(self)
+		run("Close All");
+
+	def testDraw(self):
+		Overlay.drawLine(10, 10, 100, 100)
+		Overlay.drawRect(20, 20, 30, 30)
+		Overlay.drawEllipse(40, 40, 10, 20)
+		Overlay.drawString("fox", 50, 50)
+		self.assertEquals(Overlay.size(), 4)
+		self.assertEquals(getPixel(50, 50), 0)
+		Overlay.remove()
+		self.assertEquals(Overlay.size(), 0)
+
+	def testAddBulk(self):
+		n = 1000
+		xs = [i % 250 for i in range(n)]
+		ys = [i // 4 for i in range(n)]
+		sizes = [3] * n
+		overlay = Overlay.addEllipses(xs, ys, sizes, sizes, color="yellow", lineWidth=2)
+		self.assertEquals(overlay.size(), n)
+		self.assertEquals(overlay.get(0).getStrokeColor(), Color.yellow)
+		self.assertTrue(overlay.get(0).getStroke() is overlay.get(n-1).getStroke())
+		Overlay.addRects(xs, ys, sizes, sizes, fillColor="red")
+		Overlay.addLines(xs, ys, ys, xs)
+		Overlay.addLabels(["a"] * n, xs, ys)
+		self.assertTrue(overlay.get(3*n).getCurrentFont() is overlay.get(4*n-1).getCurrentFont())
+		Overlay.addPolygons([[0, 10, 10], [5, 20, 5]], [[0, 0, 10], [5, 5, 20]], closed=False)
+		self.assertEquals(Overlay.size(), 4*n+2)
+		self.assertEquals(overlay.get(4*n+1).getType(), Roi.POLYLINE)
+		self.assertEquals(IJ.getImage().getProcessor().getStatistics().max, 0)
+
+	def testCull(self):
+		xs = [i * 10 for i in range(100)]
+		ys = [i * 10 for i in range(100)]
+		sizes = [3] * 100
+		Overlay.addRects(xs, ys, sizes, sizes)
+		overlay = Overlay.cull()
+		self.assertTrue(IJ.getImage().getOverlay() is overlay)
+		self.assertEquals(overlay.size(), 100)
+		self.assertEquals(Overlay.size(), 100)
+		visible = overlay.visibleShapes(Rectangle(0, 0, 100, 100), 1.0)
+		self.assertEquals(len(visible), 11)
+		self.assertTrue(visible[0] is overlay.getShape(0))
+		self.assertEquals(len(overlay.visibleShapes(Rectangle(0, 0, 1000, 1000), 0.25)), 0)
+		Overlay.addRects([500], [20], [50], [50])
+		self.assertEquals(len(overlay.visibleShapes(Rectangle(400, 0, 200, 100), 1.0)), 1)
+		overlay.remove(0)
+		self.assertEquals(overlay.shapeCount(), 100)
+		self.assertEquals(len(overlay.visibleShapes(Rectangle(0, 0, 100, 100), 1.0)), 10)
+
+	def testCullSimplify(self):
+		n = 400
+		xs = [100 + 50 * math.cos(2 * math.pi * i / n) for i in range(n)]
+		ys = [100 + 50 * math.sin(2 * math.pi * i / n) for i in range(n)]
+		Overlay.addPolygons([xs], [ys], color="red")
+		overlay = Overlay.cull()
+		shape = overlay.visibleShapes(Rectangle(0, 0, 256, 256), 1.0)[0]
+		self.assertEquals(shape.getNCoordinates(), n)
+		simplified = overlay.visibleShapes(Rectangle(0, 0, 256, 256), 0.25)[0]
+		self.assertTrue(simplified.getNCoordinates()<n/4)
+		self.assertEquals(simplified.getStrokeColor(), Color.red)
+		self.assertTrue(overlay.visibleShapes(Rectangle(0, 0, 256, 256), 0.25)[0] is simplified)
+
+	def testCullUpdates(self):
+		Overlay.addRects([10], [10], [20], [20])
+		IJ.getImage().getOverlay().drawLabels(True)
+		overlay = Overlay.cull()
+		self.assertTrue(overlay.getDrawLabels())
+		self.assertTrue(isinstance(IJ.getImage().getCanvas(), CullingCanvas))
+		self.assertTrue(IJ.getImage().getOverlay() is overlay)
+		overlay.translate(500, 0)
+		self.assertEquals(len(overlay.visibleShapes(Rectangle(0, 0, 100, 100), 1.0)), 0)
+		self.assertEquals(len(overlay.visibleShapes(Rectangle(500, 0, 100, 100), 1.0)), 1)
+		overlay.getShape(0).setLocation(10, 10)
+		overlay.invalidate()
+		self.assertEquals(len(overlay.visibleShapes(Rectangle(0, 0, 100, 100), 1.0)), 1)
+		self.assertEquals(overlay.indexOf(overlay.getShape(0)), 0)
+
 class EndsWithTest(unittest.TestCase):
 	def testEndsWith(self):
 		self.assertEquals(endsWith('ijmpy.py','py'), True)
@@ -872,6 +1400,16 @@ class FillTest(unittest.TestCase):
 		mean = IJ.getValue(imp, 'Mean')
 		self.assertEquals(mean, 63.75)
 
+	def testFillStackLine(self):
+		IJ.setForegroundColor(255, 255, 255)
+		imp = newImage("stack", "8-bit black", 256, 256, 3);
+		IJ.makeLine(0, 10, 255, 10)
+		fill(stack=True)
+		for n in range(1, 4):
+			ip = imp.getStack().getProcessor(n)
+			self.assertEquals(ip.get(100, 10), 255)
+			self.assertEquals(ip.get(100, 100), 0)
+
 	def testFillOval(self):
 		IJ.setForegroundColor(255, 255, 255)
 		fillOval(128, 128, 50, 50);
@@ -1104,6 +1642,15 @@ class GetPixelTest(unittest.TestCase):
 		newImage("Ramp", "8-bit ramp", 256, 256, 1);
 		self.assertEquals(getPixel(128.5, 128.5), 128.5)
 
+	def testGetPixelCalibratedFloatCoords(self):
+		newImage("Ramp", "8-bit ramp", 256, 256, 1);
+		ip = Context.current().currentImage().getProcessor()
+		ip.setCalibrationTable(jarray.array([2.0 * i for i in range(256)], 'f'))
+		self.assertEquals(getPixel(128.5, 128.5), 128.5)
+		with ImageHandle() as handle:
+			self.assertEquals(handle.getPixel(128.5, 128.5), 128.5)
+		self.assertEquals(ip.getCalibrationTable()[1], 2.0)
+
 	def testGetPixelGrey16Bit(self):
 		newImage("Ramp", "16-bit ramp", 256, 256, 1);
 		self.assertEquals(getPixel(128, 128), 32768)
@@ -1118,6 +1665,52 @@ class GetPixelTest(unittest.TestCase):
 		self.assertEquals(green, 128)
 		self.assertEquals(blue, 128)
 
+class LabelComponentsTest(unittest.TestCase):
+	def setUp(self):
+		unittest.TestCase.setUp(self)
+		run("Close All");
+
+	def tearDown(self):
+		unittest.TestCase.tearDown(self)
+		run("Close All");
+
+	def testLabel2D(self):
+		ip = ByteProcessor(10, 10)
+		ip.setColor(255)
+		ip.fillRect(1, 1, 3, 2)
+		ip.fillRect(4, 3, 2, 2)
+		ip.fillRect(7, 7, 2, 3)
+		imp = ImagePlus("Objects", ip)
+		labels, counts, boxes = labelComponents(imp)
+		self.assertEquals(list(counts), [10, 6])
+		self.assertEquals(boxes[0], (1, 1, 0, 5, 4, 1))
+		self.assertEquals(boxes[1], (7, 7, 0, 2, 3, 1))
+		self.assertEquals(labels.getBitDepth(), 16)
+		self.assertEquals(labels.getProcessor().get(8, 8), 2)
+		self.assertEquals(labels.getProcessor().get(0, 0), 0)
+		labels, counts, boxes = labelComponents(imp, 4)
+		self.assertEquals(list(counts), [6, 4, 6])
+
+	def testLabel3D(self):
+		imp = newImage("Objects", "8-bit black", 10, 10, 3);
+		stack = imp.getStack()
+		stack.getProcessor(1).set(2, 2, 255)
+		stack.getProcessor(2).set(3, 3, 255)
+		stack.getProcessor(3).set(8, 8, 255)
+		labels, counts, boxes = labelComponents(imp)
+		self.assertEquals(list(counts), [2, 1])
+		self.assertEquals(boxes[0], (2, 2, 0, 2, 2, 2))
+		self.assertEquals(labels.getStackSize(), 3)
+		labels, counts, boxes = labelComponents(imp, 6)
+		self.assertEquals(list(counts), [1, 1, 1])
+
+	def testThresholded(self):
+		imp = newImage("Ramp", "8-bit ramp", 256, 4, 1);
+		imp.getProcessor().setThreshold(10, 19, ImageProcessor.NO_LUT_UPDATE)
+		labels, counts, boxes = labelComponents(imp)
+		self.assertEquals(list(counts), [40])
+		self.assertEquals(boxes[0], (10, 0, 0, 10, 4, 1))
+
 class LengthOfTest(unittest.TestCase):
 	def testArray(self):
 		emptyList = []
@@ -1182,6 +1775,103 @@ class NImagesTest(unittest.TestCase):
 
 		self.assertEqual(nImages(), 3);
 
+class BatchModeTest(unittest.TestCase):
+	def setUp(self):
+		unittest.TestCase.setUp(self)
+		run("Close All");
+
+	def tearDown(self):
+		unittest.TestCase.tearDown(self)
+		setBatchMode(False)
+		run("Close All");
+
+	def testBatchMode(self):
+		newImage("Shown", "8-bit ramp", 64, 64, 1);
+		setBatchMode(True)
+		self.assertTrue(isBatchMode())
+		imp1 = newImage("Hidden1", "8-bit ramp", 64, 64, 1);
+		imp2 = newImage("Hidden2", "8-bit black", 64, 64, 1);
+		self.assertIsNone(imp1.getWindow())
+		self.assertEquals(nImages(), 3)
+		self.assertEquals(getWidth(), 64)
+		self.assertEquals(getPixel(10, 0), 0)
+		selectImage("Hidden1")
+		self.assertEquals(getPixel(10, 0), imp1.getProcessor().get(10, 0))
+		close()
+		self.assertEquals(nImages(), 2)
+		self.assertTrue(Context.current().currentImage() is imp2)
+		setBatchMode(False)
+		self.assertFalse(isBatchMode())
+		self.assertIsNotNone(imp2.getWindow())
+		self.assertEquals(nImages(), 2)
+
+	def testExitAndDisplay(self):
+		setBatchMode(True)
+		imp1 = newImage("Hidden1", "8-bit ramp", 64, 64, 1);
+		imp2 = newImage("Hidden2", "8-bit ramp", 64, 64, 1);
+		selectImage(imp1)
+		run("Invert")
+		self.assertEquals(imp1.getProcessor().get(0, 0), 255)
+		self.assertEquals(imp2.getProcessor().get(0, 0), 0)
+		setBatchMode("exit and display")
+		self.assertEquals(nImages(), 2)
+		self.assertEquals(len(Context.current().images), 0)
+
+	def testRunCreatesImage(self):
+		setBatchMode(True)
+		imp = newImage("Hidden", "8-bit ramp", 64, 64, 1);
+		run("Scale...", "x=2 y=2 width=128 height=128 interpolation=None create title=Scaled");
+		self.assertEquals(Context.current().currentImage().getTitle(), "Scaled")
+		self.assertEquals(getWidth(), 128)
+		self.assertIsNone(Context.current().currentImage().getWindow())
+		self.assertEquals(nImages(), 2)
+		self.assertTrue(imp in Context.current().images)
+
+	def testImageJBatchMode(self):
+		setBatchMode(True)
+		self.assertTrue(Interpreter.isBatchMode())
+		setBatchMode(False)
+		self.assertFalse(Interpreter.isBatchMode())
+
+class ContextTest(unittest.TestCase):
+	def tearDown(self):
+		unittest.TestCase.tearDown(self)
+		run("Close All");
+
+	def testSettingsPerContext(self):
+		Settings.GLOBAL_COLOR = None
+		with Context() as context:
+			Settings.GLOBAL_COLOR = Color.red
+			Fit.logFitResults = True
+			self.assertEquals(context.GLOBAL_COLOR, Color.red)
+			self.assertEquals(Parallel.map(lambda i: Settings.GLOBAL_COLOR, range(4), 2), [Color.red] * 4)
+		self.assertIsNone(Settings.GLOBAL_COLOR)
+		self.assertFalse(Fit.logFitResults)
+		self.assertTrue(Context.current() is Context.DEFAULT)
+
+	def testCurrentImagePerThread(self):
+		results = {}
+		def work(name):
+			with Context():
+				newImage(name, "8-bit black", 16 * len(name), 16, 1);
+				time.sleep(0.2)
+				results[name] = getWidth()
+		threads = [Thread(lambda name=name: work(name)) for name in ("a", "bb", "ccc")]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEquals(results, {"a": 16, "bb": 32, "ccc": 48})
+
+	def testImagesPerContext(self):
+		newImage("Default", "8-bit black", 16, 16, 1);
+		with Context():
+			newImage("Own", "8-bit black", 16, 16, 1);
+			self.assertEquals(nImages(), 1)
+			self.assertEquals(close("*"), 1)
+		self.assertEquals(nImages(), 1)
+		self.assertEquals(IJ.getImage().getTitle(), "Default")
+
 class NResultsTest(unittest.TestCase):
 	def setUp(self):
 		unittest.TestCase.setUp(self)
@@ -1247,7 +1937,49 @@ class RoiManagerTest(unittest.TestCase):
 		roiManager("select", [1,2])
 		roiManager("delete")
 		self.assertEquals(roiManager("count"), 2)
+		roiManager("delete")
+		self.assertEquals(roiManager("count"), 0)
+
+	def testRoiManagerRename(self):
+		IJ.makeRectangle(10, 10, 10, 10)
+		roiManager("add");
+		roiManager("select", 0);
+		roiManager("rename", "cell");
+		self.assertEquals(RoiManager.getRoiManager().getName(0), "cell")
+		self.assertRaises(Exception, roiManager, "select", 1)
 		
+class RoiStoreTest(unittest.TestCase):
+	def testAddAndFind(self):
+		store = RoiStore()
+		rois = [Roi(i, i, 5, 5) for i in range(1000)]
+		names = ["cell-"+str(i) for i in range(1000)]
+		self.assertEquals(store.add(rois, names), 0)
+		self.assertEquals(store.addRoi(Roi(20, 40, 10, 10)), 1000)
+		self.assertEquals(len(store), 1001)
+		self.assertEquals(store.indexOf("cell-17"), 17)
+		self.assertTrue(store.getByName("cell-999") is rois[999])
+		self.assertEquals(store.getName(1000), "0045-0025")
+		self.assertEquals(store.indexOf("unknown"), -1)
+
+	def testDeleteAndRename(self):
+		store = RoiStore([Roi(i, i, 5, 5) for i in range(10)], [str(i) for i in range(10)])
+		self.assertEquals(store.delete(store.indexesOf(["3", "5"])), 2)
+		self.assertEquals(store.count(), 8)
+		self.assertEquals(store.indexOf("6"), 4)
+		store.rename([0, 1], ["a", "b"])
+		self.assertEquals(store.indexOf("b"), 1)
+		self.assertEquals(store.indexOf("1"), -1)
+		store.select([0, 1])
+		self.assertEquals(store.delete(), 2)
+		self.assertEquals(store.delete(), 6)
+		self.assertEquals(len(store), 0)
+
+	def testToRoiManager(self):
+		store = RoiStore([Roi(i, i, 5, 5) for i in range(10)])
+		rm = store.toRoiManager(hidden=True)
+		self.assertEquals(rm.getCount(), 10)
+		self.assertEquals(RoiStore.fromRoiManager(rm).count(), 10)
+
 class RunTest(unittest.TestCase):
 	def setUp(self):
 		unittest.TestCase.setUp(self)
@@ -1274,6 +2006,67 @@ class RunTest(unittest.TestCase):
 		width = getWidth()
 		self.assertEqual(width, 512)												
 
+class CommandsTest(unittest.TestCase):
+	def setUp(self):
+		unittest.TestCase.setUp(self)
+		run("Close All");
+
+	def tearDown(self):
+		unittest.TestCase.tearDown(self)
+		run("Close All");
+
+	def testParseOptions(self):
+		options = Commands.parseOptions("sigma=2 scaled title=[my image]")
+		self.assertEquals(options, {"sigma": "2", "scaled": None, "title": "my image"})
+		self.assertEquals(Commands.parseOptions(None), {})
+
+	def testPlanCache(self):
+		plan = Commands.plan("Gaussian Blur...", "sigma=2")
+		self.assertTrue(plan is Commands.plan("Gaussian Blur...", "sigma=2"))
+		self.assertIsNone(Commands.plan("Invert"))
+		self.assertIsNone(Commands.plan("Gaussian Blur...", "sigma=2 stack"))
+
+	def testSameResultAsIJRun(self):
+		for command, options in (("Gaussian Blur...", "sigma=2"), ("Smooth", None), ("Find Edges", None)):
+			imp1 = IJ.createImage("A", "8-bit ramp", 64, 64, 1)
+			imp2 = IJ.createImage("B", "8-bit ramp", 64, 64, 1)
+			imp1.setRoi(OvalRoi(10, 10, 30, 30))
+			imp2.setRoi(OvalRoi(10, 10, 30, 30))
+			IJ.run(imp1, command, options)
+			self.assertTrue(Commands.plan(command, options)(imp2))
+			self.assertEquals(list(imp1.getProcessor().getPixels()), list(imp2.getProcessor().getPixels()))
+
+	def testDuplicateAndEnlarge(self):
+		newImage("Ramp", "16-bit ramp", 64, 64, 1);
+		IJ.makeRectangle(10, 10, 20, 20)
+		run("Enlarge...", "enlarge=5 pixel");
+		self.assertEquals(getSelectionBounds(), (5, 5, 30, 30))
+		run("Duplicate...", "title=copy");
+		self.assertEquals(IJ.getImage().getTitle(), "copy")
+		self.assertEquals(getWidth(), 30)
+		run("8-bit");
+		self.assertEquals(bitDepth(), 8)
+		IJ.makeRectangle(0, 0, 10, 10)
+		IJ.setBackgroundColor(0, 0, 0)
+		run("Clear Outside");
+		self.assertEquals(getPixel(20, 20), 0)
+		self.assertNotEquals(getPixel(5, 5), 0)
+
+	def testDuplicateIgnoreAndClearOutsideColor(self):
+		imp = IJ.createImage("Ramp", "8-bit ramp", 64, 64, 1)
+		imp.setRoi(Roi(10, 10, 20, 20))
+		try:
+			self.assertTrue(Commands.plan("Duplicate...", "title=copy ignore")(imp))
+			copy = WindowManager.getImage("copy")
+			self.assertEquals(copy.getWidth(), 64)
+			self.assertEquals(imp.getRoi().getBounds().width, 20)
+			imp.getProcessor().setValue(7)
+			self.assertTrue(Commands.plan("Clear Outside")(imp))
+			self.assertEquals(imp.getProcessor().getForegroundValue(), 7)
+		finally:
+			close("copy")
+			imp.close()
+
 class ThresholdTest(unittest.TestCase):
 	def setUp(self):
 		unittest.TestCase.setUp(self)
@@ -1290,6 +2083,18 @@ class ThresholdTest(unittest.TestCase):
 		self.assertEqual(lower, 0)
 		self.assertEqual(upper, 127)
 
+class ImportTest(unittest.TestCase):
+
+	def testLazyImports(self):
+		module = sys.modules['mripy.ijmpy']
+		for name in ('urllib2', 'subprocess', 'tokenize', 'shutil', 'inspect'):
+			self.assertTrue(isinstance(vars(module)[name], LazyModule), name + ' is imported with ijmpy')
+		self.assertTrue(callable(shutil.copyfile))
+
+	def testExports(self):
+		for name in ('RoiManager', 'ResultsTable', 'GenericDialog', 'Fitter', 'CurveFitter', 'FHT', 'MaximumFinder', 'bisect', 'random'):
+			self.assertTrue(name in globals(), name + ' is not exported by ijmpy')
+
 def suite():
 	suite = unittest.TestSuite()
 
@@ -1308,14 +2113,21 @@ def suite():
 	suite.addTest(ArrayTest('testFill'))
 	suite.addTest(ArrayTest('testFindMaxima'))
 	suite.addTest(ArrayTest('testFindMinima'))
+	suite.addTest(ArrayTest('testFindMaximaOfProfiles'))
+	suite.addTest(ArrayTest('testFindMaximaOfRows'))
 	suite.addTest(ArrayTest('testFourier'))
+	suite.addTest(ArrayTest('testFourierOfArrays'))
 	suite.addTest(ArrayTest('testGetSequence'))
 	suite.addTest(ArrayTest('testGetStatistics'))
 	suite.addTest(ArrayTest('testPrint'))
 	suite.addTest(ArrayTest('testRankPositionsInt'))
 	suite.addTest(ArrayTest('testRankPositionsString'))
+	suite.addTest(ArrayTest('testRankPositionsK'))
+	suite.addTest(ArrayTest('testTopK'))
 	suite.addTest(ArrayTest('testResampleBigger'))
 	suite.addTest(ArrayTest('testResampleSmaller'))
+	suite.addTest(ArrayTest('testResampleArrays'))
+	suite.addTest(ArrayTest('testResampleContours'))
 	suite.addTest(ArrayTest('testReverse'))
 	suite.addTest(ArrayTest('testShowOneArray'))
 	suite.addTest(ArrayTest('testShowTwoArrays'))
@@ -1324,20 +2136,47 @@ def suite():
 	suite.addTest(ArrayTest('testShowTwoArraysWithIndexes'))
 	suite.addTest(ArrayTest('testShowTwoArraysWithRowNumbers'))
 	suite.addTest(ArrayTest('testShowArrayResults'))
+	suite.addTest(ArrayTest('testShowVirtual'))
 	suite.addTest(ArrayTest('testSlice'))
 	suite.addTest(ArrayTest('testSort'))
 	suite.addTest(ArrayTest('testTrim'))
 	suite.addTest(ArrayTest('testRotate'))
 	suite.addTest(ArrayTest('testGetVertexAngles'))
+	suite.addTest(ArrayTest('testGetVertexAnglesOfContours'))
+	suite.addTest(ArrayTest('testViewCopyOnWrite'))
+	suite.addTest(ArrayTest('testViewChain'))
+	suite.addTest(ArrayTest('testViewsAreIndependent'))
+	suite.addTest(ArrayTest('testViewToJava'))
+	suite.addTest(ArrayTest('testAsPrimitive'))
+	suite.addTest(ArrayTest('testToList'))
+	suite.addTest(ArrayTest('testPrimitiveChain'))
+
+	suite.addTest(StatisticsAccumulatorTest('testOffsetData'))
+	suite.addTest(StatisticsAccumulatorTest('testMerge'))
+	suite.addTest(StatisticsAccumulatorTest('testMergeWithoutValues'))
+	suite.addTest(StatisticsAccumulatorTest('testPercentile'))
+	suite.addTest(StatisticsAccumulatorTest('testUnsignedPixels'))
 
 	suite.addTest(AutoUpdateTest('testAutoUpdate'))
 
 	suite.addTest(BeepTest('testBeep'))
 
+	suite.addTest(ImageHandleTest('testGetPixel'))
+	suite.addTest(ImageHandleTest('testActivate'))
+	suite.addTest(ImageHandleTest('testGetAndSetPixels'))
+	suite.addTest(ImageHandleTest('testRGB'))
+	suite.addTest(ImageHandleTest('testSample'))
+	suite.addTest(ImageHandleTest('testSampleLine'))
+	suite.addTest(ImageHandleTest('testSampleRGB'))
+	suite.addTest(ImageHandleTest('testSampleStack'))
+
 	suite.addTest(ChangeValuesTest('test8BitWithoutRoi'))
+	suite.addTest(ChangeValuesTest('test8BitWithNaNBound'))
 	suite.addTest(ChangeValuesTest('test8BitWithRoi'))
 	suite.addTest(ChangeValuesTest('test16Bit'))
 	suite.addTest(ChangeValuesTest('test32Bit'))
+	suite.addTest(ChangeValuesTest('testStack'))
+	suite.addTest(ChangeValuesTest('testNaN'))
 	
 	suite.addTest(BitDepthTest('testBitDepth8'))
 	suite.addTest(BitDepthTest('testBitDepth16'))
@@ -1349,13 +2188,26 @@ def suite():
 
 	suite.addTest(CallTest('testNoParameter'))
 	suite.addTest(CallTest('testWithParameter'))
+	suite.addTest(CallTest('testNumberParameter'))
+	suite.addTest(CallTest('testNoStringMethod'))
+	suite.addTest(CallTest('testCached'))
+	suite.addTest(CallTest('testCallAll'))
+
+	suite.addTest(PlanesTest('testSelect'))
+	suite.addTest(PlanesTest('testFillRect'))
+	suite.addTest(PlanesTest('testFloodFill'))
+	suite.addTest(PlanesTest('testChangeValues'))
 
 	suite.addTest(CharCodeAtTest('testCharCodeAt'))
 	
 	suite.addTest(CloseTest('testCloseNoParameter'))
 	suite.addTest(CloseTest('testCloseWithParameter'))
+	suite.addTest(CloseTest('testCloseOthers'))
+	suite.addTest(CloseTest('testClosePatternKeep'))
 
 	suite.addTest(D2STest('testD2S'))
+
+	suite.addTest(ToStringTest('testToString'))
 	suite.addTest(DoCommandTest('testDoCommand'))
 	suite.addTest(DoWandTest('testDoWand'))
 
@@ -1363,6 +2215,16 @@ def suite():
 	suite.addTest(DrawTest('testDrawOval'))
 	suite.addTest(DrawTest('testDrawRect'))
 	suite.addTest(DrawTest('testDrawString'))
+	suite.addTest(DrawTest('testDrawBatch'))
+	suite.addTest(DrawTest('testDrawBatchFlush'))
+	suite.addTest(DrawTest('testDrawBatchColors'))
+	suite.addTest(DrawTest('testUpdateDisplay'))
+
+	suite.addTest(OverlayTest('testDraw'))
+	suite.addTest(OverlayTest('testAddBulk'))
+	suite.addTest(OverlayTest('testCull'))
+	suite.addTest(OverlayTest('testCullSimplify'))
+	suite.addTest(OverlayTest('testCullUpdates'))
 
 	suite.addTest(EndsWithTest('testEndsWith'))
 
@@ -1404,6 +2266,7 @@ def suite():
 	suite.addTest(FileTest('testSeparator'))
 
 	suite.addTest(FillTest('testFill'))
+	suite.addTest(FillTest('testFillStackLine'))
 	suite.addTest(FillTest('testFillOval'))
 	suite.addTest(FillTest('testFillRect'))
 
@@ -1426,9 +2289,14 @@ def suite():
 	
 	suite.addTest(GetPixelTest('testGetPixelGrey'))
 	suite.addTest(GetPixelTest('testGetPixelGreyFloatCoords'))
+	suite.addTest(GetPixelTest('testGetPixelCalibratedFloatCoords'))
 	suite.addTest(GetPixelTest('testGetPixelGrey16Bit'))
 	suite.addTest(GetPixelTest('testGetPixelColor'))
 
+	suite.addTest(LabelComponentsTest('testLabel2D'))
+	suite.addTest(LabelComponentsTest('testLabel3D'))
+	suite.addTest(LabelComponentsTest('testThresholded'))
+
 	suite.addTest(LengthOfTest('testArray'))
 	suite.addTest(LengthOfTest('testString'))
 
@@ -1439,11 +2307,26 @@ def suite():
 	suite.addTest(NewImageTest('testNewHyperstack'))
 
 	suite.addTest(NImagesTest('testNImages'))
+
+	suite.addTest(BatchModeTest('testBatchMode'))
+	suite.addTest(BatchModeTest('testExitAndDisplay'))
+	suite.addTest(BatchModeTest('testRunCreatesImage'))
+	suite.addTest(BatchModeTest('testImageJBatchMode'))
+
+	suite.addTest(ContextTest('testSettingsPerContext'))
+	suite.addTest(ContextTest('testCurrentImagePerThread'))
+	suite.addTest(ContextTest('testImagesPerContext'))
+
 	suite.addTest(NResultsTest('testNResults'))
 	suite.addTest(RoiManagerTest('testRoiManagerAnd'))
 	suite.addTest(RoiManagerTest('testRoiManagerAdd'))
 	suite.addTest(RoiManagerTest('testRoiManagerSelectOneRoi'))
 	suite.addTest(RoiManagerTest('testRoiManagerSelectMultipleRois'))
+	suite.addTest(RoiManagerTest('testRoiManagerRename'))
+
+	suite.addTest(RoiStoreTest('testAddAndFind'))
+	suite.addTest(RoiStoreTest('testDeleteAndRename'))
+	suite.addTest(RoiStoreTest('testToRoiManager'))
 
 	suite.addTest(RunTest('testRunNoParameter'))
 	suite.addTest(RunTest('testRunWithParameterString'))
@@ -1452,7 +2335,16 @@ def suite():
 	suite.addTest(GetSelectionBoundsTest('testGetSelectionBoundsWithRoi'))
 	suite.addTest(GetSelectionBoundsTest('testGetBoundingRect'))
 
+	suite.addTest(CommandsTest('testParseOptions'))
+	suite.addTest(CommandsTest('testPlanCache'))
+	suite.addTest(CommandsTest('testSameResultAsIJRun'))
+	suite.addTest(CommandsTest('testDuplicateAndEnlarge'))
+	suite.addTest(CommandsTest('testDuplicateIgnoreAndClearOutsideColor'))
+
 	suite.addTest(ThresholdTest('testSetAutoThreshold'))
+
+	suite.addTest(ImportTest('testLazyImports'))
+	suite.addTest(ImportTest('testExports'))
 	return suite
 
 runner = unittest.TextTestRunner(sys.stdout, verbosity=1)
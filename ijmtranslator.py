@@ -0,0 +1,919 @@
+'''
+ijmtranslator translates ij-macro code (.ijm) into ijmpy python code
+
+ijmpy allows to run most macro code in python with little modifications. The
+modifications that remain are mechanical and are done by the translator:
+
+	* blocks in curly brackets are replaced by indentation
+	* if, else if, else, while, do-while and for loops are translated into their python equivalent
+	* functions are translated into python functions, variables declared with var at the top-level are declared global in functions that assign them
+	* true, false, &&, || and ! become True, False, and, or and not
+	* i++ and i-- become i += 1 and i -= 1
+	* a.length becomes lengthOf(a)
+	* i++ and i-- inside a statement, as in b = a[i++], are moved before or after the statement
+	* conditional expressions c ? a : b become a if c else b
+	* numbers concatenated to strings are converted with toString(), which formats them as the macro language does
+	* built-in functions called without parentheses (nImages, getWidth, exit, ...) are called with parentheses
+	* built-in functions without arguments that ijmpy does not implement (getTitle, nSlices, ...) are run by
+	  the macro interpreter with eval()
+	* output parameters become tuple returns, for example:
+
+		getDimensions(width, height, channels, slices, frames);
+
+	  becomes
+
+		width, height, channels, slices, frames = getDimensions()
+
+Example:
+
+	from mripy.ijmtranslator import runFile
+	runFile("/home/user/macros/count_nuclei.ijm")
+
+The translation of a file is written next to it, for example count_nuclei_ijm.py for
+count_nuclei.ijm. It contains the sha1 of the macro source and is only recreated when the
+macro has changed, so that a macro is only translated once and then runs as compiled jython
+code instead of being interpreted by the macro engine on each call. runFile keeps the compiled
+translation of each version of a macro in memory.
+
+Known limitations
+=================
+
+A for loop that can not be translated into a for loop over a range is translated into a
+while loop, in which a continue statement skips the increment. The loop variable of a loop
+over a range does not have the value of the end condition after the loop, as in the macro language.
+
+The functions evaluated with eval() work on the active image of ImageJ and not on the current image of
+an ijmpy batch mode or context. Built-in functions with output parameters that ijmpy does not implement
+(getStatistics, getHistogram, ...) and the Stack and List functions can not be translated, the translator
+raises an exception that names the function and the line of the macro. So does an increment within a
+condition, like while (a[i++] > 0).
+'''
+from __future__ import print_function, division
+import hashlib, os, re, tempfile
+
+VERSION = '3'
+MAX_CACHED_CODES = 64
+__codes = {}
+
+def translate(source):
+	'''
+	Translate the ij-macro code source into ijmpy python code and return the python code as a string.
+	'''
+	return Translator().translate(source)
+
+def translateFile(path):
+	'''
+	Translate the ij-macro file at path and return the path of the python file containing the translation.
+
+	The translation is written next to the macro file, as <name>_ijm.py. If the folder of the macro is not
+	writable it is written into the temp-folder. An existing translation is only reused when the sha1 of the
+	macro source, which is written into its first line, is the sha1 of the current source.
+	'''
+	with open(path) as macroFile:
+		source = macroFile.read()
+	digest = __digest(source)
+	header = '# translated from ' + os.path.basename(path) + ' by ijmtranslator, sha1 ' + digest + '\n'
+	folder, name = os.path.split(os.path.abspath(path))
+	name = os.path.splitext(name)[0] + '_ijm.py'
+	for candidate in (os.path.join(folder, name), os.path.join(tempfile.gettempdir(), digest + '_' + name)):
+		if __isTranslation(candidate, header):
+			return candidate
+	code = header + '# -*- coding: utf-8 -*-\n' + translate(source)
+	for candidate in (os.path.join(folder, name), os.path.join(tempfile.gettempdir(), digest + '_' + name)):
+		try:
+			with open(candidate, 'w') as pythonFile:
+				pythonFile.write(code)
+			return candidate
+		except (IOError, OSError):
+			pass
+	raise Exception('Could not write the translation of ' + path)
+
+def runFile(path, namespace=None):
+	'''
+	Translate the ij-macro file at path, if it has not already been translated, and run the translation.
+
+	The translation is run in namespace, a dictionary, which is returned. Variables set by the macro can
+	be read from it. The compiled translation is kept in memory, with the sha1 of the macro source as key,
+	so that later calls only read the macro file.
+	'''
+	if namespace is None:
+		namespace = {'__name__' : '__main__'}
+	with open(path) as macroFile:
+		digest = __digest(macroFile.read())
+	code = __codes.get(digest)
+	if code is None:
+		pythonPath = translateFile(path)
+		with open(pythonPath) as pythonFile:
+			code = compile(pythonFile.read(), pythonPath, 'exec')
+		if len(__codes) >= MAX_CACHED_CODES:
+			__codes.clear()
+		__codes[digest] = code
+	exec(code, namespace)
+	return namespace
+
+def __digest(source):
+	return hashlib.sha1(VERSION + '\n' + source).hexdigest()
+
+def __isTranslation(path, header):
+	if not os.path.isfile(path):
+		return False
+	with open(path) as pythonFile:
+		return pythonFile.readline() == header
+
+class Translator(object):
+	'''
+	Translates the ij-macro code into ijmpy python code.
+
+	The source is split into tokens. The statements are translated one by one, the expressions in the
+	statements are translated by rewriting their tokens.
+	'''
+	TOKEN_PATTERN = re.compile(r'''
+		(?P<comment>//[^\n]*|/\*.*?\*/)
+		|(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+		|(?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+		|(?P<name>[A-Za-z_][A-Za-z_0-9]*)
+		|(?P<op>\+\+|--|&&|\|\||==|!=|<=|>=|\+=|-=|\*=|/=|>>>|<<|>>|[-+*/%=<>!~^&|?:;,.(){}\[\]])
+		|(?P<space>\s+)
+		''', re.S | re.X)
+
+	HEADER = 'from __future__ import print_function, division\nfrom mripy.ijmpy import *\n'
+
+	'''
+	Functions with output parameters implemented by ijmpy. The values are the index of the first output
+	parameter and the number of output parameters, None meaning all remaining parameters.
+	'''
+	OUTPUT_PARAMETERS = {
+		'getBoundingRect' : (0, None),
+		'getCursorLoc' : (0, None),
+		'getDateAndTime' : (0, None),
+		'getDimensions' : (0, None),
+		'getSelectionBounds' : (0, None),
+		'getThreshold' : (0, None),
+		'Array.getStatistics' : (1, None),
+		'Fit.getEquation' : (1, None),
+	}
+
+	'''
+	Built-in functions with output parameters and built-in classes that ijmpy does not implement.
+	Their calls can not be translated.
+	'''
+	UNSUPPORTED_FUNCTIONS = set(('getHistogram', 'getLine', 'getLut', 'getMinAndMax', 'getPixelSize', 'getRawStatistics',
+		'getSelectionCoordinates', 'getStatistics', 'getVoxelSize'))
+	UNSUPPORTED_CLASSES = set(('List', 'Stack'))
+
+	'''
+	Built-in functions implemented by ijmpy that can be called without parentheses in the macro language.
+	'''
+	NO_ARGUMENT_FUNCTIONS = set(('bitDepth', 'exit', 'getWidth', 'nImages', 'nResults', 'updateDisplay'))
+
+	'''
+	Built-in functions without arguments that ijmpy does not implement. They are run by the macro interpreter
+	with eval(). The values are the macro code and the conversion of the returned string, None for functions
+	that answer strings or nothing.
+	'''
+	MACRO_FUNCTIONS = {
+		'getHeight' : ('return getHeight;', 'int'),
+		'getImageID' : ('return getImageID;', 'int'),
+		'getSliceNumber' : ('return getSliceNumber;', 'int'),
+		'getTime' : ('return d2s(getTime, 0);', 'float'),
+		'getTitle' : ('return getTitle;', None),
+		'getZoom' : ('return d2s(getZoom, 9);', 'float'),
+		'nSlices' : ('return nSlices;', 'int'),
+		'random' : ('return d2s(random, 9);', 'float'),
+		'resetMinAndMax' : ('resetMinAndMax;', None),
+		'resetThreshold' : ('resetThreshold;', None),
+		'selectionType' : ('return selectionType;', 'int'),
+		'updateResults' : ('updateResults;', None),
+	}
+
+	'''
+	Built-in functions that answer integers. Loops with bounds made of integers and calls of these
+	functions are translated into loops over a range.
+	'''
+	INTEGER_FUNCTIONS = set(('bitDepth', 'getHeight', 'getSliceNumber', 'getWidth', 'lengthOf', 'nImages', 'nResults',
+		'nSlices', 'roiManager'))
+
+	KEYWORDS = {'true' : 'True', 'false' : 'False', '&&' : 'and', '||' : 'or', '!' : 'not'}
+
+	'''
+	Operators that bind less than +. Expressions are split at these operators before numbers
+	added to strings are converted with toString().
+	'''
+	LOW_PRECEDENCE = set(('==', '!=', '<', '>', '<=', '>=', '&&', '||', '!', '=', '+=', '-=', '*=', '/=', '?', ':', ',', '&', '|', '^'))
+
+	ASSIGNMENTS = set(('=', '+=', '-=', '*=', '/='))
+
+	def translate(self, source):
+		numberedTokens = self.numberedTokens(source)
+		self.tokens = [token for line, token in numberedTokens]
+		self.tokenLines = [line for line, token in numberedTokens]
+		self.statementPosition = 0
+		self.functionNames = self.__functionNames()
+		self.position = 0
+		self.lines = []
+		self.functionLines = []
+		self.globalNames = self.__globalNames()
+		self.assignedNames = None
+		self.localNames = None
+		self.continueStatement = None
+		while not self.atEnd():
+			self.__statement(0)
+		return self.HEADER + '\n' + '\n'.join(self.functionLines + self.lines) + '\n'
+
+	@classmethod
+	def tokenize(cls, source):
+		'''
+		Answer the tokens of the source as a list of tuples (kind, text). Kind is one of comment, string, number, name and op.
+		'''
+		return [token for line, token in cls.numberedTokens(source)]
+
+	@classmethod
+	def numberedTokens(cls, source):
+		'''
+		Answer the tokens of the source as a list of tuples (line, (kind, text)), line being the line of the source
+		in which the token starts.
+		'''
+		tokens = []
+		position = 0
+		line = 1
+		while position < len(source):
+			match = cls.TOKEN_PATTERN.match(source, position)
+			if not match:
+				raise Exception('Unexpected character ' + source[position] + ' in line ' + str(line))
+			position = match.end()
+			if match.lastgroup != 'space':
+				tokens.append((line, (match.lastgroup, match.group())))
+			line = line + match.group().count('\n')
+		return tokens
+
+	def error(self, message):
+		'''
+		Raise an exception with the message and the line of the statement that is translated.
+		'''
+		line = self.tokenLines[min(self.statementPosition, len(self.tokenLines) - 1)] if self.tokenLines else 1
+		raise Exception(message + ' in line ' + str(line))
+
+	def __functionNames(self):
+		'''
+		Answer the names of the functions defined in the macro. They are not replaced by built-in functions.
+		'''
+		return set(self.tokens[index + 1][1] for index, token in enumerate(self.tokens[:-1]) if token == ('name', 'function'))
+
+	def __globalNames(self):
+		'''
+		Answer the names declared with var outside of functions and macros.
+		'''
+		names = set()
+		depth = 0
+		for index, (kind, text) in enumerate(self.tokens):
+			if kind == 'op' and text == '{':
+				depth = depth + 1
+			elif kind == 'op' and text == '}':
+				depth = depth - 1
+			elif depth == 0 and kind == 'name' and text == 'var':
+				for declaration in self.__split(self.__statementTokens(index + 1), ','):
+					names.add(declaration[0][1])
+		return names
+
+	def __statementTokens(self, index):
+		tokens = []
+		depth = 0
+		for kind, text in self.tokens[index:]:
+			if kind == 'op' and text in ('(', '['):
+				depth = depth + 1
+			if kind == 'op' and text in (')', ']'):
+				depth = depth - 1
+			if kind == 'op' and depth == 0 and text in (';', '}'):
+				break
+			if kind != 'comment':
+				tokens.append((kind, text))
+		return tokens
+
+	def atEnd(self):
+		return self.position >= len(self.tokens)
+
+	def peek(self, offset=0):
+		if self.position + offset >= len(self.tokens):
+			return (None, None)
+		return self.tokens[self.position + offset]
+
+	def next(self):
+		token = self.peek()
+		self.position = self.position + 1
+		return token
+
+	def expect(self, text):
+		kind, found = self.next()
+		if found != text:
+			self.error('Expected ' + text + ' but found ' + str(found))
+
+	def emit(self, indent, code):
+		for line in code.split('\n'):
+			self.lines.append('\t' * indent + line)
+
+	def __statement(self, indent):
+		self.statementPosition = self.position
+		kind, text = self.peek()
+		if kind == 'comment':
+			self.next()
+			self.__comment(indent, text)
+		elif kind == 'op' and text == ';':
+			self.next()
+		elif kind == 'op' and text == '{':
+			self.next()
+			while self.peek()[1] != '}':
+				if self.atEnd():
+					self.error('Missing }')
+				self.__statement(indent)
+			self.next()
+		elif kind == 'name' and text == 'var':
+			self.next()
+			self.__var(indent)
+		elif kind == 'name' and text == 'function':
+			self.next()
+			self.__function(indent)
+		elif kind == 'name' and text == 'macro':
+			self.next()
+			kind, name = self.next()
+			self.emit(indent, '# macro ' + name)
+			self.__statement(indent)
+		elif kind == 'name' and text == 'if':
+			self.next()
+			self.__if(indent)
+		elif kind == 'name' and text == 'while':
+			self.next()
+			self.emit(indent, 'while ' + self.__expression(self.__parenthesized()) + ':')
+			self.__loopBody(indent + 1, None)
+		elif kind == 'name' and text == 'do':
+			self.next()
+			self.__doWhile(indent)
+		elif kind == 'name' and text == 'for':
+			self.next()
+			self.__for(indent)
+		elif kind == 'name' and text == 'return':
+			self.next()
+			tokens = self.__tokensUntil((';', '}'))
+			self.emit(indent, ('return ' + self.__expression(tokens)).rstrip())
+		elif kind == 'name' and text in ('break', 'continue'):
+			self.next()
+			if text == 'continue' and self.continueStatement:
+				self.emit(indent, self.continueStatement)
+			self.emit(indent, text)
+			self.__tokensUntil((';', '}'))
+		elif kind == 'op' and text == '}':
+			self.error('Unexpected }')
+		else:
+			self.emit(indent, self.__simpleStatement(self.__tokensUntil((';', '}'))))
+
+	def __comment(self, indent, text):
+		if text.startswith('//'):
+			self.emit(indent, ('# ' + text[2:].strip()).rstrip())
+			return
+		for line in text[2:-2].strip().split('\n'):
+			self.emit(indent, ('# ' + line.strip().lstrip('*').strip()).rstrip())
+
+	def __body(self, indent):
+		count = len(self.lines)
+		self.__statement(indent)
+		if all(line.strip().startswith('#') for line in self.lines[count:]):
+			self.emit(indent, 'pass')
+
+	def __loopBody(self, indent, continueStatement):
+		outerContinueStatement = self.continueStatement
+		self.continueStatement = continueStatement
+		self.__body(indent)
+		self.continueStatement = outerContinueStatement
+
+	def __var(self, indent):
+		for declaration in self.__split(self.__tokensUntil((';', '}')), ','):
+			if self.localNames is not None:
+				self.localNames.add(declaration[0][1])
+			if len(declaration) == 1:
+				declaration = declaration + [('op', '='), ('name', 'None')]
+			self.emit(indent, self.__simpleStatement(declaration))
+
+	def __function(self, indent):
+		'''
+		Functions can be called before they are defined in the macro language. The functions defined
+		at the top-level are therefore written before the other code.
+		'''
+		kind, name = self.next()
+		parameters = [parameter[0][1] for parameter in self.__split(self.__parenthesized(), ',')]
+		outer = (self.lines, self.assignedNames, self.localNames, self.continueStatement)
+		if self.assignedNames is None:
+			self.lines = []
+		self.emit(indent, 'def ' + name + '(' + ', '.join(parameters) + '):')
+		self.assignedNames = set()
+		self.localNames = set(parameters)
+		self.continueStatement = None
+		start = len(self.lines)
+		self.__body(indent + 1)
+		names = sorted(self.assignedNames.intersection(self.globalNames).difference(self.localNames))
+		if names:
+			self.lines.insert(start, '\t' * (indent + 1) + 'global ' + ', '.join(names))
+		if outer[1] is None:
+			self.functionLines.extend(self.lines + [''])
+		self.lines, self.assignedNames, self.localNames, self.continueStatement = outer
+
+	def __if(self, indent):
+		self.emit(indent, 'if ' + self.__expression(self.__parenthesized()) + ':')
+		self.__body(indent + 1)
+		while self.__peekElse():
+			while self.peek()[0] == 'comment':
+				self.__comment(indent + 1, self.next()[1])
+			self.next()
+			if self.peek()[1] == 'if':
+				self.next()
+				self.emit(indent, 'elif ' + self.__expression(self.__parenthesized()) + ':')
+			else:
+				self.emit(indent, 'else:')
+			self.__body(indent + 1)
+
+	def __peekElse(self):
+		offset = 0
+		while self.peek(offset)[0] == 'comment':
+			offset = offset + 1
+		return self.peek(offset)[1] == 'else'
+
+	def __doWhile(self, indent):
+		self.emit(indent, 'while True:')
+		self.__loopBody(indent + 1, None)
+		self.expect('while')
+		condition = self.__expression(self.__parenthesized())
+		self.emit(indent + 1, 'if not (' + condition + '):')
+		self.emit(indent + 2, 'break')
+
+	def __for(self, indent):
+		self.expect('(')
+		initialization = self.__tokensUntil((';',))
+		condition = self.__tokensUntil((';',))
+		increment = self.__tokensUntil((')',))
+		loop = self.__range(initialization, condition, increment)
+		if loop:
+			start, count = self.position, len(self.lines)
+			self.__assigned([('name', initialization[0][1]), ('op', '=')])
+			self.emit(indent, loop)
+			self.__loopBody(indent + 1, None)
+			if not self.__writes(self.tokens[start:self.position], set([initialization[0][1]] + [text for kind, text in condition[2:] if kind == 'name'])):
+				return
+			self.position = start
+			del self.lines[count:]
+		if initialization:
+			self.emit(indent, self.__simpleStatement(initialization))
+		self.emit(indent, 'while ' + (self.__expression(condition) or 'True') + ':')
+		if not increment:
+			self.__loopBody(indent + 1, None)
+			return
+		increment = self.__simpleStatement(increment)
+		self.__loopBody(indent + 1, increment)
+		self.emit(indent + 1, increment)
+
+	def __range(self, initialization, condition, increment):
+		'''
+		Answer a python for loop over a range for the loops of the form for (i=a; i<b; i++) with integer bounds,
+		answer None for all other loops. Bounds that might not be integers, like variables, can not be
+		used with a range.
+		'''
+		if len(initialization) < 3 or len(condition) < 3 or initialization[1][1] != '=':
+			return None
+		variable = initialization[0][1]
+		if initialization[0][0] != 'name' or condition[0][1] != variable or condition[1][1] not in ('<', '<=', '>', '>='):
+			return None
+		texts = [text for kind, text in increment]
+		if texts in ([variable, '++'], ['++', variable]):
+			step = 1
+		elif texts in ([variable, '--'], ['--', variable]):
+			step = -1
+		elif len(texts) == 3 and texts[0] == variable and texts[1] in ('+=', '-=') and re.match(r'^\d+$', texts[2]):
+			step = int(texts[2]) * (1 if texts[1] == '+=' else -1)
+		else:
+			return None
+		operator = condition[1][1]
+		if (step > 0) != (operator in ('<', '<=')):
+			return None
+		if not self.__isInteger(initialization[2:]) or not self.__isInteger(condition[2:]):
+			return None
+		start = self.__expression(initialization[2:])
+		stop = self.__expression(condition[2:])
+		if operator == '<=':
+			stop = stop + ' + 1'
+		elif operator == '>=':
+			stop = stop + ' - 1'
+		if step == 1:
+			return 'for ' + variable + ' in range(' + start + ', ' + stop + '):'
+		return 'for ' + variable + ' in range(' + start + ', ' + stop + ', ' + str(step) + '):'
+
+	def __writes(self, tokens, names):
+		'''
+		Answer True if the tokens assign, increment or decrement one of the names. A loop over a range
+		can not be used if the body changes the loop variable or a variable the end condition reads.
+		'''
+		for index, (kind, text) in enumerate(tokens):
+			if kind != 'name' or text not in names or index > 0 and tokens[index - 1][1] == '.':
+				continue
+			if self.__nextText(tokens, index) in self.ASSIGNMENTS or self.__nextText(tokens, index) in ('++', '--'):
+				return True
+			if index > 0 and tokens[index - 1][1] in ('++', '--'):
+				return True
+		return False
+
+	def __isInteger(self, tokens):
+		tokens = self.__length(tokens)
+		index = 0
+		while index < len(tokens):
+			kind, text = tokens[index]
+			if kind == 'name' and text in self.INTEGER_FUNCTIONS:
+				if self.__nextText(tokens, index) == '(':
+					index = self.__matching(tokens, index + 1)
+			elif not (kind == 'number' and re.match(r'^\d+$', text) or kind == 'op' and text in ('+', '-', '*', '(', ')')):
+				return False
+			index = index + 1
+		return True
+
+	def __parenthesized(self):
+		self.expect('(')
+		return self.__tokensUntil((')',))
+
+	def __tokensUntil(self, ends):
+		'''
+		Answer the tokens up to the first of the ends outside of brackets and consume the end,
+		unless it is a }. Comments are dropped.
+		'''
+		tokens = []
+		depth = 0
+		while not self.atEnd():
+			kind, text = self.peek()
+			if kind == 'op' and depth == 0 and text in ends:
+				if text != '}':
+					self.next()
+				return tokens
+			self.next()
+			if kind == 'comment':
+				continue
+			if kind == 'op' and text in ('(', '['):
+				depth = depth + 1
+			if kind == 'op' and text in (')', ']'):
+				depth = depth - 1
+			tokens.append((kind, text))
+		return tokens
+
+	def __simpleStatement(self, tokens):
+		texts = [text for kind, text in tokens]
+		if len(tokens) >= 2 and texts[-1] in ('++', '--'):
+			self.__assigned(tokens[:-1] + [('op', '=')])
+			return self.__expression(tokens[:-1]) + (' += 1' if texts[-1] == '++' else ' -= 1')
+		if len(tokens) >= 2 and texts[0] in ('++', '--'):
+			self.__assigned(tokens[1:] + [('op', '=')])
+			return self.__expression(tokens[1:]) + (' += 1' if texts[0] == '++' else ' -= 1')
+		before, tokens, after = self.__increments(tokens)
+		self.__assigned(tokens)
+		outputs = self.__outputParameters(tokens)
+		return '\n'.join(before + [outputs or self.__expression(tokens)] + after)
+
+	def __increments(self, tokens):
+		'''
+		Move the increments and decrements of variables within a statement, as in b = a[i++], out of it.
+		Answer the statements to run before the statement, its tokens and the statements to run after it.
+		A variable that is incremented can only be used once in the statement, otherwise the order of
+		the reads and the increments would change.
+		'''
+		before, result, after = [], [], []
+		for index, (kind, text) in enumerate(tokens):
+			if kind != 'op' or text not in ('++', '--'):
+				result.append((kind, text))
+				continue
+			step = ' += 1' if text == '++' else ' -= 1'
+			if result and result[-1][0] == 'name' and (len(result) < 2 or result[-2][1] != '.'):
+				name, statements = result[-1][1], after
+			elif index + 1 < len(tokens) and tokens[index + 1][0] == 'name' and self.__nextText(tokens, index + 1) not in ('.', '(', '['):
+				name, statements = tokens[index + 1][1], before
+			else:
+				self.error(text + ' can only be applied to a variable')
+			self.__assigned([('name', name), ('op', '=')])
+			statements.append(name + step)
+		incremented = [statement.split(' ')[0] for statement in before + after]
+		for name in set(incremented):
+			uses = [index for index, (kind, text) in enumerate(result) if kind == 'name' and text == name and (index == 0 or result[index - 1][1] != '.')]
+			if len(uses) > 1 or incremented.count(name) > 1:
+				self.error('The statement uses ' + name + ' more than once with ++ or -- and can not be translated')
+		return before, result, after
+
+	def __assigned(self, tokens):
+		if self.assignedNames is not None and len(tokens) >= 2 and tokens[0][0] == 'name' and tokens[1][1] in self.ASSIGNMENTS:
+			self.assignedNames.add(tokens[0][1])
+
+	def __outputParameters(self, tokens):
+		'''
+		Answer the call of a function with output parameters as an assignment of the returned tuple,
+		answer None if the statement is not such a call.
+		'''
+		texts = [text for kind, text in tokens]
+		if len(texts) >= 5 and texts[1] == '.':
+			name, bracket = texts[0] + '.' + texts[2], 3
+		elif len(texts) >= 3:
+			name, bracket = texts[0], 1
+		else:
+			return None
+		if name not in self.OUTPUT_PARAMETERS or texts[bracket] != '(' or self.__matching(tokens, bracket) != len(tokens) - 1:
+			return None
+		arguments = self.__split(tokens[bracket + 1:-1], ',')
+		first, count = self.OUTPUT_PARAMETERS[name]
+		last = len(arguments) if count is None else first + count
+		outputs = arguments[first:last]
+		if not outputs:
+			return None
+		for output in outputs:
+			self.__assigned(output + [('op', '=')])
+		inputs = [self.__expression(argument) for argument in arguments[:first] + arguments[last:]]
+		return ', '.join(self.__expression(output) for output in outputs) + ' = ' + name + '(' + ', '.join(inputs) + ')'
+
+	def __matching(self, tokens, index):
+		'''
+		Answer the index of the bracket closing the bracket at index.
+		'''
+		depth = 0
+		for position in range(index, len(tokens)):
+			if tokens[position][1] in ('(', '['):
+				depth = depth + 1
+			if tokens[position][1] in (')', ']'):
+				depth = depth - 1
+				if depth == 0:
+					return position
+		return len(tokens)
+
+	def __split(self, tokens, separator):
+		'''
+		Split the tokens at the separator outside of brackets.
+		'''
+		parts = [[]]
+		depth = 0
+		for kind, text in tokens:
+			if text in ('(', '[') and kind == 'op':
+				depth = depth + 1
+			if text in (')', ']') and kind == 'op':
+				depth = depth - 1
+			if depth == 0 and kind == 'op' and text == separator:
+				parts.append([])
+				continue
+			parts[-1].append((kind, text))
+		if parts == [[]]:
+			return []
+		return parts
+
+	def __expression(self, tokens):
+		for kind, text in tokens:
+			if kind == 'op' and text in ('++', '--'):
+				self.error(text + ' within an expression can not be translated')
+		tokens = self.__length(tokens)
+		tokens = self.__calls(tokens)
+		tokens = self.__conditionals(tokens)
+		tokens = self.__concatenations(tokens)
+		return self.__join(tokens)
+
+	def __length(self, tokens):
+		'''
+		Replace a.length by lengthOf(a).
+		'''
+		result = []
+		for index, (kind, text) in enumerate(tokens):
+			if kind == 'name' and text == 'length' and result and result[-1][1] == '.' and self.__nextText(tokens, index) != '(':
+				result.pop()
+				start = self.__primaryStart(result)
+				result[start:] = [('name', 'lengthOf'), ('op', '(')] + result[start:] + [('op', ')')]
+				continue
+			result.append((kind, text))
+		return result
+
+	def __primaryStart(self, tokens):
+		'''
+		Answer the index of the first token of the primary expression (a name, a string, an indexed
+		or called expression or a bracket) at the end of tokens.
+		'''
+		index = len(tokens) - 1
+		while index >= 0:
+			if tokens[index][1] in (')', ']'):
+				depth = 0
+				while index >= 0:
+					if tokens[index][1] in (')', ']'):
+						depth = depth + 1
+					if tokens[index][1] in ('(', '['):
+						depth = depth - 1
+						if depth == 0:
+							break
+					index = index - 1
+				if index > 0 and (tokens[index - 1][0] == 'name' or tokens[index - 1][1] in (')', ']')):
+					index = index - 1
+					continue
+				return index
+			if index > 1 and tokens[index - 1][1] == '.':
+				index = index - 2
+				continue
+			return index
+		return 0
+
+	def __nextText(self, tokens, index):
+		if index + 1 < len(tokens):
+			return tokens[index + 1][1]
+		return None
+
+	def __calls(self, tokens):
+		'''
+		Add the parentheses to built-in functions called without them, replace the built-in functions ijmpy does
+		not implement by their evaluation with eval() and refuse those that can not be evaluated.
+		'''
+		result = []
+		index = 0
+		while index < len(tokens):
+			kind, text = tokens[index]
+			if kind != 'name' or index > 0 and tokens[index - 1][1] == '.' or text in self.functionNames:
+				result.append((kind, text))
+				index = index + 1
+				continue
+			nextText = self.__nextText(tokens, index)
+			if text in self.UNSUPPORTED_CLASSES and nextText == '.':
+				self.error(text + '.' + str(self.__nextText(tokens, index + 1)) + ' is not implemented by ijmpy')
+			if text in self.UNSUPPORTED_FUNCTIONS and nextText == '(':
+				self.error(text + ' is not implemented by ijmpy')
+			if text in self.MACRO_FUNCTIONS:
+				if nextText == '(':
+					if self.__nextText(tokens, index + 1) != ')':
+						self.error(text + ' with arguments is not implemented by ijmpy')
+					index = index + 2
+				result.extend(self.__evaluation(text))
+				index = index + 1
+				continue
+			result.append((kind, text))
+			if text in self.NO_ARGUMENT_FUNCTIONS and nextText != '(':
+				result.extend((('op', '('), ('op', ')')))
+			index = index + 1
+		return result
+
+	def __evaluation(self, name):
+		macro, conversion = self.MACRO_FUNCTIONS[name]
+		tokens = [('name', 'eval'), ('op', '('), ('string', '"' + macro + '"'), ('op', ')')]
+		if conversion:
+			tokens = [('name', conversion), ('op', '(')] + tokens + [('op', ')')]
+		return tokens
+
+	def __conditionals(self, tokens, enclosed=False):
+		'''
+		Replace the conditional expressions c ? a : b by (a if c else b). The brackets are left out if the
+		expression is enclosed in brackets anyway.
+		'''
+		result = []
+		index = 0
+		while index < len(tokens):
+			kind, text = tokens[index]
+			if kind == 'op' and text in ('(', '['):
+				end = self.__matching(tokens, index)
+				result.append((kind, text))
+				for partIndex, part in enumerate(self.__split(tokens[index + 1:end], ',')):
+					if partIndex > 0:
+						result.append(('op', ','))
+					result.extend(self.__conditionals(part, True))
+				if end < len(tokens):
+					result.append(tokens[end])
+				index = end + 1
+				continue
+			result.append((kind, text))
+			index = index + 1
+		question = None
+		start = 0
+		for index, (kind, text) in enumerate(result):
+			if kind == 'op' and self.__depth(result[:index]) == 0:
+				if text in self.ASSIGNMENTS or text == ',':
+					start = index + 1
+				elif text == '?':
+					question = index
+					break
+		if question is None:
+			return result
+		nesting = 0
+		colon = None
+		for index in range(question + 1, len(result)):
+			kind, text = result[index]
+			if kind != 'op' or self.__depth(result[question + 1:index]) != 0:
+				continue
+			if text == '?':
+				nesting = nesting + 1
+			elif text == ':' and nesting > 0:
+				nesting = nesting - 1
+			elif text == ':':
+				colon = index
+				break
+		if colon is None:
+			self.error('Missing : after ?')
+		condition = result[start:question]
+		consequence = self.__conditionals(result[question + 1:colon])
+		alternative = self.__conditionals(result[colon + 1:])
+		conditional = consequence + [('keyword', 'if')] + condition + [('keyword', 'else')] + alternative
+		if enclosed and start == 0:
+			return conditional
+		return result[:start] + [('op', '(')] + conditional + [('op', ')')]
+
+	def __concatenations(self, tokens):
+		'''
+		Convert the operands added to a string with toString(), as the macro language does.
+		'''
+		result = []
+		index = 0
+		while index < len(tokens):
+			kind, text = tokens[index]
+			if kind == 'op' and text in ('(', '['):
+				end = self.__matching(tokens, index)
+				result.append((kind, text))
+				for partIndex, part in enumerate(self.__split(tokens[index + 1:end], ',')):
+					if partIndex > 0:
+						result.append(('op', ','))
+					result.extend(self.__concatenations(part))
+				if end < len(tokens):
+					result.append(tokens[end])
+				index = end + 1
+				continue
+			result.append((kind, text))
+			index = index + 1
+		segments = [[]]
+		for kind, text in result:
+			if (kind == 'op' and text in self.LOW_PRECEDENCE or kind == 'keyword') and self.__depth(segments[-1]) == 0:
+				segments.append([(kind, text)])
+				segments.append([])
+				continue
+			segments[-1].append((kind, text))
+		result = []
+		for segment in segments:
+			result.extend(self.__concatenate(segment))
+		return result
+
+	def __depth(self, tokens):
+		depth = 0
+		for kind, text in tokens:
+			if kind == 'op' and text in ('(', '['):
+				depth = depth + 1
+			if kind == 'op' and text in (')', ']'):
+				depth = depth - 1
+		return depth
+
+	def __concatenate(self, segment):
+		terms = [[]]
+		depth = 0
+		for kind, text in segment:
+			if kind == 'op' and text in ('(', '['):
+				depth = depth + 1
+			if kind == 'op' and text in (')', ']'):
+				depth = depth - 1
+			if depth == 0 and kind == 'op' and text == '+' and terms[-1]:
+				terms.append([])
+				continue
+			terms[-1].append((kind, text))
+		strings = [index for index, term in enumerate(terms) if self.__isString(term)]
+		if not strings:
+			return segment
+		first = strings[0]
+		if first > 0:
+			prefix = []
+			for term in terms[:first]:
+				prefix.extend(([('op', '+')] if prefix else []) + term)
+			terms[:first] = [self.__str(prefix)]
+			first = 1
+		result = []
+		for index, term in enumerate(terms):
+			if result:
+				result.append(('op', '+'))
+			if index > first and not self.__isString(term):
+				term = self.__str(term)
+			result.extend(term)
+		return result
+
+	def __isString(self, term):
+		return len(term) == 1 and term[0][0] == 'string'
+
+	def __str(self, term):
+		if len(term) > 3 and term[0][1] == 'toString' and term[1][1] == '(' and self.__matching(term, 1) == len(term) - 1:
+			return term
+		return [('name', 'toString'), ('op', '(')] + term + [('op', ')')]
+
+	def __join(self, tokens):
+		'''
+		Answer the python code of the expression made of tokens.
+		'''
+		code = ''
+		previous = None
+		for kind, text in tokens:
+			if kind in ('op', 'name') and text in self.KEYWORDS:
+				text = self.KEYWORDS[text]
+				kind = 'keyword' if text in ('and', 'or', 'not') else 'name'
+			if previous is None:
+				space = ''
+			elif text in (')', ']', ',', '.', ';') or previous[1] in ('(', '[', '.') and previous[0] == 'op':
+				space = ''
+			elif text in ('(', '[') and (previous[0] in ('name', 'string') or previous[1] in (')', ']')):
+				space = ''
+			elif previous[0] == 'unary':
+				space = ''
+			else:
+				space = ' '
+			if kind == 'op' and text in ('-', '+', '~') and (previous is None or previous[0] in ('op', 'unary', 'keyword') and previous[1] not in (')', ']')):
+				kind = 'unary'
+			code = code + space + text
+			previous = (kind, text)
+		return code
@@ -0,0 +1,174 @@
+from mripy.ijmtranslator import *
+import unittest
+import os, shutil, sys, tempfile
+
+class TranslateTest(unittest.TestCase):
+
+	def body(self, source):
+		code = translate(source)
+		compile(code, 'translation', 'exec')
+		return code.split('from mripy.ijmpy import *\n\n')[1].rstrip('\n')
+
+	def testStatements(self):
+		self.assertEquals(self.body('a = 1;\nb = a * 2;'), 'a = 1\nb = a * 2')
+		self.assertEquals(self.body('i++;'), 'i += 1')
+		self.assertEquals(self.body('--i;'), 'i -= 1')
+		self.assertEquals(self.body('x = -1;'), 'x = -1')
+
+	def testKeywords(self):
+		self.assertEquals(self.body('a = true && !b || false;'), 'a = True and not b or False')
+		self.assertEquals(self.body('a = b != c;'), 'a = b != c')
+
+	def testIf(self):
+		code = self.body('if (a==1) {\n\tb = 1;\n} else if (a==2) b = 2;\nelse {\n}')
+		self.assertEquals(code, 'if a == 1:\n\tb = 1\nelif a == 2:\n\tb = 2\nelse:\n\tpass')
+
+	def testComments(self):
+		code = self.body('// one\n/* two\n * three */\na = 1; // four')
+		self.assertEquals(code, '# one\n# two\n# three\na = 1\n# four')
+
+	def testForRange(self):
+		self.assertEquals(self.body('for (i=0; i<a.length; i++) print(i);'), 'for i in range(0, lengthOf(a)):\n\tprint(i)')
+		self.assertEquals(self.body('for (i=1; i<=10; i+=2) print(i);'), 'for i in range(1, 10 + 1, 2):\n\tprint(i)')
+		self.assertEquals(self.body('for (i=nResults-1; i>=0; i--) print(i);'), 'for i in range(nResults() - 1, 0 - 1, -1):\n\tprint(i)')
+
+	def testForRangeChangedInBody(self):
+		code = self.body('for (i=0; i<10; i++) {\n\tif (i==3) i++;\n}')
+		self.assertEquals(code, 'i = 0\nwhile i < 10:\n\tif i == 3:\n\t\ti += 1\n\ti += 1')
+		code = self.body('for (i=0; i<a.length; i++) {\n\ta = Array.concat(a, 1);\n}')
+		self.assertEquals(code, 'i = 0\nwhile i < lengthOf(a):\n\ta = Array.concat(a, 1)\n\ti += 1')
+		code = self.body('for (i=0; i<a.length; i++) {\n\ta[i] = i;\n}')
+		self.assertEquals(code, 'for i in range(0, lengthOf(a)):\n\ta[i] = i')
+
+	def testForWhile(self):
+		code = self.body('for (i=0; i<n; i++) {\n\tif (i==2) continue;\n\tprint(i);\n}')
+		self.assertEquals(code, 'i = 0\nwhile i < n:\n\tif i == 2:\n\t\ti += 1\n\t\tcontinue\n\tprint(i)\n\ti += 1')
+
+	def testDoWhile(self):
+		code = self.body('do {\n\ti++;\n} while (i<10);')
+		self.assertEquals(code, 'while True:\n\ti += 1\n\tif not (i < 10):\n\t\tbreak')
+
+	def testFunction(self):
+		code = self.body('var count = 0;\ntotal = 0;\nincrement();\nfunction increment() {\n\tcount++;\n\ttotal = 1;\n\treturn count;\n}')
+		self.assertEquals(code, 'def increment():\n\tglobal count\n\tcount += 1\n\ttotal = 1\n\treturn count\n\ncount = 0\ntotal = 0\nincrement()')
+
+	def testLocalVar(self):
+		code = self.body('var a = 1;\nfunction f(b) {\n\tvar a = 2;\n\ta = b;\n}')
+		self.assertEquals(code, 'def f(b):\n\ta = 2\n\ta = b\n\na = 1')
+
+	def testLength(self):
+		self.assertEquals(self.body('n = a.length + a[1].length + "abc".length;'), 'n = lengthOf(a) + lengthOf(a[1]) + lengthOf("abc")')
+		self.assertEquals(self.body('n = Array.concat(a, b).length;'), 'n = lengthOf(Array.concat(a, b))')
+
+	def testOutputParameters(self):
+		self.assertEquals(self.body('getDimensions(width, height, channels, slices, frames);'), 'width, height, channels, slices, frames = getDimensions()')
+		self.assertEquals(self.body('Array.getStatistics(a, min, max);'), 'min, max = Array.getStatistics(a)')
+		self.assertRaises(Exception, translate, 'getHistogram(values, counts, 256);')
+		self.assertRaises(Exception, translate, 'Stack.getDimensions(width, height, channels, slices, frames);')
+
+	def testConcatenation(self):
+		self.assertEquals(self.body('run("Enlarge...", "enlarge=" + n*2 + " pixel");'), 'run("Enlarge...", "enlarge=" + toString(n * 2) + " pixel")')
+		self.assertEquals(self.body('s = 1 + 2 + "px";'), 's = toString(1 + 2) + "px"')
+		self.assertEquals(self.body('s = "a" + b == "a1";'), 's = "a" + toString(b) == "a1"')
+		self.assertEquals(self.body('s = a + b;'), 's = a + b')
+
+	def testNoArgumentFunctions(self):
+		self.assertEquals(self.body('w = getWidth;\nexit;'), 'w = getWidth()\nexit()')
+		self.assertEquals(self.body('n = nImages();'), 'n = nImages()')
+
+	def testMacroFunctions(self):
+		self.assertEquals(self.body('title = getTitle;'), 'title = eval("return getTitle;")')
+		self.assertEquals(self.body('n = nSlices() - 1;'), 'n = int(eval("return nSlices;")) - 1')
+		self.assertEquals(self.body('resetMinAndMax;'), 'eval("resetMinAndMax;")')
+		self.assertEquals(self.body('function getTitle() {\n\treturn "t";\n}\ntitle = getTitle;'), 'def getTitle():\n\treturn "t"\n\ntitle = getTitle')
+		self.assertRaises(Exception, translate, 'x = random("seed", 1);')
+
+	def testConditional(self):
+		self.assertEquals(self.body('x = a > 0 ? 1 : 2;'), 'x = (1 if a > 0 else 2)')
+		self.assertEquals(self.body('s = "n=" + (a ? b : c ? d : e);'), 's = "n=" + toString((b if a else (d if c else e)))')
+		self.assertEquals(self.body('x = a[b ? 1 : 0];'), 'x = a[1 if b else 0]')
+		self.assertEquals(self.body('f(a, b ? 1 : 2);'), 'f(a, 1 if b else 2)')
+
+	def testIncrementInStatement(self):
+		self.assertEquals(self.body('b = a[i++];'), 'b = a[i]\ni += 1')
+		self.assertEquals(self.body('b = a[--i] + 1;'), 'i -= 1\nb = a[i] + 1')
+		self.assertEquals(self.body('if (c) b = a[i++];'), 'if c:\n\tb = a[i]\n\ti += 1')
+		self.assertRaises(Exception, translate, 'y = a[i++] + a[i++];')
+		self.assertRaises(Exception, translate, 'y = a[i++] + i;')
+		self.assertRaises(Exception, translate, 'y = a[i] + a[++i];')
+
+	def testErrorLine(self):
+		try:
+			translate('a = 1;\n\nwhile (a[i++] > 0) a = 2;')
+			self.fail()
+		except Exception, e:
+			self.assertTrue('line 3' in str(e), str(e))
+		try:
+			translate('a = 1;\nb = getStatistics(area, mean);')
+			self.fail()
+		except Exception, e:
+			self.assertTrue('getStatistics' in str(e) and 'line 2' in str(e), str(e))
+
+	def testUnexpectedBracket(self):
+		self.assertRaises(Exception, translate, 'a = 1; }')
+
+class TranslateFileTest(unittest.TestCase):
+
+	def setUp(self):
+		unittest.TestCase.setUp(self)
+		self.folder = tempfile.mkdtemp()
+		self.path = os.path.join(self.folder, 'test.ijm')
+		with open(self.path, 'w') as macroFile:
+			macroFile.write('a = 1;\n')
+
+	def tearDown(self):
+		unittest.TestCase.tearDown(self)
+		shutil.rmtree(self.folder)
+
+	def testCache(self):
+		path = translateFile(self.path)
+		self.assertEquals(path, os.path.join(self.folder, 'test_ijm.py'))
+		with open(path, 'a') as pythonFile:
+			pythonFile.write('b = 2\n')
+		self.assertEquals(translateFile(self.path), path)
+		with open(path) as pythonFile:
+			self.assertTrue('b = 2' in pythonFile.read())
+
+	def testModified(self):
+		path = translateFile(self.path)
+		with open(self.path, 'w') as macroFile:
+			macroFile.write('a = 2;\n')
+		translateFile(self.path)
+		with open(path) as pythonFile:
+			self.assertTrue('a = 2' in pythonFile.read())
+
+def suite():
+	suite = unittest.TestSuite()
+
+	suite.addTest(TranslateTest('testStatements'))
+	suite.addTest(TranslateTest('testKeywords'))
+	suite.addTest(TranslateTest('testIf'))
+	suite.addTest(TranslateTest('testComments'))
+	suite.addTest(TranslateTest('testForRange'))
+	suite.addTest(TranslateTest('testForRangeChangedInBody'))
+	suite.addTest(TranslateTest('testForWhile'))
+	suite.addTest(TranslateTest('testDoWhile'))
+	suite.addTest(TranslateTest('testFunction'))
+	suite.addTest(TranslateTest('testLocalVar'))
+	suite.addTest(TranslateTest('testLength'))
+	suite.addTest(TranslateTest('testOutputParameters'))
+	suite.addTest(TranslateTest('testConcatenation'))
+	suite.addTest(TranslateTest('testNoArgumentFunctions'))
+	suite.addTest(TranslateTest('testMacroFunctions'))
+	suite.addTest(TranslateTest('testConditional'))
+	suite.addTest(TranslateTest('testIncrementInStatement'))
+	suite.addTest(TranslateTest('testErrorLine'))
+	suite.addTest(TranslateTest('testUnexpectedBracket'))
+
+	suite.addTest(TranslateFileTest('testCache'))
+	suite.addTest(TranslateFileTest('testModified'))
+
+	return suite
+
+runner = unittest.TextTestRunner(sys.stdout, verbosity=1)
+runner.run(suite())